@@ -0,0 +1,423 @@
+import asyncio
+import json
+import logging
+import math
+import os
+from collections import OrderedDict, defaultdict, deque
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# Research runs executed at once; 0 admits everything.
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT") or 0)
+# Runs allowed to wait for a slot; more are turned away with a 429.
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE") or 16)
+# Retry-After of a 429 until run times have been measured.
+ADMISSION_RETRY_AFTER_S = float(os.getenv("ADMISSION_RETRY_AFTER_S") or 10)
+# Serve waiting users round-robin instead of first come, first served.
+ADMISSION_FAIR_USERS = os.getenv("ADMISSION_FAIR_USERS", "true").lower() == "true"
+# Priority classes, highest first.
+ADMISSION_PRIORITIES = [
+    priority.strip()
+    for priority in (os.getenv("ADMISSION_PRIORITIES") or "high,normal,low").split(",")
+    if priority.strip()
+]
+ADMISSION_DEFAULT_PRIORITY = os.getenv("ADMISSION_DEFAULT_PRIORITY") or "normal"
+# Users that get another class than the default, e.g. "ops=high,batch=low".
+# Clients cannot pick their own priority.
+ADMISSION_USER_PRIORITIES = {
+    user.strip(): priority.strip()
+    for user, _, priority in (
+        entry.partition("=")
+        for entry in (os.getenv("ADMISSION_USER_PRIORITIES") or "").split(",")
+        if "=" in entry
+    )
+}
+
+# Endpoints that start a research run.
+RUN_PATHS = frozenset({"/run", "/run_sse"})
+
+
+class AdmissionRejected(Exception):
+    """Raised when the wait queue is full."""
+
+    def __init__(self, retry_after_s: int) -> None:
+        super().__init__(f"Server busy, retry after {retry_after_s}s")
+        self.retry_after_s = retry_after_s
+
+
+class AdmissionAbandoned(Exception):
+    """Raised when the client went away while its run was waiting."""
+
+
+@dataclass
+class _Waiter:
+    user: str
+    enqueued_at: float
+    future: asyncio.Future
+
+
+@dataclass
+class _Stats:
+    admitted: int = 0
+    rejected: int = 0
+    abandoned: int = 0
+    recent_waits: deque = field(default_factory=lambda: deque(maxlen=200))
+    recent_runs: deque = field(default_factory=lambda: deque(maxlen=200))
+
+
+def _summary(samples: deque) -> dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "avg_s": sum(ordered) / len(ordered) if ordered else 0.0,
+        "p95_s": ordered[int(0.95 * (len(ordered) - 1))] if ordered else 0.0,
+    }
+
+
+class AdmissionController:
+    """
+    Limits the research runs executing at once, with a bounded wait queue.
+
+    A run is admitted when fewer than `max_concurrent` runs are executing;
+    otherwise it waits, unless `max_queue` runs already wait, in which case
+    it is rejected with an estimate of when to retry. Waiting runs are
+    admitted by priority class, highest first, and within a class
+    round-robin across users when `fair_users` is set, so one user's burst
+    does not starve the others. A user's class comes from the server-side
+    `user_priorities`. Queue wait and run time are measured separately.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        retry_after_s: float = ADMISSION_RETRY_AFTER_S,
+        fair_users: bool = ADMISSION_FAIR_USERS,
+        priorities: list[str] = ADMISSION_PRIORITIES,
+        default_priority: str = ADMISSION_DEFAULT_PRIORITY,
+        user_priorities: dict[str, str] = ADMISSION_USER_PRIORITIES,
+    ) -> None:
+        """Initializes the controller.
+
+        Args:
+            max_concurrent: Runs executed at once.
+            max_queue: Runs allowed to wait for a slot.
+            retry_after_s: Retry-After until run times are known.
+            fair_users: Whether to serve waiting users round-robin.
+            priorities: Priority classes, highest first.
+            default_priority: Class of runs without a known priority.
+            user_priorities: Class of the users that do not get the default.
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.retry_after_s = retry_after_s
+        self.fair_users = fair_users
+        self.priorities = priorities
+        self.default_priority = (
+            default_priority if default_priority in priorities else priorities[-1]
+        )
+        self.user_priorities = user_priorities
+        self.active = 0
+        # priority -> user -> waiters; users are served in insertion order.
+        self._queues: dict[str, OrderedDict[str, deque[_Waiter]]] = {
+            priority: OrderedDict() for priority in priorities
+        }
+        self._stats: dict[str, _Stats] = defaultdict(_Stats)
+
+    def priority(self, requested: str | None) -> str:
+        """Maps a requested priority to a known class."""
+        return requested if requested in self._queues else self.default_priority
+
+    def queue_depth(self) -> int:
+        return sum(
+            len(waiters)
+            for users in self._queues.values()
+            for waiters in users.values()
+        )
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        user: str,
+        priority: str | None = None,
+        abandoned: asyncio.Future | None = None,
+    ) -> AsyncIterator[float]:
+        """Waits for a slot to execute one run.
+
+        Args:
+            user: The user the run is for.
+            priority: The run's priority class; defaults to the user's.
+            abandoned: Completes when the run is no longer wanted, e.g. the
+                client disconnected, which takes it out of the queue.
+
+        Yields:
+            The time spent waiting in the queue, in seconds.
+
+        Raises:
+            AdmissionRejected: The wait queue is full.
+            AdmissionAbandoned: `abandoned` completed before admission.
+        """
+        priority = self.priority(priority or self.user_priorities.get(user))
+        stats = self._stats[priority]
+        loop = asyncio.get_running_loop()
+        enqueued_at = loop.time()
+        if self.active >= self.max_concurrent or self.queue_depth():
+            if self.queue_depth() >= self.max_queue:
+                stats.rejected += 1
+                raise AdmissionRejected(self._retry_after())
+            waiter = _Waiter(
+                user if self.fair_users else "", enqueued_at, loop.create_future()
+            )
+            self._queues[priority].setdefault(waiter.user, deque()).append(waiter)
+            self._dispatch()
+            try:
+                if abandoned is None:
+                    await waiter.future
+                else:
+                    await asyncio.wait(
+                        {waiter.future, abandoned},
+                        return_when=asyncio.FIRST_COMPLETED,
+                    )
+            except asyncio.CancelledError:
+                if waiter.future.done() and not waiter.future.cancelled():
+                    # Admitted just before the cancellation: hand the slot on.
+                    self._release()
+                else:
+                    self._remove(priority, waiter)
+                raise
+            if not waiter.future.done():
+                stats.abandoned += 1
+                self._remove(priority, waiter)
+                raise AdmissionAbandoned()
+        else:
+            self.active += 1
+
+        wait_s = loop.time() - enqueued_at
+        stats.admitted += 1
+        stats.recent_waits.append(wait_s)
+        started = loop.time()
+        try:
+            yield wait_s
+        finally:
+            stats.recent_runs.append(loop.time() - started)
+            self._release()
+
+    def stats(self) -> dict:
+        """Returns admissions, rejections, queue waits and run times per class."""
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queued": self.queue_depth(),
+            "priorities": {
+                priority: {
+                    "queued": sum(map(len, self._queues[priority].values())),
+                    "admitted": self._stats[priority].admitted,
+                    "rejected": self._stats[priority].rejected,
+                    "abandoned": self._stats[priority].abandoned,
+                    "queue_wait": _summary(self._stats[priority].recent_waits),
+                    "run_time": _summary(self._stats[priority].recent_runs),
+                }
+                for priority in self.priorities
+            },
+        }
+
+    def _retry_after(self) -> int:
+        """Estimates how long until the queue has room again, in seconds."""
+        runs = [run for stats in self._stats.values() for run in stats.recent_runs]
+        if not runs:
+            return math.ceil(self.retry_after_s)
+        # The head of the queue moves by one every (avg run / slots) seconds.
+        avg_run_s = sum(runs) / len(runs)
+        return max(1, math.ceil(avg_run_s / max(1, self.max_concurrent)))
+
+    def _release(self) -> None:
+        self.active -= 1
+        self._dispatch()
+
+    def _remove(self, priority: str, waiter: _Waiter) -> None:
+        # A cancelled waiter may already have been popped and skipped by
+        # `_dispatch` before its task got to run.
+        users = self._queues[priority]
+        waiters = users.get(waiter.user)
+        if waiters is not None and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del users[waiter.user]
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Admits waiting runs while there are free slots."""
+        while self.active < self.max_concurrent:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            if waiter.future.done():
+                continue
+            self.active += 1
+            waiter.future.set_result(None)
+
+    def _next_waiter(self) -> _Waiter | None:
+        for priority in self.priorities:
+            users = self._queues[priority]
+            if not users:
+                continue
+            user, waiters = next(iter(users.items()))
+            waiter = waiters.popleft()
+            # Round-robin: the user goes to the back of the line.
+            del users[user]
+            if waiters:
+                users[user] = waiters
+            return waiter
+        return None
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware putting the research endpoints behind admission control.
+
+    The user comes from the request body (`user_id`/`userId`, as sent to
+    /run and /run_sse) and the priority from the controller's
+    `user_priorities`. The slot is held until the response, streamed or
+    not, is complete. Rejected requests get a 429 with `Retry-After`;
+    admitted ones report their queue wait in `X-Queue-Wait-Ms`. A request
+    whose client disconnects while it waits leaves the queue.
+
+    Whether a run will reach the research team is only known once the
+    orchestrator has decided, after the HTTP response has started, so
+    runs are admitted up front. Messages `exempt` says are answered
+    without the team (e.g. greetings the intent router answers from a
+    template) skip admission; everything else may start a research run
+    and is counted.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        controller: AdmissionController,
+        paths: frozenset[str] = RUN_PATHS,
+        exempt: Callable[[str], bool] | None = None,
+    ) -> None:
+        """Initializes the middleware.
+
+        Args:
+            app: The ASGI app to protect.
+            controller: The admission controller handing out slots.
+            paths: The endpoints that start a run.
+            exempt: Returns whether a user message is answered without
+                the research team.
+        """
+        self.app = app
+        self.controller = controller
+        self.paths = paths
+        self.exempt = exempt
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        # Read the body to find the user, then replay it to the app.
+        messages = []
+        body = b""
+        while True:
+            message = await receive()
+            messages.append(message)
+            body += message.get("body", b"")
+            if message["type"] != "http.request" or not message.get("more_body"):
+                break
+
+        async def replay() -> Message:
+            return messages.pop(0) if messages else await receive()
+
+        request = _json_object(body)
+        if self.exempt is not None and self.exempt(_message_text(request)):
+            await self.app(scope, replay, send)
+            return
+
+        disconnected = asyncio.ensure_future(_disconnect(receive, messages))
+        try:
+            async with self.controller.slot(
+                _user_id(request), abandoned=disconnected
+            ) as wait_s:
+                # From here on the app watches for the disconnect itself.
+                disconnected.cancel()
+
+                async def send_with_wait(message: Message) -> None:
+                    if message["type"] == "http.response.start":
+                        message["headers"] = [
+                            *message.get("headers", []),
+                            (b"x-queue-wait-ms", str(round(wait_s * 1000)).encode()),
+                        ]
+                    await send(message)
+
+                await self.app(scope, replay, send_with_wait)
+        except AdmissionAbandoned:
+            logger.info("Client left %s while it was queued", scope["path"])
+        except AdmissionRejected as rejected:
+            logger.warning("Rejected %s: %s", scope["path"], rejected)
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 429,
+                    "headers": [
+                        (b"content-type", b"application/json"),
+                        (b"retry-after", str(rejected.retry_after_s).encode()),
+                    ],
+                }
+            )
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": json.dumps({"detail": str(rejected)}).encode(),
+                }
+            )
+        finally:
+            disconnected.cancel()
+
+
+async def _disconnect(receive: Receive, messages: list[Message]) -> None:
+    """Returns once the client disconnects, keeping other messages to replay."""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+        messages.append(message)
+
+
+def _json_object(body: bytes) -> dict:
+    try:
+        request = json.loads(body or b"{}")
+    except ValueError:
+        return {}
+    return request if isinstance(request, dict) else {}
+
+
+def _user_id(request: dict) -> str:
+    return str(request.get("user_id") or request.get("userId") or "")
+
+
+def _message_text(request: dict) -> str:
+    """The text of the run's new user message, "" when there is none."""
+    message = request.get("new_message") or request.get("newMessage")
+    if not isinstance(message, dict):
+        return ""
+    parts = message.get("parts")
+    if not isinstance(parts, list):
+        return ""
+    return " ".join(
+        str(part["text"])
+        for part in parts
+        if isinstance(part, dict) and part.get("text")
+    ).strip()
+
+
+def get_admission_controller() -> AdmissionController | None:
+    """Returns an admission controller, or None when admission is unlimited."""
+    if not ADMISSION_MAX_CONCURRENT:
+        return None
+    return AdmissionController(ADMISSION_MAX_CONCURRENT)
@@ -21,6 +21,12 @@ from google.adk.apps.app import App
 from google.adk.models.lite_llm import LiteLlm
 import warnings
 
+from app.coalescing import RESEARCH_COALESCING, CoalescingAgentTool
+from app.degradation import DegradationMetadataPlugin
+from app.intent_router import IntentRouter
+from app.presentation import PassThroughPresenter
+from app.research_pipeline import RESEARCH_QUESTION_KEY
+
 # Suppress Pydantic UserWarnings (serialization issues from LiteLLI integration/Ollama)
 warnings.filterwarnings("ignore", category=UserWarning, module="pydantic")
 
@@ -62,18 +68,43 @@ def get_current_time(query: str) -> str:
     now = datetime.datetime.now(tz)
 
 # --- Switch to Parallel Agent with Orchestrator ---
-from .agent_parallel import agent_system
+from .agent_parallel import (
+    FOLLOW_UP_REUSE,
+    agent_system,
+    degradation,
+    history_window,
+)
 from google.adk.tools import AgentTool
 from app.ollama_fix import OllamaLiteLlm as LiteLlm
 
-# Wrap the Parallel System as a Tool
-research_team_tool = AgentTool(agent_system)
+# Wrap the Parallel System as a Tool; identical concurrent requests share a run
+research_team_tool = (
+    CoalescingAgentTool(agent_system)
+    if RESEARCH_COALESCING
+    else AgentTool(agent_system)
+)
+
+# Answers greetings and sends clear questions (and follow-ups on the team's
+# last answer) to the team without an LLM call
+intent_router = IntentRouter(
+    research_tool=research_team_tool.name,
+    follow_up_key=RESEARCH_QUESTION_KEY if FOLLOW_UP_REUSE else None,
+)
+# Shows the team's verified answer without re-generating it
+pass_through = PassThroughPresenter(research_tool=research_team_tool.name)
+
+# With follow-up reuse the team reworks its own stored answers
+if FOLLOW_UP_REUSE:
+    FOLLOW_UP_RULE = "4. **Follow-ups**: If the user asks you to reformat, shorten, translate or expand the Research Team's previous answer, call the Research Team tool with the user's request. The team reworks its stored answers without researching again."
+else:
+    FOLLOW_UP_RULE = "4. **Reformatting**: If the user asks you to reformat, shorten or otherwise change a previous answer, rewrite it from the conversation. Do NOT call any tools for this."
 
 # Define the Root Orchestrator
+orchestrator_model = LiteLlm(model="ollama_chat/llama3.2:latest")
 orchestrator_agent = Agent(
     name="root_orchestrator",
-    model=LiteLlm(model="ollama_chat/llama3.2:latest"),
-    instruction="""
+    model=orchestrator_model,
+    instruction=f"""
     You are the Root Orchestrator Agent.
     
     1. **Interaction**: If the user says hello or greets you, reply politely, explain that you are an orchestrator managing a team of 3 expert AI models, and ask what they need help with. Do NOT call any tools for greetings.
@@ -81,12 +112,24 @@ orchestrator_agent = Agent(
     2. **Delegation**: If the user asks a question or request information, you MUST delegate it to your `parallel_verifier_system` tool (the Research Team).
     
     3. **Presentation**: After the Research Team returns with an answer, you must present it to the user clearly. "The team has found..."
+
+    {FOLLOW_UP_RULE}
     """,
-    tools=[research_team_tool]
+    tools=[research_team_tool],
+    before_model_callback=[
+        intent_router,
+        pass_through,
+        history_window.for_model(orchestrator_model),
+    ],
 )
 
 root_agent = orchestrator_agent
 
-app = App(root_agent=root_agent, name="app")
+app = App(
+    root_agent=root_agent,
+    name="app",
+    # Reports the degradation level in the metadata of final responses
+    plugins=[DegradationMetadataPlugin()] if degradation else [],
+)
 
 
@@ -1,70 +1,92 @@
 
-from google.adk.agents import Agent, ParallelAgent, SequentialAgent
+from collections.abc import Sequence
+
+from google.adk.agents import Agent, BaseAgent, LlmAgent
+from google.adk.agents.llm_agent import InstructionProvider
+from google.adk.agents.readonly_context import ReadonlyContext
+from google.adk.models.base_llm import BaseLlm
 # from google.adk.models.lite_llm import LiteLlm # Replaced with custom fix
 from app.ollama_fix import OllamaLiteLlm as LiteLlm # Alias it to minimize code changes
+from google.adk.utils.instructions_utils import inject_session_state
 from google.genai import types as genai_types
-from ddgs import DDGS
 import os
+from app.cascade import CASCADE_ENABLED, CASCADE_MODEL, Cascade
+from app.consensus import get_consensus_scorer
+from app.degradation import GenerationLimits, get_degradation_controller
+from app.history import HistoryWindow
+from app.model_router import LOCAL_WORKER_BACKEND, RoutedLlm, get_model_router
 from app.ollama_cloud_model import OllamaCloudLlm
+from app.ollama_model import OllamaLlm
+from app.panel_agent import PanelAgent
+from app.research_pipeline import PANEL_DIGESTS_KEY, ResearchPipeline
+from app.residency import get_residency_manager
+from app.response_cache import get_response_cache
+from app.web_search import duckduckgo_search_tool
+from app.worker_selection import get_worker_selector
 
 
-CLOUD_OLLAMA_BASE = "https://ollama.com"
+# Quorum/deadline mode for the worker panel: proceed once PANEL_QUORUM workers
+# have answered or PANEL_DEADLINE_S seconds have passed. Unset waits for all.
+PANEL_QUORUM = int(os.getenv("PANEL_QUORUM") or 0) or None
+PANEL_DEADLINE_S = float(os.getenv("PANEL_DEADLINE_S") or 0) or None
 
-MODEL_ROUTER = {
-    "gpt-oss:20b-cloud": {
-        "model": "ollama/gpt-oss:20b-cloud",
-        "api_base": CLOUD_OLLAMA_BASE,
-    },
-    "gpt-oss:120b-cloud": {   # ← THIS WAS MISSING
-        "model": "ollama/gpt-oss:120b-cloud",
-        "api_base": CLOUD_OLLAMA_BASE,
-    },
-    "deepseek-v3.1:671b-cloud": {
-        "model": "ollama/deepseek-v3.1:671b-cloud",
-        "api_base": CLOUD_OLLAMA_BASE,
-    },
-    "qwen3-coder:480b-cloud": {
-        "model": "ollama/qwen3-coder:480b-cloud",
-        "api_base": CLOUD_OLLAMA_BASE,
-    },
-    "qwen3-vl:235b-cloud": {
-        "model": "ollama/qwen3-vl:235b-cloud",
-        "api_base": CLOUD_OLLAMA_BASE,
-    },
-    "minimax-m2:cloud": {
-        "model": "ollama/minimax-m2:cloud",
-        "api_base": CLOUD_OLLAMA_BASE,
-    },
-    "glm-4.6:cloud": {
-        "model": "ollama/glm-4.6:cloud",
-        "api_base": CLOUD_OLLAMA_BASE,
-    },
-}
+# Incremental synthesis: digest each worker answer as soon as it lands and let
+# the verifier merge the digests instead of re-reading every raw answer.
+INCREMENTAL_SYNTHESIS = os.getenv("INCREMENTAL_SYNTHESIS", "false").lower() == "true"
+
+# Tree-reduce the worker answers in groups of TREE_REDUCE_FAN_IN once they add
+# up to more than TREE_REDUCE_THRESHOLD_TOKENS (0 disables), so the verifier
+# never has to read the whole panel in one prompt.
+TREE_REDUCE_FAN_IN = int(os.getenv("TREE_REDUCE_FAN_IN") or 3)
+TREE_REDUCE_THRESHOLD_TOKENS = (
+    int(os.getenv("TREE_REDUCE_THRESHOLD_TOKENS") or 0) or None
+)
+
+# Follow-ups that refine the previous answer ("make that shorter", "expand
+# point 2") re-run only the verifier over the stored worker answers.
+FOLLOW_UP_REUSE = os.getenv("FOLLOW_UP_REUSE", "true").lower() == "true"
+
+# Worker roster and model endpoints, from app/model_roster.yaml (or
+# MODEL_ROSTER_PATH). Edits are picked up by the next research request.
+model_router = get_model_router()
 
+# Fits each agent's conversation into its model's num_ctx, summarizing the
+# oldest turns
+history_window = HistoryWindow(summarizer=LiteLlm(model="ollama_chat/llama3.2:latest"))
 
-# --- Tools ---
+# Sheds quality while the server is overloaded: smaller panel, shorter
+# answers, no web search (DEGRADATION_ENABLED)
+degradation = get_degradation_controller()
+generation_limits = GenerationLimits()
 
-def duckduckgo_search_tool(query: str) -> str:
-    """
-    Performs a web search using DuckDuckGo.
-    """
-    try:
-        results = DDGS().text(keywords=query, max_results=3)
-        if not results:
-            return "No results found."
-        return str(results)
-    except Exception as e:
-        return f"Search failed: {e}"
 
 # --- Worker Agents (Ollama) ---
 
-# Helper to create workers easily
-def create_worker(name, model_id, focus):
-    if model_id.endswith("-cloud") or model_id.endswith(":cloud"):
-        model = OllamaCloudLlm(model_id)
+
+def create_model(model_id: str, backend: str = LOCAL_WORKER_BACKEND) -> BaseLlm:
+    """Builds the model for an Ollama model id, routed when the roster has it."""
+    # Shared cache in front of every worker's model call (None when disabled)
+    response_cache = get_response_cache()
+    model: BaseLlm
+    if model_router is not None and model_router.routes(model_id):
+        # Least-loaded healthy endpoint from the roster, with failover
+        model = RoutedLlm(
+            model=model_id, router=model_router, response_cache=response_cache
+        )
+    elif model_id.endswith("-cloud") or model_id.endswith(":cloud"):
+        model = OllamaCloudLlm(model_id, response_cache=response_cache)
+    elif backend == "native":
+        model = OllamaLlm(model=model_id, response_cache=response_cache)
     else:
-        model = LiteLlm(model=f"ollama_chat/{model_id}")
+        model = LiteLlm(model=f"ollama_chat/{model_id}", response_cache=response_cache)
+    return model
+
 
+# Helper to create workers easily
+def create_worker(
+    name: str, model_id: str, focus: str, backend: str = LOCAL_WORKER_BACKEND
+) -> Agent:
+    model = create_model(model_id, backend)
     return Agent(
         name=name,
         model=model,
@@ -73,75 +95,175 @@ def create_worker(name, model_id, focus):
         Your model ID is {model_id}.
         Focus on answering the user's question from your unique perspective: {focus}.
         """,
+        # Read by the worker selector to match workers to questions
+        description=focus,
         output_key=f"{name}_response",
+        before_model_callback=[history_window.for_model(model), generation_limits],
     )
 
 
+def create_workers(
+    specs: list[dict], existing: Sequence[BaseAgent] = ()
+) -> list[LlmAgent]:
+    """Builds the panel workers from roster specs, reusing unchanged ones."""
+    reusable = {
+        (worker.name, worker.instruction): worker
+        for worker in existing
+        if isinstance(worker, LlmAgent)
+    }
+    workers = []
+    for spec in specs:
+        worker = create_worker(spec["name"], spec["model"], spec["focus"])
+        workers.append(reusable.get((worker.name, worker.instruction), worker))
+    return workers
 
-# 1. llama3.2:latest — General Purpose
-worker_llama = create_worker(
-    "worker_llama",
-    "llama3.2:latest",
-    "General purpose reasoning and open-source alignment"
-)
 
+# The default panel, used when there is no roster file:
+# 1. llama3.2:latest — General Purpose
 # 2. deepseek-coder:1.3b — Coding & Reasoning
-worker_deepseek = create_worker(
-    "worker_deepseek",
-    "deepseek-coder:1.3b",
-    "Deep technical reasoning and coding"
-)
-
 # 3. mistral:latest — Synthesis & Large-scale Knowledge
-worker_mistral = create_worker(
-    "worker_mistral",
-    "mistral:latest",
-    "Large-scale knowledge synthesis"
+DEFAULT_WORKERS = [
+    {
+        "name": "worker_llama",
+        "model": "llama3.2:latest",
+        "focus": "General purpose reasoning and open-source alignment",
+    },
+    {
+        "name": "worker_deepseek",
+        "model": "deepseek-coder:1.3b",
+        "focus": "Deep technical reasoning and coding",
+    },
+    {
+        "name": "worker_mistral",
+        "model": "mistral:latest",
+        "focus": "Large-scale knowledge synthesis",
+    },
+]
+
+workers = create_workers(
+    model_router.roster.workers if model_router is not None else DEFAULT_WORKERS
 )
 
 # --- Parallel Orchestration ---
 
-parallel_workers = ParallelAgent(
+parallel_workers = PanelAgent(
     name="parallel_workers",
-    sub_agents=[
-        worker_llama,
-        worker_deepseek,
-        worker_mistral,
-    ],
-    description="Consults 3 different open source models in parallel."
+    sub_agents=list(workers),
+    description="Consults a panel of different open source models in parallel.",
+    quorum=PANEL_QUORUM,
+    deadline_s=PANEL_DEADLINE_S,
+    # Memory-sized waves on small nodes (OLLAMA_MEMORY_BUDGET_GB)
+    residency=get_residency_manager(),
+    # Only the workers whose focus matches the question (WORKER_SELECTION_ENABLED)
+    selector=get_worker_selector(),
 )
 
 # --- Verifier/Summarizer Agent ---
 
 verifier_instruction = """
 You are a Lead Researcher and Verifier.
-Your task is to synthesize the answers provided by a panel of 3 expert AI models.
+Your task is to synthesize the answers provided by a panel of {n_experts} expert AI models.
 
 The experts have provided their responses in the session state.
 Synthesize their perspectives into a single, comprehensive, and verified answer.
 IF there are conflicting facts, use the `duckduckgo_search_tool` tool to verify.
+Pass all the facts to check as separate queries in a single call.
 
 Check the following keys in state for their inputs:
-- worker_llama_response
-- worker_deepseek_response
-- worker_mistral_response
+{expert_keys}
+
+Panel status: {{panel_status?}}
+Do not invent or guess the answer of an expert that did not answer.
+{{research_follow_up?}}
+
+Provide a final, verified response to the user.
+"""
+
+merged_verifier_instruction = """
+You are a Lead Researcher and Verifier.
+Your task is to merge the answers provided by a panel of {n_experts} expert AI models.
+
+The expert answers have already been condensed into their key claims:
+
+{{panel_digests}}
+
+Panel status: {{panel_status?}}
+Do not invent or guess the answer of an expert that did not answer.
+{{research_follow_up?}}
+
+Merge these claims into a single, comprehensive, and verified answer.
+IF there are conflicting facts, use the `duckduckgo_search_tool` tool to verify.
+Pass all the facts to check as separate queries in a single call.
 
 Provide a final, verified response to the user.
 """
 
+
+def build_verifier_instruction(
+    panel_workers: Sequence[LlmAgent],
+) -> InstructionProvider:
+    """Fills in the current panel; state placeholders are filled per turn."""
+    panel = {
+        "n_experts": len(panel_workers),
+        "expert_keys": "\n".join(f"- {worker.output_key}" for worker in panel_workers),
+    }
+    raw = verifier_instruction.format(**panel)
+    merged = merged_verifier_instruction.format(**panel)
+
+    async def instruction(readonly_context: ReadonlyContext) -> str:
+        # Digests when the pipeline condensed or tree-reduced the answers
+        template = merged if readonly_context.state.get(PANEL_DIGESTS_KEY) else raw
+        return await inject_session_state(template, readonly_context)
+
+    return instruction
+
+
+verifier_model = LiteLlm(model="ollama_chat/llama3.2:latest")
 verifier_agent = Agent(
     name="verifier_agent",
-    model=LiteLlm(model="ollama_chat/llama3.2:latest"),
-    instruction=verifier_instruction,
+    model=verifier_model,
+    instruction=build_verifier_instruction(workers),
     tools=[duckduckgo_search_tool],
-    output_key="final_verified_response"
+    output_key="final_verified_response",
+    before_model_callback=[
+        history_window.for_model(verifier_model),
+        GenerationLimits(search_tools=(duckduckgo_search_tool.__name__,)),
+    ],
 )
 
+
+def sync_roster() -> None:
+    """Swaps in the workers of an edited roster; called between research runs."""
+    if model_router is None or not model_router.refresh():
+        return
+    panel_workers = create_workers(
+        model_router.roster.workers, existing=parallel_workers.sub_agents
+    )
+    for worker in panel_workers:
+        worker.parent_agent = parallel_workers
+    parallel_workers.sub_agents = list(panel_workers)
+    verifier_agent.instruction = build_verifier_instruction(panel_workers)
+
+
 # --- Main Pipeline ---
 
-agent_system = SequentialAgent(
+# Cascade mode: a fast model answers first and only answers it is not
+# confident about escalate to the panel (CASCADE_ENABLED)
+cascade = Cascade(create_model(CASCADE_MODEL)) if CASCADE_ENABLED else None
+
+agent_system = ResearchPipeline(
     name="parallel_verifier_system",
     sub_agents=[parallel_workers, verifier_agent],
-    description="A system that consults 3 distinct OSS models in parallel and synthesizes their answers."
+    description="A system that consults several distinct OSS models in parallel and synthesizes their answers.",
+    incremental=INCREMENTAL_SYNTHESIS,
+    reduce_fan_in=TREE_REDUCE_FAN_IN,
+    reduce_threshold_tokens=TREE_REDUCE_THRESHOLD_TOKENS,
+    # Skips the full verification when the workers agree (CONSENSUS_ENABLED)
+    consensus=get_consensus_scorer(),
+    cascade=cascade,
+    degradation=degradation,
+    reuse_follow_ups=FOLLOW_UP_REUSE,
+    # Picks up edits of the roster file between research runs
+    refresh_roster=sync_roster,
 )
 
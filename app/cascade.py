@@ -0,0 +1,164 @@
+import logging
+import os
+import re
+from collections import deque
+from dataclasses import dataclass
+
+from google.adk.models.base_llm import BaseLlm
+from opentelemetry import trace
+
+from app.llm_utils import generate_text
+
+logger = logging.getLogger(__name__)
+
+CASCADE_ENABLED = os.getenv("CASCADE_ENABLED", "false").lower() == "true"
+CASCADE_MODEL = os.getenv("CASCADE_MODEL") or "llama3.2:latest"
+# Confidence from which the fast model's answer is kept.
+CASCADE_THRESHOLD = float(os.getenv("CASCADE_THRESHOLD") or 0.8)
+
+ANSWER_INSTRUCTION = """
+You are a knowledgeable research assistant. Answer the user's question
+accurately and concisely. If you are not sure about something, say so.
+"""
+
+SELF_CHECK_INSTRUCTION = """
+You are checking an answer to a question before it is shown to a user.
+Rate how confident you are that the answer is correct, complete and free of
+invented facts, from 0 (certainly wrong) to 10 (certainly right). Questions
+that need recent, niche or precise information deserve a low score unless
+the answer is clearly right. Reply with the number only.
+"""
+
+# Thresholds the escalation rate is reported at, to help tune the threshold.
+_REPORTED_THRESHOLDS = (0.5, 0.6, 0.7, 0.8, 0.9)
+_SCORE = re.compile(r"\d+(?:\.\d+)?")
+
+
+@dataclass
+class CascadeResult:
+    answer: str
+    confidence: float
+    """Self-checked confidence in the answer, from 0 to 1."""
+    escalate: bool
+
+
+def parse_confidence(text: str) -> float:
+    """Reads a 0-10 rating as a 0-1 confidence; unreadable ratings are 0."""
+    match = _SCORE.search(text)
+    if match is None:
+        return 0.0
+    return min(max(float(match.group()) / 10, 0.0), 1.0)
+
+
+class Cascade:
+    """
+    Answers with a fast model first and escalates when unsure.
+
+    The fast model answers the question, then `checker` (the fast model
+    itself by default) rates the answer. Answers rated below `threshold`
+    escalate to the full panel. Escalation rates and latencies are kept so
+    the threshold can be tuned: `stats()` reports the escalation rate the
+    recent confidences would have given at other thresholds, and an
+    estimate of the time saved by the answers that were kept.
+    """
+
+    def __init__(
+        self,
+        model: BaseLlm,
+        checker: BaseLlm | None = None,
+        threshold: float = CASCADE_THRESHOLD,
+        answer_instruction: str = ANSWER_INSTRUCTION,
+        self_check_instruction: str = SELF_CHECK_INSTRUCTION,
+    ) -> None:
+        """Initializes the cascade.
+
+        Args:
+            model: The fast model answering first.
+            checker: The model rating the answer, `model` by default.
+            threshold: Confidence from which the answer is kept.
+            answer_instruction: System instruction of the answer call.
+            self_check_instruction: System instruction of the rating call.
+        """
+        self.model = model
+        self.checker = checker or model
+        self.threshold = threshold
+        self.answer_instruction = answer_instruction
+        self.self_check_instruction = self_check_instruction
+        self._kept = 0
+        self._escalated = 0
+        self._kept_s = 0.0
+        self._escalated_s = 0.0
+        self._confidences: deque[float] = deque(maxlen=500)
+
+    async def answer(self, question: str) -> CascadeResult:
+        """
+        Answers `question` with the fast model and rates the answer.
+
+        Args:
+            question: The research question.
+
+        Returns:
+            The answer, its confidence and whether to escalate. Failures of
+            either call escalate.
+        """
+        try:
+            answer = await generate_text(self.model, self.answer_instruction, question)
+            rating = await generate_text(
+                self.checker,
+                self.self_check_instruction,
+                f"Question: {question}\n\nAnswer:\n{answer}",
+                max_output_tokens=8,
+            )
+        except Exception:
+            logger.exception("Cascade answer failed, escalating")
+            return CascadeResult("", 0.0, escalate=True)
+
+        confidence = parse_confidence(rating) if answer.strip() else 0.0
+        self._confidences.append(confidence)
+        result = CascadeResult(answer, confidence, confidence < self.threshold)
+        span = trace.get_current_span()
+        span.set_attribute("cascade.confidence", confidence)
+        span.set_attribute("cascade.escalated", result.escalate)
+        logger.info(
+            "Cascade confidence %.2f, %s",
+            confidence,
+            "escalating to the panel" if result.escalate else "answer kept",
+        )
+        return result
+
+    def record(self, escalated: bool, elapsed_s: float) -> None:
+        """Records the end-to-end latency of a request the cascade saw."""
+        if escalated:
+            self._escalated += 1
+            self._escalated_s += elapsed_s
+        else:
+            self._kept += 1
+            self._kept_s += elapsed_s
+
+    def stats(self) -> dict:
+        """Returns escalation rates and latencies, for tuning the threshold."""
+        total = self._kept + self._escalated
+        kept_s = self._kept_s / self._kept if self._kept else 0.0
+        escalated_s = self._escalated_s / self._escalated if self._escalated else 0.0
+        confidences = list(self._confidences)
+        return {
+            "threshold": self.threshold,
+            "requests": total,
+            "kept": self._kept,
+            "escalated": self._escalated,
+            "escalation_rate": self._escalated / total if total else 0.0,
+            "avg_kept_s": kept_s,
+            "avg_escalated_s": escalated_s,
+            # Kept answers would have cost about as much as escalated ones.
+            "estimated_saved_s": (
+                self._kept * max(0.0, escalated_s - kept_s) if self._escalated else 0.0
+            ),
+            "escalation_rate_at": {
+                str(threshold): (
+                    sum(c < threshold for c in confidences) / len(confidences)
+                    if confidences
+                    else 0.0
+                )
+                for threshold in _REPORTED_THRESHOLDS
+            },
+        }
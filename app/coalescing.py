@@ -0,0 +1,184 @@
+import logging
+import os
+import re
+from collections.abc import Awaitable
+from typing import Any
+
+from google.adk.agents import BaseAgent, LlmAgent
+from google.adk.artifacts import InMemoryArtifactService
+from google.adk.memory.in_memory_memory_service import InMemoryMemoryService
+from google.adk.runners import Runner
+from google.adk.sessions.in_memory_session_service import InMemorySessionService
+from google.adk.tools import AgentTool
+from google.adk.tools.tool_context import ToolContext
+from google.adk.utils.context_utils import Aclosing
+from google.genai import types
+from opentelemetry import trace
+
+from app.intent_router import FOLLOW_UP_INTENTS, classify
+from app.singleflight import SingleFlight
+from app.worker_selection import FULL_PANEL_KEY
+
+logger = logging.getLogger(__name__)
+
+# Let concurrent identical research requests share one run of the team.
+RESEARCH_COALESCING = os.getenv("RESEARCH_COALESCING", "true").lower() == "true"
+# The shared run belongs to no caller, so it runs under its own user.
+SHARED_USER_ID = "coalesced"
+
+
+def normalize_request(text: str) -> str:
+    """Returns the form under which two requests count as the same question."""
+    return re.sub(r"\s+", " ", text).strip().rstrip("?!. ").lower()
+
+
+def roster(agent: BaseAgent) -> tuple[tuple[str, str], ...]:
+    """Lists the (agent, model) pairs of an agent tree, in tree order."""
+    members = []
+    pending = [agent]
+    while pending:
+        current = pending.pop(0)
+        pending.extend(current.sub_agents)
+        if isinstance(current, LlmAgent):
+            model = current.model
+            members.append((current.name, getattr(model, "model", None) or str(model)))
+    return tuple(members)
+
+
+class CoalescingAgentTool(AgentTool):
+    """
+    AgentTool that runs the agent once for identical concurrent requests.
+
+    Requests with the same normalized text, roster and `state_keys` values
+    that arrive while one is running attach to it through `SingleFlight`
+    and all receive its result and state changes. The shared run belongs
+    to no caller: it sees only the `state_keys` of the session, runs under
+    a neutral user with its own artifacts, and is cancelled only once every
+    caller has disconnected. Follow-ups (`FOLLOW_UP_INTENTS`) depend on the
+    session's previous turn and always run on their own.
+    """
+
+    def __init__(
+        self,
+        agent: BaseAgent,
+        skip_summarization: bool = False,
+        *,
+        include_plugins: bool = True,
+        state_keys: tuple[str, ...] = (FULL_PANEL_KEY,),
+    ) -> None:
+        """Initializes the tool.
+
+        Args:
+            agent: The agent to wrap.
+            skip_summarization: Whether to skip summarization of the output.
+            include_plugins: Whether the agent runs with the parent's plugins.
+            state_keys: Session state keys that change the agent's answer.
+        """
+        super().__init__(agent, skip_summarization, include_plugins=include_plugins)
+        self.state_keys = state_keys
+        self._inflight: SingleFlight[tuple[Any, dict[str, Any]]] = SingleFlight(
+            cancel_abandoned=True
+        )
+        self._requests = 0
+        self._executions = 0
+
+    async def run_async(
+        self, *, args: dict[str, Any], tool_context: ToolContext
+    ) -> Any:
+        request = args.get("request")
+        if (
+            not isinstance(request, str)
+            or (isinstance(self.agent, LlmAgent) and self.agent.input_schema)
+            or classify(request).label in FOLLOW_UP_INTENTS
+        ):
+            return await super().run_async(args=args, tool_context=tool_context)
+
+        if self.skip_summarization:
+            tool_context.actions.skip_summarization = True
+        key = (
+            normalize_request(request),
+            roster(self.agent),
+            tuple(repr(tool_context.state.get(key)) for key in self.state_keys),
+        )
+        leader = False
+
+        def start() -> Awaitable[tuple[Any, dict[str, Any]]]:
+            nonlocal leader
+            leader = True
+            self._executions += 1
+            return self._run_shared(request, tool_context)
+
+        self._requests += 1
+        result, state_delta = await self._inflight.do(key, start)
+        if not leader:
+            logger.info("Coalesced research request %r", request)
+        trace.get_current_span().set_attribute("research.coalesced", not leader)
+        tool_context.state.update(state_delta)
+        return result
+
+    def stats(self) -> dict[str, int]:
+        """Returns the requests seen, the runs they took and the runs in flight."""
+        return {
+            "requests": self._requests,
+            "executions": self._executions,
+            "coalesced": self._requests - self._executions,
+            "in_flight": self._inflight.in_flight(),
+        }
+
+    async def _run_shared(
+        self, request: str, tool_context: ToolContext
+    ) -> tuple[Any, dict[str, Any]]:
+        """Runs the agent like `AgentTool` does, collecting its state changes.
+
+        The state changes are returned rather than applied, so every caller
+        can apply them to its own session. Only the `state_keys`, which are
+        part of the coalescing key, are copied from the caller's session.
+        """
+        invocation_context = tool_context._invocation_context
+        app_name = invocation_context.app_name or self.agent.name
+        runner = Runner(
+            app_name=app_name,
+            agent=self.agent,
+            artifact_service=InMemoryArtifactService(),
+            session_service=InMemorySessionService(),
+            memory_service=InMemoryMemoryService(),
+            credential_service=invocation_context.credential_service,
+            plugins=(
+                invocation_context.plugin_manager.plugins
+                if self.include_plugins
+                else None
+            ),
+        )
+        session = await runner.session_service.create_session(
+            app_name=app_name,
+            user_id=SHARED_USER_ID,
+            state={
+                key: tool_context.state[key]
+                for key in self.state_keys
+                if key in tool_context.state
+            },
+        )
+
+        state_delta: dict[str, Any] = {}
+        last_content = None
+        try:
+            async with Aclosing(
+                runner.run_async(
+                    user_id=session.user_id,
+                    session_id=session.id,
+                    new_message=types.Content(
+                        role="user", parts=[types.Part.from_text(text=request)]
+                    ),
+                )
+            ) as events:
+                async for event in events:
+                    if event.actions.state_delta:
+                        state_delta.update(event.actions.state_delta)
+                    if event.content:
+                        last_content = event.content
+        finally:
+            await runner.close()
+
+        if not last_content:
+            return "", state_delta
+        return "\n".join(p.text for p in last_content.parts if p.text), state_delta
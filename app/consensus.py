@@ -0,0 +1,187 @@
+import logging
+import os
+import re
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+import numpy as np
+from opentelemetry import trace
+
+from app.ollama_clients import get_async_client
+from app.ollama_scheduler import LOCAL_OLLAMA_BASE
+
+logger = logging.getLogger(__name__)
+
+CONSENSUS_ENABLED = os.getenv("CONSENSUS_ENABLED", "false").lower() == "true"
+# Agreement from which the panel is trusted without a full verification.
+CONSENSUS_THRESHOLD = float(os.getenv("CONSENSUS_THRESHOLD") or 0.75)
+# Ollama embedding model; without one, agreement is claim overlap alone.
+CONSENSUS_EMBED_MODEL = os.getenv("CONSENSUS_EMBED_MODEL")
+# Share of the score given to embedding similarity over claim overlap.
+CONSENSUS_EMBEDDING_WEIGHT = float(os.getenv("CONSENSUS_EMBEDDING_WEIGHT") or 0.7)
+
+BatchEmbedder = Callable[[list[str]], Awaitable[list[list[float]]]]
+
+_TERM = re.compile(r"\d+(?:[.,]\d+)*%?|[a-z][a-z'-]{3,}")
+_STOPWORDS = frozenset(
+    """
+    about above after again also although answer because been before being
+    below between both could does doing down during each either especially
+    even every from further generally have having here however into itself
+    just like made make many more most much must only other over perhaps
+    rather really same should since some such than that their them then
+    there therefore these they this those though through thus under until
+    upon very well were what when where whether which while will with within
+    without would your
+    """.split()
+)
+
+
+@dataclass
+class Consensus:
+    score: float
+    """Mean pairwise agreement of the answers, from 0 to 1."""
+    similarity: float | None
+    """Mean pairwise cosine similarity of the embeddings, if embedded."""
+    overlap: float
+    """Mean pairwise Jaccard overlap of the key claims."""
+    best: str
+    """The answer agreeing most with the others."""
+
+
+def key_claims(text: str) -> set[str]:
+    """Returns the numbers and content words of an answer.
+
+    A cheap stand-in for its claims: answers agreeing on the facts share
+    their figures and key terms, whatever their wording.
+    """
+    return {
+        term.rstrip("'-")
+        for term in _TERM.findall(text.lower())
+        if term not in _STOPWORDS
+    }
+
+
+def claim_overlap(answers: list[str]) -> np.ndarray:
+    """Returns the pairwise Jaccard overlap of the answers' key claims."""
+    claims = [key_claims(answer) for answer in answers]
+    vocabulary = {term: index for index, term in enumerate(set().union(*claims))}
+    matrix = np.zeros((len(answers), len(vocabulary)), dtype=np.float32)
+    for row, terms in enumerate(claims):
+        matrix[row, [vocabulary[term] for term in terms]] = 1.0
+    intersection = matrix @ matrix.T
+    sizes = matrix.sum(axis=1)
+    union = sizes[:, None] + sizes[None, :] - intersection
+    return np.divide(
+        intersection, union, out=np.zeros_like(intersection), where=union > 0
+    )
+
+
+def cosine_similarity(embeddings: list[list[float]]) -> np.ndarray:
+    """Returns the pairwise cosine similarity of the embeddings."""
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    unit = matrix / np.where(norms > 0, norms, 1.0)
+    return np.clip(unit @ unit.T, 0.0, 1.0)
+
+
+class ConsensusScorer:
+    """
+    Scores how much the panel's answers agree, before the verifier runs.
+
+    Agreement blends the cosine similarity of the answers' embeddings with
+    the overlap of their key claims (numbers and content words), both
+    computed pairwise in one matrix product. Embeddings catch paraphrases,
+    the claim overlap catches answers that read alike but differ on the
+    figures. Without an embedder the score is the claim overlap alone.
+    """
+
+    def __init__(
+        self,
+        embedder: BatchEmbedder | None = None,
+        embedding_weight: float = CONSENSUS_EMBEDDING_WEIGHT,
+        threshold: float = CONSENSUS_THRESHOLD,
+    ) -> None:
+        """Initializes the scorer.
+
+        Args:
+            embedder: Optional async function embedding several texts at once.
+            embedding_weight: Share of the score given to embedding similarity.
+            threshold: Score from which the answers are considered agreeing.
+        """
+        self.embedder = embedder
+        self.embedding_weight = embedding_weight
+        self.threshold = threshold
+
+    async def score(self, answers: dict[str, str]) -> Consensus | None:
+        """
+        Scores the agreement of the answers.
+
+        Args:
+            answers: The answer of each worker, by name.
+
+        Returns:
+            The consensus, or None with fewer than two answers.
+        """
+        if len(answers) < 2:
+            return None
+        names = list(answers)
+        texts = list(answers.values())
+
+        overlap = claim_overlap(texts)
+        agreement = overlap
+        similarity = None
+        if self.embedder is not None:
+            try:
+                similarity = cosine_similarity(await self.embedder(texts))
+            except Exception:
+                logger.exception("Answer embedding failed, scoring claims only")
+        if similarity is not None:
+            weight = self.embedding_weight
+            agreement = weight * similarity + (1 - weight) * overlap
+
+        # Mean over the pairs, i.e. the matrix without its diagonal.
+        pairs = ~np.eye(len(texts), dtype=bool)
+        consensus = Consensus(
+            score=float(agreement[pairs].mean()),
+            similarity=(
+                float(similarity[pairs].mean()) if similarity is not None else None
+            ),
+            overlap=float(overlap[pairs].mean()),
+            best=names[int(np.where(pairs, agreement, 0).sum(axis=1).argmax())],
+        )
+
+        span = trace.get_current_span()
+        span.set_attribute("consensus.score", consensus.score)
+        span.set_attribute("consensus.overlap", consensus.overlap)
+        if consensus.similarity is not None:
+            span.set_attribute("consensus.similarity", consensus.similarity)
+        span.set_attribute("consensus.best", consensus.best)
+        return consensus
+
+    def agrees(self, consensus: Consensus | None) -> bool:
+        """Whether the consensus is high enough to skip a full verification."""
+        return consensus is not None and consensus.score >= self.threshold
+
+
+def ollama_batch_embedder(model: str, host: str) -> BatchEmbedder:
+    """Returns a batch embedder backed by the embedding endpoint of an Ollama host."""
+
+    async def embed(texts: list[str]) -> list[list[float]]:
+        response = await get_async_client(host).embed(model=model, input=texts)
+        return [list(embedding) for embedding in response["embeddings"]]
+
+    return embed
+
+
+def get_consensus_scorer() -> ConsensusScorer | None:
+    """Returns the panel's consensus scorer, or None when disabled."""
+    if not CONSENSUS_ENABLED:
+        return None
+    return ConsensusScorer(
+        embedder=(
+            ollama_batch_embedder(CONSENSUS_EMBED_MODEL, LOCAL_OLLAMA_BASE)
+            if CONSENSUS_EMBED_MODEL
+            else None
+        )
+    )
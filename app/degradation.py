@@ -0,0 +1,234 @@
+import dataclasses
+import logging
+import os
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event
+from google.adk.models.llm_request import LlmRequest
+from google.adk.plugins.base_plugin import BasePlugin
+from google.genai import types as genai_types
+from opentelemetry import trace
+
+from app.ollama_scheduler import max_host_load
+
+logger = logging.getLogger(__name__)
+
+DEGRADATION_ENABLED = os.getenv("DEGRADATION_ENABLED", "false").lower() == "true"
+# Research runs the server handles at full quality at once.
+DEGRADATION_MAX_IN_FLIGHT = int(os.getenv("DEGRADATION_MAX_IN_FLIGHT") or 4)
+# Pressure at which each level starts, see `DegradationController`.
+DEGRADATION_THRESHOLDS = [
+    float(threshold)
+    for threshold in (os.getenv("DEGRADATION_THRESHOLDS") or "1.25,2,3").split(",")
+]
+# A level is left once pressure drops below this share of its threshold.
+DEGRADATION_RECOVERY = float(os.getenv("DEGRADATION_RECOVERY") or 0.7)
+DEGRADED_MAX_OUTPUT_TOKENS = int(os.getenv("DEGRADED_MAX_OUTPUT_TOKENS") or 512)
+
+DEGRADATION_KEY = "degradation"
+
+
+@dataclass(frozen=True)
+class DegradationPolicy:
+    level: int
+    panel_fraction: float
+    """Share of the selected workers consulted; at least one always is."""
+    max_output_tokens: int | None
+    """Cap on the tokens generated by the workers and the verifier."""
+    web_search: bool
+    """Whether the verifier may search the web."""
+
+
+LEVELS = (
+    DegradationPolicy(0, 1.0, None, True),
+    DegradationPolicy(1, 0.5, None, True),
+    DegradationPolicy(2, 0.5, DEGRADED_MAX_OUTPUT_TOKENS, True),
+    DegradationPolicy(3, 0.0, DEGRADED_MAX_OUTPUT_TOKENS, False),
+)
+
+
+class DegradationController:
+    """
+    Trades answer quality for throughput while the server is overloaded.
+
+    Pressure is the larger of the in-flight research runs over
+    `max_in_flight` and the load of the busiest Ollama host (running plus
+    queued calls over its slots). Each level of `LEVELS` starts once
+    pressure reaches its threshold: first the panel shrinks, then
+    generation is capped, then the verifier stops searching the web.
+    Levels go up at once but come down one at a time, and only when
+    pressure drops below `recovery` times the level's threshold, so the
+    level does not flap around a threshold.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = DEGRADATION_MAX_IN_FLIGHT,
+        thresholds: list[float] = DEGRADATION_THRESHOLDS,
+        recovery: float = DEGRADATION_RECOVERY,
+        host_load: Callable[[], float] = max_host_load,
+    ) -> None:
+        """Initializes the controller.
+
+        Args:
+            max_in_flight: Research runs handled at full quality at once.
+            thresholds: Pressure at which levels 1, 2, ... start.
+            recovery: Share of a level's threshold to drop below to leave it.
+            host_load: Returns the load of the busiest backend host.
+        """
+        self.max_in_flight = max_in_flight
+        self.thresholds = thresholds[: len(LEVELS) - 1]
+        self.recovery = recovery
+        self.host_load = host_load
+        self.in_flight = 0
+        self.level = 0
+        self.runs_by_level = [0] * len(LEVELS)
+
+    def pressure(self) -> float:
+        return max(self.in_flight / self.max_in_flight, self.host_load())
+
+    def update(self) -> DegradationPolicy:
+        """Moves to the level the current pressure calls for and returns it."""
+        pressure = self.pressure()
+        target = sum(pressure >= threshold for threshold in self.thresholds)
+        previous = self.level
+        if target > self.level:
+            self.level = target
+        while (
+            self.level > target
+            and pressure < self.thresholds[self.level - 1] * self.recovery
+        ):
+            self.level -= 1
+        if self.level != previous:
+            logger.warning(
+                "Degradation level %d -> %d (pressure %.2f)",
+                previous,
+                self.level,
+                pressure,
+            )
+        return LEVELS[self.level]
+
+    @contextmanager
+    def track(self) -> Iterator[DegradationPolicy]:
+        """Counts a research run as in flight and yields its policy."""
+        self.in_flight += 1
+        try:
+            policy = self.update()
+            self.runs_by_level[policy.level] += 1
+            span = trace.get_current_span()
+            span.set_attribute("degradation.level", policy.level)
+            span.set_attribute("degradation.in_flight", self.in_flight)
+            yield policy
+        finally:
+            self.in_flight -= 1
+            self.update()
+
+    def status(self) -> dict:
+        """Returns the level, the pressure and the runs served at each level."""
+        return {
+            "level": self.level,
+            "policy": dataclasses.asdict(LEVELS[self.level]),
+            "pressure": round(self.pressure(), 3),
+            "in_flight": self.in_flight,
+            "runs_by_level": self.runs_by_level,
+        }
+
+
+class GenerationLimits:
+    """
+    `before_model_callback` applying the run's degradation policy.
+
+    Caps `max_output_tokens` and, when web search is off, removes the
+    `search_tools` declarations so the model cannot call them. Degraded
+    requests are labelled with their level, which the response cache keys
+    on, so degraded answers are never served to full-quality runs.
+    """
+
+    def __init__(self, search_tools: tuple[str, ...] = ()) -> None:
+        """Initializes the callback.
+
+        Args:
+            search_tools: Names of the tools that search the web.
+        """
+        self.search_tools = search_tools
+
+    def __call__(
+        self, callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> None:
+        policy = callback_context.state.get(DEGRADATION_KEY)
+        config = llm_request.config
+        if not policy or not policy["level"] or config is None:
+            return None
+        config.labels = {**(config.labels or {}), DEGRADATION_KEY: str(policy["level"])}
+        cap = policy["max_output_tokens"]
+        if cap:
+            config.max_output_tokens = min(config.max_output_tokens or cap, cap)
+        if not policy["web_search"] and self.search_tools:
+            for name in self.search_tools:
+                llm_request.tools_dict.pop(name, None)
+            tools = []
+            for tool in config.tools or []:
+                if isinstance(tool, genai_types.Tool) and tool.function_declarations:
+                    declarations = tool.function_declarations
+                    tool.function_declarations = [
+                        declaration
+                        for declaration in declarations
+                        if declaration.name not in self.search_tools
+                    ]
+                    if not tool.function_declarations:
+                        continue
+                tools.append(tool)
+            config.tools = tools or None
+        return None
+
+
+class DegradationMetadataPlugin(BasePlugin):
+    """
+    Adds the degradation level of each run to its final responses.
+
+    The level is the one of the policy the run stored under `degradation`,
+    so a run reports the quality it was actually served at, not the level
+    the controller has moved to since. Runs that did no research report
+    no level.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(name="degradation_metadata")
+        self._levels: dict[str, int] = {}
+
+    async def on_event_callback(
+        self, *, invocation_context: InvocationContext, event: Event
+    ) -> Event | None:
+        invocation_id = invocation_context.invocation_id
+        policy = event.actions.state_delta.get(DEGRADATION_KEY)
+        if isinstance(policy, dict):
+            self._levels[invocation_id] = policy["level"]
+        if invocation_id not in self._levels or not event.is_final_response():
+            return None
+        event.custom_metadata = {
+            **(event.custom_metadata or {}),
+            "degradation_level": self._levels[invocation_id],
+        }
+        return event
+
+    async def after_run_callback(
+        self, *, invocation_context: InvocationContext
+    ) -> None:
+        self._levels.pop(invocation_context.invocation_id, None)
+
+
+_controller: DegradationController | None = None
+
+
+def get_degradation_controller() -> DegradationController | None:
+    """Returns the process-wide degradation controller, or None when disabled."""
+    global _controller
+    if not DEGRADATION_ENABLED:
+        return None
+    if _controller is None:
+        _controller = DegradationController()
+    return _controller
@@ -15,15 +15,22 @@
 import os
 
 import google.auth
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from google.adk.cli.fast_api import get_fast_api_app
 from google.cloud import logging as google_cloud_logging
 from opentelemetry import trace
 from opentelemetry.sdk.trace import TracerProvider, export
 
+from app.admission import AdmissionMiddleware, get_admission_controller
+from app.agent import intent_router, pass_through, research_team_tool, root_agent
+from app.agent_parallel import cascade, degradation
 from app.app_utils.gcs import create_bucket_if_not_exists
 from app.app_utils.tracing import CloudTraceLoggingSpanExporter
 from app.app_utils.typing import Feedback
+from app.coalescing import CoalescingAgentTool
+from app.ollama_scheduler import scheduler_stats
+from app.response_cache import response_cache_stats
+from app.warmup import WARMUP_KEEP_ALIVE, Warmup, model_roster, warmup_lifespan
 
 _, project_id = google.auth.default()
 logging_client = google_cloud_logging.Client()
@@ -46,16 +53,30 @@ AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 # In-memory session configuration - no persistent storage
 session_service_uri = None
 
+# Preload the local Ollama models of every agent before taking traffic
+warmup = Warmup(model_roster(root_agent), keep_alive=WARMUP_KEEP_ALIVE)
+
 app: FastAPI = get_fast_api_app(
     agents_dir=AGENT_DIR,
     web=True,
     artifact_service_uri=bucket_name,
     allow_origins=allow_origins,
     session_service_uri=session_service_uri,
+    lifespan=lambda _: warmup_lifespan(warmup),
 )
 app.title = "aueb-agent"
 app.description = "API for interacting with the Agent aueb-agent"
 
+# Bound the research runs executing at once; the rest queue or get a 429.
+# Greetings and small talk answered from a template are not queued.
+admission = get_admission_controller()
+if admission is not None:
+    app.add_middleware(
+        AdmissionMiddleware,
+        controller=admission,
+        exempt=intent_router.answers_directly,
+    )
+
 
 @app.post("/feedback")
 def collect_feedback(feedback: Feedback) -> dict[str, str]:
@@ -71,6 +92,104 @@ def collect_feedback(feedback: Feedback) -> dict[str, str]:
     return {"status": "success"}
 
 
+@app.get("/scheduler")
+def get_scheduler_stats() -> list[dict]:
+    """Report queue depth and wait times of the Ollama host schedulers.
+
+    Returns:
+        One entry per Ollama host with per-model queue and wait statistics
+    """
+    return scheduler_stats()
+
+
+@app.get("/cache")
+def get_cache_stats() -> dict[str, dict[str, float]]:
+    """Report hit ratios of the worker response cache.
+
+    Returns:
+        Exact hits, semantic hits, misses and hit ratio per model
+    """
+    return response_cache_stats()
+
+
+@app.get("/intents")
+def get_intent_stats() -> dict[str, int]:
+    """Report how the orchestrator's turns were routed.
+
+    Returns:
+        Turns answered from templates, sent straight to the research team or
+        left to the orchestrator LLM, research answers passed through without
+        re-generation, and the LLM calls saved
+    """
+    stats = intent_router.stats()
+    stats["passed_through"] = pass_through.passed_through
+    stats["llm_calls_saved"] += pass_through.passed_through
+    return stats
+
+
+@app.get("/cascade")
+def get_cascade_stats() -> dict:
+    """Report how often the cascade's fast answers escalated to the panel.
+
+    Returns:
+        Kept and escalated answers with their average latency, the time
+        saved, and the escalation rate at other thresholds for tuning;
+        empty when cascade mode is off
+    """
+    return cascade.stats() if cascade is not None else {}
+
+
+@app.get("/degradation")
+def get_degradation_status() -> dict:
+    """Report how much answer quality is shed because of load.
+
+    Returns:
+        The current level and its policy, the pressure behind it and the
+        research runs served at each level; empty when disabled
+    """
+    return degradation.status() if degradation is not None else {}
+
+
+@app.get("/admission")
+def get_admission_stats() -> dict:
+    """Report admission control of the research endpoints.
+
+    Returns:
+        Running and queued runs, and per priority class the runs admitted
+        and rejected, their queue wait and their run time; empty when
+        admission is unlimited
+    """
+    return admission.stats() if admission is not None else {}
+
+
+@app.get("/coalescing")
+def get_coalescing_stats() -> dict[str, int]:
+    """Report how many research requests shared a run with an identical one.
+
+    Returns:
+        Research requests, the team runs they took, the requests coalesced
+        and the runs in flight; empty when coalescing is off
+    """
+    if not isinstance(research_team_tool, CoalescingAgentTool):
+        return {}
+    return research_team_tool.stats()
+
+
+@app.get("/ready")
+def get_readiness(response: Response) -> dict:
+    """Report whether model warm-up has finished.
+
+    Args:
+        response: The outgoing response, set to 503 while warming up
+
+    Returns:
+        Readiness and the load time of each preloaded model
+    """
+    if not warmup.ready:
+        response.status_code = 503
+    return warmup.status()
+
+
 # Main execution
 if __name__ == "__main__":
     import uvicorn
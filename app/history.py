@@ -0,0 +1,271 @@
+import hashlib
+import json
+import logging
+import os
+import re
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.genai import types as genai_types
+from opentelemetry import trace
+
+from app.llm_utils import generate_text, response_text
+from app.ollama_clients import get_async_client
+from app.ollama_model import OllamaLlm
+from app.residency import local_endpoint
+
+logger = logging.getLogger(__name__)
+
+HISTORY_WINDOW_ENABLED = os.getenv("HISTORY_WINDOW_ENABLED", "true").lower() == "true"
+# Context size of models whose num_ctx cannot be looked up (Ollama's default).
+DEFAULT_NUM_CTX = int(os.getenv("DEFAULT_NUM_CTX") or 4096)
+# Share of the context left free for the model's answer.
+HISTORY_OUTPUT_RESERVE = float(os.getenv("HISTORY_OUTPUT_RESERVE") or 0.25)
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS") or 256)
+
+SUMMARY_INSTRUCTION = """
+You maintain a running summary of a conversation between a user and a research
+assistant. Update the summary with the new messages. Keep the user's questions,
+the key facts and conclusions, and anything the user asked to remember. Be
+concise: at most a few short paragraphs. Output only the updated summary.
+"""
+
+# Rough size of a token in characters, good enough for budgeting.
+_CHARS_PER_TOKEN = 4
+_NUM_CTX = re.compile(r"^num_ctx\s+(\d+)", re.MULTILINE)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // _CHARS_PER_TOKEN + 1
+
+
+def content_text(content: genai_types.Content) -> str:
+    """Renders a content as transcript text, tool calls and results included."""
+    pieces = []
+    for part in content.parts or []:
+        if part.text and not part.thought:
+            pieces.append(part.text)
+        elif part.function_call:
+            args = json.dumps(part.function_call.args or {}, default=str)
+            pieces.append(f"[called {part.function_call.name}({args})]")
+        elif part.function_response:
+            result = json.dumps(part.function_response.response, default=str)
+            pieces.append(f"[{part.function_response.name} returned {result}]")
+    return "\n".join(pieces)
+
+
+class HistoryWindow:
+    """
+    `before_model_callback` that fits the conversation into the model's context.
+
+    The budget is the model's `num_ctx` minus a reserve for the answer and
+    the system instruction. The latest contents are kept verbatim while they
+    fit; older ones are replaced with a rolling summary. Summaries are cached
+    per conversation prefix and extended incrementally, so each dropped
+    message is summarized once and the summary is shared by every agent of
+    the session. A long history is summarized in chunks that fit the
+    summarizer's own context.
+
+    Used directly as a callback, the window assumes `default_num_ctx`;
+    `for_model` returns the callback of an agent whose model's context
+    size should be looked up.
+    """
+
+    def __init__(
+        self,
+        summarizer: BaseLlm | None,
+        default_num_ctx: int = DEFAULT_NUM_CTX,
+        output_reserve: float = HISTORY_OUTPUT_RESERVE,
+        enabled: bool = HISTORY_WINDOW_ENABLED,
+        max_cached_summaries: int = 512,
+        summarizer_num_ctx: int | None = None,
+    ) -> None:
+        """Initializes the window.
+
+        Args:
+            summarizer: Model that writes the summaries. Without one, old
+                contents are dropped instead.
+            default_num_ctx: Context size of models whose num_ctx is unknown.
+            output_reserve: Share of the context left for the answer.
+            enabled: Whether to window at all.
+            max_cached_summaries: Number of summaries kept in memory.
+            summarizer_num_ctx: Context size of the summarizer, looked up
+                like the agents' models when unset.
+        """
+        self.summarizer = summarizer
+        self.default_num_ctx = default_num_ctx
+        self.output_reserve = output_reserve
+        self.enabled = enabled
+        self.max_cached_summaries = max_cached_summaries
+        self.summarizer_num_ctx = summarizer_num_ctx
+        self._num_ctx: dict[tuple[str, str], int] = {}
+        self._summaries: OrderedDict[str, str] = OrderedDict()
+
+    async def __call__(
+        self, callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> None:
+        return await self.fit(callback_context, llm_request, None)
+
+    def for_model(
+        self, model: BaseLlm | str
+    ) -> Callable[[CallbackContext, LlmRequest], Awaitable[None]]:
+        """Returns the callback of an agent running `model`."""
+
+        async def callback(
+            callback_context: CallbackContext, llm_request: LlmRequest
+        ) -> None:
+            return await self.fit(callback_context, llm_request, model)
+
+        return callback
+
+    async def fit(
+        self,
+        callback_context: CallbackContext,
+        llm_request: LlmRequest,
+        model: BaseLlm | str | None,
+    ) -> None:
+        """Fits `llm_request` into the context of `model`, see the class."""
+        contents = llm_request.contents
+        if not self.enabled or len(contents) < 2:
+            return None
+
+        num_ctx = await self.num_ctx(model)
+        system = llm_request.config.system_instruction if llm_request.config else None
+        budget = int(num_ctx * (1 - self.output_reserve)) - estimate_tokens(
+            response_text(system)
+            if isinstance(system, genai_types.Content)
+            else str(system or "")
+        )
+
+        sizes = [estimate_tokens(content_text(content)) for content in contents]
+        if sum(sizes) <= budget:
+            return None
+
+        # Keep the newest contents that fit, always including the last one,
+        # and reserve room for the summary.
+        cut = len(contents) - 1
+        used = sizes[-1] + HISTORY_SUMMARY_TOKENS
+        while cut > 0 and used + sizes[cut - 1] <= budget:
+            cut -= 1
+            used += sizes[cut]
+        # A tool result must not be kept without the call that produced it.
+        while cut < len(contents) - 1 and any(
+            part.function_response for part in contents[cut].parts or []
+        ):
+            cut += 1
+
+        summary = await self.summary(callback_context.session.id, contents[:cut])
+        head = []
+        if summary:
+            head.append(
+                genai_types.Content(
+                    role="user",
+                    parts=[
+                        genai_types.Part(
+                            text=f"Summary of the earlier conversation:\n{summary}"
+                        )
+                    ],
+                )
+            )
+        llm_request.contents = head + contents[cut:]
+
+        span = trace.get_current_span()
+        span.set_attribute("history.num_ctx", num_ctx)
+        span.set_attribute("history.kept", len(contents) - cut)
+        span.set_attribute("history.summarized", cut)
+        return None
+
+    async def num_ctx(self, model: BaseLlm | str | None) -> int:
+        """Returns the context size `model` runs with."""
+        if (
+            isinstance(model, OllamaLlm)
+            and model.options
+            and model.options.get("num_ctx")
+        ):
+            return model.options["num_ctx"]
+        target = local_endpoint(model) if model is not None else None
+        if target is None:
+            return self.default_num_ctx
+        if target not in self._num_ctx:
+            host, model_id = target
+            try:
+                show = await get_async_client(host).show(model_id)
+                match = _NUM_CTX.search(show.get("parameters") or "")
+                self._num_ctx[target] = (
+                    int(match.group(1)) if match else self.default_num_ctx
+                )
+            except Exception as error:
+                logger.warning("Could not read num_ctx of %s: %s", model_id, error)
+                return self.default_num_ctx
+        return self._num_ctx[target]
+
+    async def summary(
+        self, session_id: str, contents: list[genai_types.Content]
+    ) -> str:
+        """
+        Returns the summary of `contents`, extending the longest cached prefix.
+
+        Args:
+            session_id: The session the contents belong to.
+            contents: The contents to summarize, oldest first.
+
+        Returns:
+            The summary, or "" when there is no summarizer. When the
+            summarizer fails, the last cached summary of a shorter prefix
+            is returned, or "".
+        """
+        if self.summarizer is None or not contents:
+            return ""
+        keys = []
+        digest = hashlib.sha256(session_id.encode())
+        for content in contents:
+            digest.update(content.model_dump_json(exclude_none=True).encode())
+            keys.append(digest.hexdigest())
+
+        start, summary = 0, ""
+        for index in range(len(keys), 0, -1):
+            if keys[index - 1] in self._summaries:
+                start, summary = index, self._summaries[keys[index - 1]]
+                self._summaries.move_to_end(keys[index - 1])
+                break
+
+        num_ctx = self.summarizer_num_ctx or await self.num_ctx(self.summarizer)
+        budget = max(
+            int(num_ctx * (1 - self.output_reserve))
+            - estimate_tokens(SUMMARY_INSTRUCTION)
+            - 2 * HISTORY_SUMMARY_TOKENS,
+            1,
+        )
+        sizes = [estimate_tokens(content_text(content)) for content in contents]
+        while start < len(contents):
+            # Fold in as many messages as fit the summarizer's context.
+            end, used = start + 1, sizes[start]
+            while end < len(contents) and used + sizes[end] <= budget:
+                used += sizes[end]
+                end += 1
+            transcript = "\n\n".join(
+                f"{content.role}: {content_text(content)}"
+                for content in contents[start:end]
+            )[: budget * _CHARS_PER_TOKEN]
+            try:
+                summary = await generate_text(
+                    self.summarizer,
+                    SUMMARY_INSTRUCTION,
+                    f"Current summary:\n{summary or '(none)'}\n\n"
+                    f"New messages:\n{transcript}",
+                    max_output_tokens=HISTORY_SUMMARY_TOKENS,
+                )
+            except Exception as error:
+                # The turn must not fail because of its history: keep the last
+                # good summary (or none, dropping the old contents) and retry
+                # on the next call.
+                logger.warning("Could not summarize the conversation: %s", error)
+                return summary
+            self._summaries[keys[end - 1]] = summary
+            while len(self._summaries) > self.max_cached_summaries:
+                self._summaries.popitem(last=False)
+            start = end
+        return summary
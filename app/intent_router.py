@@ -0,0 +1,258 @@
+import logging
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types as genai_types
+from opentelemetry import trace
+
+logger = logging.getLogger(__name__)
+
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "true").lower() == "true"
+# Below this confidence the orchestrator LLM decides.
+INTENT_ROUTER_MIN_CONFIDENCE = float(os.getenv("INTENT_ROUTER_MIN_CONFIDENCE") or 0.8)
+
+GREETING_REPLY = (
+    "Hello! I'm the orchestrator of a research team of expert AI models. "
+    "Ask me a question and the team will research and verify an answer. "
+    "What do you need help with?"
+)
+THANKS_REPLY = "You're welcome! Let me know if there is anything else to research."
+ABOUT_REPLY = (
+    "I'm the orchestrator of a research team: several open source models "
+    "answer your question in parallel and a verifier checks and merges their "
+    "answers, searching the web when they disagree. What would you like to know?"
+)
+
+_GREETING = re.compile(
+    r"^(hi|hello|hey|hiya|howdy|greetings|yo|good (morning|afternoon|evening))"
+    r"( there| team| everyone| all)?[\s!.,:)]*$",
+    re.IGNORECASE,
+)
+_THANKS = re.compile(
+    r"^(thanks|thank you|thx|cheers|great,? thanks?)( (a lot|so much|very much))?"
+    r"[\s!.,:)]*$",
+    re.IGNORECASE,
+)
+_ABOUT = re.compile(
+    r"^(how are you|who are you|what are you|what can you do|what do you do)"
+    r"( doing| today)?[\s?!.]*$",
+    re.IGNORECASE,
+)
+# Follow-ups must not name a subject of their own: "simplify it" refines the
+# previous answer, "simplify (x+1)^2" is a new question. So the patterns are
+# anchored to the whole message and only accept a pronoun or a numbered part
+# of the answer as the object.
+_THAT = r"(it|that|this|the answer|your answer)"
+_PART = (
+    r"((point|item|step|part|section) (\d+|one|two|three|four|five)|"
+    r"the (first|second|third|last) (point|item|step|part|section))"
+)
+_POLITE_START = r"^(please )?((can|could|would) you )?"
+_POLITE_END = r"( please)?[\s.!?]*$"
+# Requests to present the previous answer differently.
+_REFORMAT = re.compile(
+    _POLITE_START + r"("
+    rf"make {_THAT} (shorter|longer|simpler|clearer|briefer|more concise|"
+    r"more formal|less formal|easier to (read|understand))|"
+    rf"(reformat|rephrase|rewrite|reword|shorten|simplify|summari[sz]e) {_THAT}"
+    r"( (again|more|further))?|"
+    rf"translate {_THAT}( (in)?to [a-z]+)?|"
+    rf"(put|turn|format|present) {_THAT} (in|into|as) (a |an )?([a-z]+ )?"
+    r"(table|list|bullet points|bullets|paragraph|markdown|json|steps)|"
+    r"(shorter|simpler|briefer|more concise)"
+    r")" + _POLITE_END,
+    re.IGNORECASE,
+)
+# Requests to go deeper into part of the previous answer.
+_ELABORATE = re.compile(
+    _POLITE_START + r"("
+    rf"(expand|elaborate)( on)?( {_THAT}| {_PART})?|"
+    rf"(tell me more|go deeper|more details?)( (about|into|on) ({_THAT}|{_PART}))?|"
+    rf"explain ({_THAT}|{_PART})( (more|further|in more detail|again))?|"
+    rf"what about {_PART}"
+    r")" + _POLITE_END,
+    re.IGNORECASE,
+)
+# Intents that refine the previous research turn rather than ask a new
+# question.
+FOLLOW_UP_INTENTS = frozenset({"reformat", "elaborate"})
+_QUESTION_START = re.compile(
+    r"^(what|why|how|when|where|which|who|whose|is|are|was|were|does|do|did|"
+    r"can|could|should|would|will)\b",
+    re.IGNORECASE,
+)
+_TASK_START = re.compile(
+    r"^(explain|compare|describe|summari[sz]e|list|analy[sz]e|research|"
+    r"find|tell me about|give me|outline)\b",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class Intent:
+    label: str
+    confidence: float
+    reply: str | None = None
+
+
+def classify(text: str) -> Intent:
+    """
+    Classifies a user message with cheap rules.
+
+    Args:
+        text: The user's message.
+
+    Returns:
+        "greeting", "thanks" and "about" intents carry a templated reply;
+        "research" marks a question for the research team; "reformat" asks
+        to present the last answer differently and "elaborate" to go deeper
+        into part of it, both only when the message names nothing but that
+        answer; "unknown" leaves the decision to the orchestrator.
+    """
+    text = " ".join(text.split())
+    words = len(text.split())
+    if _GREETING.match(text):
+        return Intent("greeting", 0.95, GREETING_REPLY)
+    if _THANKS.match(text):
+        return Intent("thanks", 0.95, THANKS_REPLY)
+    if _ABOUT.match(text):
+        return Intent("about", 0.9, ABOUT_REPLY)
+    if _REFORMAT.match(text):
+        return Intent("reformat", 0.9)
+    if _ELABORATE.match(text):
+        return Intent("elaborate", 0.85)
+    if _QUESTION_START.match(text) and words >= 5:
+        return Intent("research", 0.9 if text.endswith("?") else 0.8)
+    if _TASK_START.match(text) and words >= 4:
+        return Intent("research", 0.85)
+    if text.endswith("?") and words >= 5:
+        return Intent("research", 0.7)
+    return Intent("unknown", 0.0)
+
+
+class IntentRouter:
+    """
+    `before_model_callback` that answers obvious turns without the LLM.
+
+    Greetings and small talk get a templated reply, and clear research
+    questions are sent straight to the research tool with a synthetic
+    function call. Follow-ups that refine the previous research turn go to
+    the research tool as well when `follow_up_key` is set in state, so the
+    team can rework its stored answers instead of the orchestrator guessing.
+    Anything below `min_confidence`, and every turn that is not a fresh user
+    message (e.g. a tool result), goes to the model.
+    """
+
+    def __init__(
+        self,
+        research_tool: str,
+        min_confidence: float = INTENT_ROUTER_MIN_CONFIDENCE,
+        enabled: bool = INTENT_ROUTER_ENABLED,
+        follow_up_key: str | None = None,
+    ) -> None:
+        """Initializes the router.
+
+        Args:
+            research_tool: Name of the tool that runs the research team.
+            min_confidence: Confidence needed to skip the model.
+            enabled: Whether to route at all.
+            follow_up_key: State key the research team sets once it has
+                answered in this session. Without it follow-ups go to the
+                model.
+        """
+        self.research_tool = research_tool
+        self.follow_up_key = follow_up_key
+        self.min_confidence = min_confidence
+        self.enabled = enabled
+        self.routes: Counter[str] = Counter()
+
+    def __call__(
+        self, callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> LlmResponse | None:
+        text = _latest_user_text(llm_request)
+        if not self.enabled or text is None:
+            return None
+
+        intent = classify(text)
+        if intent.label in FOLLOW_UP_INTENTS:
+            has_answer = self.follow_up_key is not None and bool(
+                callback_context.state.get(self.follow_up_key)
+            )
+            route = "follow_up" if has_answer else "llm"
+            response = self._research_call(text) if has_answer else None
+        elif intent.confidence < self.min_confidence:
+            route = "llm"
+            response = None
+        elif intent.reply is not None:
+            route = "template"
+            response = LlmResponse(
+                content=genai_types.Content(
+                    role="model", parts=[genai_types.Part(text=intent.reply)]
+                )
+            )
+        else:
+            route = "research"
+            response = self._research_call(text)
+
+        self.routes[route] += 1
+        logger.info(
+            "Intent %s (confidence %.2f) routed to %s",
+            intent.label,
+            intent.confidence,
+            route,
+        )
+        span = trace.get_current_span()
+        span.set_attribute("intent.label", intent.label)
+        span.set_attribute("intent.confidence", intent.confidence)
+        span.set_attribute("intent.route", route)
+        return response
+
+    def answers_directly(self, text: str) -> bool:
+        """Whether a user message gets a templated reply, without any tool."""
+        if not self.enabled:
+            return False
+        intent = classify(text)
+        return intent.reply is not None and intent.confidence >= self.min_confidence
+
+    def _research_call(self, text: str) -> LlmResponse:
+        """A model turn calling the research tool with the user's message."""
+        return LlmResponse(
+            content=genai_types.Content(
+                role="model",
+                parts=[
+                    genai_types.Part.from_function_call(
+                        name=self.research_tool, args={"request": text}
+                    )
+                ],
+            )
+        )
+
+    def stats(self) -> dict[str, int]:
+        """Returns the routing counts and the orchestrator calls saved."""
+        return {
+            "template": self.routes["template"],
+            "research": self.routes["research"],
+            "follow_up": self.routes["follow_up"],
+            "llm": self.routes["llm"],
+            "llm_calls_saved": self.routes["template"]
+            + self.routes["research"]
+            + self.routes["follow_up"],
+        }
+
+
+def _latest_user_text(llm_request: LlmRequest) -> str | None:
+    """The text of the last content if it is a plain user message."""
+    if not llm_request.contents:
+        return None
+    content = llm_request.contents[-1]
+    if content.role != "user" or not content.parts:
+        return None
+    if any(part.function_response for part in content.parts):
+        return None
+    text = " ".join(part.text for part in content.parts if part.text).strip()
+    return text or None
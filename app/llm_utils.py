@@ -0,0 +1,50 @@
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.genai import types as genai_types
+
+
+def response_text(content: genai_types.Content | None) -> str:
+    """Joins the text parts of a model content, ignoring thoughts."""
+    if not content or not content.parts:
+        return ""
+    return "".join(
+        part.text for part in content.parts if part.text and not part.thought
+    )
+
+
+async def generate_text(
+    model: BaseLlm,
+    instruction: str,
+    prompt: str,
+    max_output_tokens: int | None = None,
+) -> str:
+    """
+    Runs a single, tool-less model call outside of the agent flow.
+
+    Used for the small helper calls of the research pipeline (digests,
+    summaries, merges) that do not need to show up as agent events.
+
+    Args:
+        model: The model to call.
+        instruction: The system instruction for the call.
+        prompt: The user prompt.
+        max_output_tokens: Optional cap on the generated tokens.
+
+    Returns:
+        The text of the final model response.
+    """
+    llm_request = LlmRequest(
+        model=model.model,
+        contents=[
+            genai_types.Content(role="user", parts=[genai_types.Part(text=prompt)])
+        ],
+        config=genai_types.GenerateContentConfig(
+            system_instruction=instruction,
+            max_output_tokens=max_output_tokens,
+        ),
+    )
+    text = ""
+    async for llm_response in model.generate_content_async(llm_request):
+        if not llm_response.partial:
+            text += response_text(llm_response.content)
+    return text
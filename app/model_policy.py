@@ -0,0 +1,378 @@
+import asyncio
+import json
+import logging
+import os
+import random
+from collections import deque
+from collections.abc import AsyncGenerator, Awaitable, Callable
+from contextvars import ContextVar
+from dataclasses import dataclass, field, fields
+from typing import TypeVar
+
+import httpx
+from google.adk.models.llm_response import LlmResponse
+from opentelemetry import trace
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+T = TypeVar("T")
+
+
+@dataclass
+class CallPolicy:
+    """Timeout, retry and hedging settings for the calls to one model."""
+
+    timeout_s: float | None = 300.0
+    """Time limit of one attempt (until the first chunk when streaming).
+
+    It starts when the attempt is dispatched to its host, so time spent
+    queued in the scheduler does not count against it.
+    """
+
+    max_retries: int = 2
+    """Retries after the first attempt, on retryable errors only."""
+
+    backoff_base_s: float = 0.5
+    backoff_max_s: float = 8.0
+
+    hedge: bool = False
+    """Send a duplicate call once an attempt outlives `hedge_quantile`."""
+
+    hedge_quantile: float = 0.95
+    hedge_min_samples: int = 20
+    """Latency samples needed before hedging starts."""
+
+    hedge_api_base: str | None = None
+    """Backend for the duplicate call. Defaults to the model's own backend."""
+
+
+@dataclass
+class _LatencyWindow:
+    samples: deque = field(default_factory=lambda: deque(maxlen=200))
+
+    def quantile(self, q: float) -> float:
+        ordered = sorted(self.samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+_latencies: dict[str, _LatencyWindow] = {}
+
+
+class _Deadline:
+    """
+    Cancels the current task once `timeout_s` passed, like `asyncio.timeout`
+    (which needs Python 3.11). It can be paused and restarted.
+    """
+
+    def __init__(self, timeout_s: float) -> None:
+        self.timeout_s = timeout_s
+        self.expired = False
+        self._task = asyncio.current_task()
+        self._handle: asyncio.TimerHandle | None = None
+        self.restart()
+
+    def pause(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def restart(self) -> None:
+        self.pause()
+        loop = asyncio.get_running_loop()
+        self._handle = loop.call_later(self.timeout_s, self._expire)
+
+    def _expire(self) -> None:
+        self.expired = True
+        if self._task is not None:
+            self._task.cancel()
+
+
+@dataclass
+class _Dispatch:
+    """Progress of one attempt through its host queue."""
+
+    queued: asyncio.Event = field(default_factory=asyncio.Event)
+    dispatched: asyncio.Event = field(default_factory=asyncio.Event)
+    deadline: _Deadline | None = None
+    """Timeout of an attempt that runs in the caller's own task."""
+
+
+# The attempt running in the current context; the host scheduler reports to it.
+_dispatch: ContextVar[_Dispatch | None] = ContextVar("dispatch", default=None)
+
+
+def _load_policies() -> dict[str, CallPolicy]:
+    """Parses MODEL_CALL_POLICIES, a JSON object of policies per model id.
+
+    The "default" entry applies to every model and is overridden field by
+    field by the model's own entry, e.g.
+    {"default": {"timeout_s": 120}, "mistral:latest": {"hedge": true}}.
+    """
+    raw = json.loads(os.getenv("MODEL_CALL_POLICIES") or "{}")
+    known = {f.name for f in fields(CallPolicy)}
+    default = {k: v for k, v in raw.pop("default", {}).items() if k in known}
+    return {
+        "default": CallPolicy(**default),
+        **{
+            model: CallPolicy(
+                **{**default, **{k: v for k, v in overrides.items() if k in known}}
+            )
+            for model, overrides in raw.items()
+        },
+    }
+
+
+_policies = _load_policies()
+
+
+def get_call_policy(model: str) -> CallPolicy:
+    """Returns the call policy configured for `model`."""
+    return _policies.get(model, _policies["default"])
+
+
+def mark_queued() -> None:
+    """Stops the timeout of the current attempt while it waits for a host slot."""
+    dispatch = _dispatch.get()
+    if dispatch is not None:
+        dispatch.queued.set()
+        if dispatch.deadline is not None:
+            dispatch.deadline.pause()
+
+
+def mark_dispatched() -> None:
+    """Restarts the timeout of the current attempt once it got its host slot."""
+    dispatch = _dispatch.get()
+    if dispatch is not None:
+        dispatch.dispatched.set()
+        if dispatch.deadline is not None:
+            dispatch.deadline.restart()
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a failed model call is worth retrying."""
+    if isinstance(error, (asyncio.TimeoutError, httpx.TransportError, ConnectionError)):
+        return True
+    return getattr(error, "status_code", None) in RETRYABLE_STATUS_CODES
+
+
+def _backoff(policy: CallPolicy, retry: int) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(
+        0, min(policy.backoff_max_s, policy.backoff_base_s * 2**retry)
+    )
+
+
+async def call_with_policy(
+    model: str,
+    start: Callable[[bool], AsyncGenerator[LlmResponse, None]],
+    stream: bool = False,
+    policy: CallPolicy | None = None,
+) -> AsyncGenerator[LlmResponse, None]:
+    """
+    Runs a model call under its timeout, retry and hedging policy.
+
+    Retries use jittered exponential backoff and only happen on retryable
+    errors. When streaming, a call is only retried while nothing has been
+    yielded yet and it is never hedged. Policy decisions are recorded on the
+    current trace span.
+
+    Args:
+        model: The model id, used to look up the policy and latency history.
+        start: Starts one attempt; called with True for the hedged duplicate.
+        stream: Whether the call streams partial responses.
+        policy: Overrides the configured policy for `model`.
+
+    Yields:
+        The responses of the successful attempt.
+    """
+    policy = policy or get_call_policy(model)
+    latency = _latencies.setdefault(model, _LatencyWindow())
+    span = trace.get_current_span()
+    span.set_attribute("policy.timeout_s", policy.timeout_s or 0)
+    span.set_attribute("policy.max_retries", policy.max_retries)
+
+    retry = 0
+    while True:
+        try:
+            if stream:
+                async for llm_response in _stream_attempt(start, policy):
+                    yield llm_response
+                    # Once output reached the caller the call cannot be replayed.
+                    retry = policy.max_retries
+                span.set_attribute("policy.attempts", retry + 1)
+                return
+            responses = await _hedged_attempt(start, policy, latency, span)
+        except Exception as error:
+            if retry >= policy.max_retries or not is_retryable(error):
+                span.set_attribute("policy.attempts", retry + 1)
+                raise
+            delay = _backoff(policy, retry)
+            retry += 1
+            logger.warning(
+                "Retrying %s in %.2fs (retry %d/%d) after %r",
+                model,
+                delay,
+                retry,
+                policy.max_retries,
+                error,
+            )
+            span.add_event(
+                "policy.retry",
+                {"retry": retry, "delay_s": delay, "error": type(error).__name__},
+            )
+            await asyncio.sleep(delay)
+            continue
+
+        span.set_attribute("policy.attempts", retry + 1)
+        for llm_response in responses:
+            yield llm_response
+        return
+
+
+async def _until(
+    task: asyncio.Future, event: asyncio.Event, timeout_s: float | None
+) -> None:
+    """Waits until `task` is done or `event` is set, for at most `timeout_s`."""
+    waiter = asyncio.ensure_future(event.wait())
+    try:
+        await asyncio.wait(
+            {task, waiter}, timeout=timeout_s, return_when=asyncio.FIRST_COMPLETED
+        )
+    finally:
+        waiter.cancel()
+
+
+async def _timed(
+    call: Callable[[], Awaitable[T]],
+    timeout_s: float | None,
+    latency: _LatencyWindow | None = None,
+) -> T:
+    """
+    Runs `call` in its own task and times it out after `timeout_s`.
+
+    Time the attempt spends waiting in its host queue (reported through
+    `mark_queued` and `mark_dispatched`) does not count: the timeout starts
+    over once the attempt is dispatched. On success the time since the
+    dispatch is added to `latency`.
+    """
+    dispatch = _Dispatch()
+    token = _dispatch.set(dispatch)
+    try:
+        task = asyncio.ensure_future(call())
+    finally:
+        _dispatch.reset(token)
+    try:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await _until(task, dispatch.queued, timeout_s)
+        if dispatch.queued.is_set():
+            await _until(task, dispatch.dispatched, None)
+            started = loop.time()
+        if timeout_s is None:
+            result = await task
+        else:
+            remaining = max(started + timeout_s - loop.time(), 0)
+            result = await asyncio.wait_for(asyncio.shield(task), remaining)
+        if latency is not None:
+            latency.samples.append(loop.time() - started)
+        return result
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+async def _first_chunk(
+    responses: AsyncGenerator[LlmResponse, None], timeout_s: float | None
+) -> LlmResponse:
+    """
+    Awaits the first chunk of a stream and times it out after `timeout_s`.
+
+    Unlike `_timed`, this runs in the caller's task, so the generator and
+    the context managers it enters stay in the task that consumes the rest
+    of the stream. Queue time does not count against the timeout either.
+    """
+    if timeout_s is None:
+        return await anext(responses)
+    deadline = _Deadline(timeout_s)
+    token = _dispatch.set(_Dispatch(deadline=deadline))
+    try:
+        return await anext(responses)
+    except asyncio.CancelledError:
+        if not deadline.expired:
+            raise
+        task = asyncio.current_task()
+        if task is not None and hasattr(task, "uncancel"):
+            task.uncancel()
+        raise asyncio.TimeoutError() from None
+    finally:
+        deadline.pause()
+        _dispatch.reset(token)
+
+
+async def _stream_attempt(
+    start: Callable[[bool], AsyncGenerator[LlmResponse, None]], policy: CallPolicy
+) -> AsyncGenerator[LlmResponse, None]:
+    """One streaming attempt; the timeout covers the wait for the first chunk."""
+    responses = start(False)
+    try:
+        try:
+            first = await _first_chunk(responses, policy.timeout_s)
+        except StopAsyncIteration:
+            return
+        yield first
+        async for llm_response in responses:
+            yield llm_response
+    finally:
+        await responses.aclose()
+
+
+async def _hedged_attempt(
+    start: Callable[[bool], AsyncGenerator[LlmResponse, None]],
+    policy: CallPolicy,
+    latency: _LatencyWindow,
+    span: trace.Span,
+) -> list[LlmResponse]:
+    """One non-streaming attempt, duplicated once it passes the hedge quantile."""
+
+    async def collect(hedged: bool) -> list[LlmResponse]:
+        return [r async for r in start(hedged)]
+
+    primary = asyncio.ensure_future(
+        _timed(lambda: collect(False), policy.timeout_s, latency)
+    )
+    secondary = None
+    try:
+        if not policy.hedge or len(latency.samples) < policy.hedge_min_samples:
+            return await primary
+
+        hedge_after = latency.quantile(policy.hedge_quantile)
+        done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+        if done:
+            return primary.result()
+
+        span.add_event("policy.hedge", {"after_s": hedge_after})
+        secondary = asyncio.ensure_future(
+            _timed(lambda: collect(True), policy.timeout_s, latency)
+        )
+        pending = {primary, secondary}
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    span.set_attribute("policy.hedge_won", task is secondary)
+                    return task.result()
+        # Both attempts failed: surface the primary's error.
+        return primary.result()
+    finally:
+        outstanding = [
+            task for task in (primary, secondary) if task and not task.done()
+        ]
+        for task in outstanding:
+            task.cancel()
+        # Wait for the attempts to hand back their scheduler slots.
+        await asyncio.gather(*outstanding, return_exceptions=True)
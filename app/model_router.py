@@ -0,0 +1,322 @@
+import logging
+import os
+import time
+from collections.abc import AsyncGenerator
+from dataclasses import dataclass, field
+
+import yaml
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from opentelemetry import trace
+
+from app.model_policy import is_retryable
+from app.ollama_cloud_model import (
+    CLOUD_OLLAMA_HOST,
+    CLOUD_PARALLEL_SLOTS,
+    OllamaCloudLlm,
+)
+from app.ollama_fix import OllamaLiteLlm
+from app.ollama_model import OllamaLlm
+from app.ollama_scheduler import LOCAL_OLLAMA_BASE, get_scheduler
+from app.response_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+MODEL_ROSTER_PATH = os.getenv("MODEL_ROSTER_PATH") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "model_roster.yaml"
+)
+# Backend of local endpoints that do not name one: "native" talks to Ollama
+# through ollama.AsyncClient, "litellm" goes through LiteLLM.
+LOCAL_WORKER_BACKEND = os.getenv("LOCAL_WORKER_BACKEND", "litellm")
+# Passive health checks: an endpoint is skipped for ENDPOINT_COOLDOWN_S after
+# ENDPOINT_FAILURE_THRESHOLD consecutive failed calls.
+ENDPOINT_FAILURE_THRESHOLD = int(os.getenv("ENDPOINT_FAILURE_THRESHOLD") or 3)
+ENDPOINT_COOLDOWN_S = float(os.getenv("ENDPOINT_COOLDOWN_S") or 30)
+
+
+@dataclass
+class Endpoint:
+    """One Ollama server a model can be called on."""
+
+    name: str
+    api_base: str
+    backend: str
+    overflow: bool = False
+    failures: int = 0
+    unhealthy_until: float = 0.0
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.unhealthy_until
+
+    def load(self) -> float:
+        """Busy share of the endpoint's slots, queued calls included."""
+        if self.backend == "cloud":
+            scheduler = get_scheduler(
+                CLOUD_OLLAMA_HOST,
+                parallel_slots=CLOUD_PARALLEL_SLOTS,
+                max_loaded_models=None,
+            )
+        else:
+            scheduler = get_scheduler(self.api_base)
+        return scheduler.load()
+
+
+@dataclass
+class Roster:
+    """The contents of the roster file."""
+
+    endpoints: dict[str, Endpoint] = field(default_factory=dict)
+    models: dict[str, list[str]] = field(default_factory=dict)
+    workers: list[dict] = field(default_factory=list)
+
+
+def load_roster(path: str) -> Roster:
+    """
+    Parses the roster file.
+
+    Endpoints without an `api_base` use OLLAMA_API_BASE. The backend of an
+    endpoint defaults to "cloud" for Ollama Cloud and LOCAL_WORKER_BACKEND
+    otherwise.
+
+    Args:
+        path: Path of the YAML roster.
+
+    Returns:
+        The endpoints, the endpoints of each model and the worker specs.
+    """
+    with open(path) as roster_file:
+        config = yaml.safe_load(roster_file) or {}
+
+    endpoints = {}
+    for name, spec in (config.get("endpoints") or {}).items():
+        spec = spec or {}
+        api_base = (spec.get("api_base") or LOCAL_OLLAMA_BASE).rstrip("/")
+        default_backend = (
+            "cloud" if api_base == CLOUD_OLLAMA_HOST else LOCAL_WORKER_BACKEND
+        )
+        endpoints[name] = Endpoint(
+            name=name,
+            api_base=api_base,
+            backend=spec.get("backend") or default_backend,
+            overflow=bool(spec.get("overflow")),
+        )
+    models = {
+        model: list(model_endpoints)
+        for model, model_endpoints in (config.get("models") or {}).items()
+    }
+    for model, model_endpoints in models.items():
+        unknown = set(model_endpoints) - set(endpoints)
+        if unknown:
+            raise ValueError(f"Model {model} uses unknown endpoints {unknown}")
+    return Roster(endpoints, models, list(config.get("workers") or []))
+
+
+class ModelRouter:
+    """
+    Routes model calls to the least-loaded healthy endpoint serving the model.
+
+    Overflow endpoints (e.g. Ollama Cloud) only take calls when every regular
+    endpoint of the model is saturated or unhealthy. The roster file is
+    re-read when it changes on disk, without restarting the process.
+    """
+
+    def __init__(self, path: str = MODEL_ROSTER_PATH) -> None:
+        """Initializes the router from a roster file.
+
+        Args:
+            path: Path of the YAML roster.
+        """
+        self.path = path
+        self._mtime: float | None = os.stat(path).st_mtime
+        self.roster = load_roster(path)
+        self._backends: dict[tuple[str, str], BaseLlm] = {}
+        # Endpoints of models a reload dropped, for workers still calling them.
+        self._retired: dict[str, list[Endpoint]] = {}
+
+    def refresh(self) -> bool:
+        """Reloads the roster if its file changed; returns whether it did.
+
+        Health state is kept for endpoints whose address did not change. A
+        roster that fails to load, or was deleted, is logged and the current
+        one kept. Models the new roster drops keep their last endpoints.
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            if self._mtime is not None:
+                logger.warning("Keeping the current roster, %s is gone", self.path)
+                self._mtime = None
+            return False
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        try:
+            roster = load_roster(self.path)
+        except Exception:
+            logger.exception("Keeping the current roster, %s is invalid", self.path)
+            return False
+        for name, endpoint in roster.endpoints.items():
+            previous = self.roster.endpoints.get(name)
+            if previous is not None and previous.api_base == endpoint.api_base:
+                endpoint.failures = previous.failures
+                endpoint.unhealthy_until = previous.unhealthy_until
+        for model in set(self.roster.models) - set(roster.models):
+            self._retired[model] = self.endpoints(model)
+        for model in roster.models:
+            self._retired.pop(model, None)
+        self.roster = roster
+        self._backends.clear()
+        logger.info("Reloaded model roster from %s", self.path)
+        return True
+
+    def routes(self, model: str) -> bool:
+        return model in self.roster.models
+
+    def endpoints(self, model: str) -> list[Endpoint]:
+        """The endpoints serving `model`, or its last ones if it was dropped."""
+        if model in self.roster.models:
+            return [self.roster.endpoints[name] for name in self.roster.models[model]]
+        if model in self._retired:
+            return self._retired[model]
+        raise LookupError(f"The model roster has no endpoints for {model}")
+
+    def pick(self, model: str, tried: set[str]) -> Endpoint | None:
+        """Picks the endpoint for the next attempt at calling `model`.
+
+        Args:
+            model: The Ollama model id.
+            tried: Names of the endpoints that already failed this call.
+
+        Returns:
+            The endpoint to use, or None when every endpoint was tried.
+        """
+        now = time.monotonic()
+        untried = [e for e in self.endpoints(model) if e.name not in tried]
+        healthy = [e for e in untried if e.healthy(now)]
+        if not healthy:
+            # Everything is cooling down: probe the endpoint that recovers first.
+            return min(untried, key=lambda e: e.unhealthy_until, default=None)
+
+        regular = [e for e in healthy if not e.overflow]
+        overflow = [e for e in healthy if e.overflow]
+        if regular:
+            best = min(regular, key=Endpoint.load)
+            if best.load() < 1 or not overflow:
+                return best
+        return min(overflow, key=Endpoint.load)
+
+    def record_success(self, endpoint: Endpoint) -> None:
+        endpoint.failures = 0
+        endpoint.unhealthy_until = 0.0
+
+    def record_failure(self, endpoint: Endpoint) -> None:
+        endpoint.failures += 1
+        if endpoint.failures >= ENDPOINT_FAILURE_THRESHOLD:
+            logger.warning(
+                "Endpoint %s failed %d times, skipping it for %ss",
+                endpoint.name,
+                endpoint.failures,
+                ENDPOINT_COOLDOWN_S,
+            )
+            endpoint.unhealthy_until = time.monotonic() + ENDPOINT_COOLDOWN_S
+
+    def backend(self, endpoint: Endpoint, model: str) -> BaseLlm:
+        """Returns the model client for `model` on `endpoint`."""
+        key = (endpoint.name, model)
+        if key not in self._backends:
+            llm: BaseLlm
+            if endpoint.backend == "cloud":
+                llm = OllamaCloudLlm(model)
+            elif endpoint.backend == "native":
+                llm = OllamaLlm(model=model, host=endpoint.api_base)
+            else:
+                llm = OllamaLiteLlm(
+                    model=f"ollama_chat/{model}", api_base=endpoint.api_base
+                )
+            self._backends[key] = llm
+        return self._backends[key]
+
+
+class RoutedLlm(BaseLlm):
+    """
+    Calls a model on whichever of its endpoints the router picks.
+
+    A call that fails with a retryable error before producing any output
+    fails over to the next endpoint; failures and successes feed the
+    router's passive health checks.
+    """
+
+    router: ModelRouter
+    response_cache: ResponseCache | None = None
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        if self.response_cache is None:
+            responses = self._generate_routed(llm_request, stream)
+        else:
+            responses = self.response_cache.serve(
+                self.model,
+                llm_request,
+                lambda: self._generate_routed(llm_request, stream),
+            )
+        async for llm_response in responses:
+            yield llm_response
+
+    async def _generate_routed(
+        self, llm_request: LlmRequest, stream: bool
+    ) -> AsyncGenerator[LlmResponse, None]:
+        span = trace.get_current_span()
+        tried: set[str] = set()
+        last_error: Exception = RuntimeError(f"No endpoint serves {self.model}")
+        while True:
+            endpoint = self.router.pick(self.model, tried)
+            if endpoint is None:
+                raise last_error
+            span.set_attribute("router.endpoint", endpoint.name)
+            produced = False
+            try:
+                async for llm_response in self.router.backend(
+                    endpoint, self.model
+                ).generate_content_async(llm_request, stream=stream):
+                    produced = True
+                    yield llm_response
+            except Exception as error:
+                if not is_retryable(error):
+                    raise
+                self.router.record_failure(endpoint)
+                if produced:
+                    raise
+                logger.warning(
+                    "%s failed on %s, failing over: %r",
+                    self.model,
+                    endpoint.name,
+                    error,
+                )
+                span.add_event(
+                    "router.failover",
+                    {"endpoint": endpoint.name, "error": type(error).__name__},
+                )
+                tried.add(endpoint.name)
+                last_error = error
+                continue
+            self.router.record_success(endpoint)
+            return
+
+    @property
+    def primary_endpoint(self) -> Endpoint:
+        """The first regular endpoint of the model, e.g. for warm-up."""
+        endpoints = self.router.endpoints(self.model)
+        return next((e for e in endpoints if not e.overflow), endpoints[0])
+
+
+_router: ModelRouter | None = None
+
+
+def get_model_router() -> ModelRouter | None:
+    """Returns the process-wide router, or None when there is no roster file."""
+    global _router
+    if _router is None and os.path.exists(MODEL_ROSTER_PATH):
+        _router = ModelRouter(MODEL_ROSTER_PATH)
+    return _router
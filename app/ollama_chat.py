@@ -0,0 +1,83 @@
+from collections.abc import AsyncGenerator
+from typing import Any
+
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types as genai_types
+from ollama import AsyncClient
+
+from app.ollama_messages import response_parts
+from app.ollama_usage import ollama_timings, ollama_usage_metadata, record_usage
+
+
+async def ollama_chat(
+    client: AsyncClient, request: dict[str, Any], stream: bool
+) -> AsyncGenerator[LlmResponse, None]:
+    """
+    Sends one chat request to Ollama and maps the reply to ADK responses.
+
+    Shared by the local and the cloud backend. When streaming, every text
+    delta is yielded as a partial response, followed by the aggregated
+    final response; otherwise only the final response is yielded.
+
+    Args:
+        client: The Ollama client to call.
+        request: Keyword arguments of `AsyncClient.chat`, including `model`.
+        stream: Whether to stream partial responses.
+
+    Yields:
+        The partial responses, then the final response with usage and timings.
+    """
+    model = request["model"]
+    if not stream:
+        response = await client.chat(**request)
+        message = response["message"]
+        yield final_response(
+            model,
+            message.get("content") or "",
+            message.get("thinking") or "",
+            message.get("tool_calls") or [],
+            response,
+        )
+        return
+
+    text = ""
+    thinking = ""
+    tool_calls: list[dict] = []
+    stats: Any = {}
+    async for chunk in await client.chat(**request, stream=True):
+        if chunk.get("done"):
+            # Only the last chunk carries the counts and timings.
+            stats = chunk
+        message = chunk["message"]
+        tool_calls.extend(message.get("tool_calls") or [])
+        thinking += message.get("thinking") or ""
+        delta = message.get("content") or ""
+        if not delta:
+            continue
+        text += delta
+        yield LlmResponse(
+            content=genai_types.Content(
+                role="model", parts=[genai_types.Part(text=delta)]
+            ),
+            partial=True,
+        )
+    yield final_response(model, text, thinking, tool_calls, stats)
+
+
+def final_response(
+    model: str, text: str, thinking: str, tool_calls: list, stats: Any
+) -> LlmResponse:
+    """Builds the final response of a call and records its usage on the span."""
+    llm_response = LlmResponse(
+        content=genai_types.Content(
+            role="model", parts=response_parts(text, thinking, tool_calls)
+        ),
+        finish_reason=genai_types.FinishReason.STOP,
+        usage_metadata=ollama_usage_metadata(stats),
+        turn_complete=True,
+    )
+    timings = ollama_timings(stats)
+    if timings:
+        llm_response.custom_metadata = {"ollama_timings": timings}
+    record_usage(model, llm_response.usage_metadata, timings)
+    return llm_response
@@ -0,0 +1,87 @@
+import asyncio
+import hashlib
+import importlib.util
+import logging
+import os
+
+import httpx
+from ollama import AsyncClient
+
+logger = logging.getLogger(__name__)
+
+OLLAMA_HTTP_MAX_CONNECTIONS = int(os.getenv("OLLAMA_HTTP_MAX_CONNECTIONS") or 64)
+OLLAMA_HTTP_MAX_KEEPALIVE = int(os.getenv("OLLAMA_HTTP_MAX_KEEPALIVE") or 32)
+OLLAMA_HTTP_KEEPALIVE_S = float(os.getenv("OLLAMA_HTTP_KEEPALIVE_S") or 120)
+# HTTP/2 needs the optional `h2` package and only applies to https hosts.
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+_clients: dict[
+    tuple[str, str | None], tuple[asyncio.AbstractEventLoop, AsyncClient]
+] = {}
+
+
+# Keeps the closing of replaced clients alive until it is done.
+_closing: set[asyncio.Future] = set()
+
+
+async def _close_quietly(client: AsyncClient) -> None:
+    try:
+        await client.close()
+    except Exception as error:
+        logger.debug("Closing a stale Ollama client failed: %r", error)
+
+
+def _close_stale(loop: asyncio.AbstractEventLoop, client: AsyncClient) -> None:
+    """Closes a pooled client that belongs to another event loop."""
+    future: asyncio.Future
+    if loop.is_running() and not loop.is_closed():
+        # The loop lives on in another thread: close the client over there.
+        future = asyncio.wrap_future(
+            asyncio.run_coroutine_threadsafe(_close_quietly(client), loop)
+        )
+    else:
+        # The loop is gone; release whatever httpx still holds from here.
+        future = asyncio.ensure_future(_close_quietly(client))
+    _closing.add(future)
+    future.add_done_callback(_closing.discard)
+
+
+def get_async_client(host: str, api_key: str | None = None) -> AsyncClient:
+    """
+    Returns the shared Ollama client for `host` and `api_key`.
+
+    Clients are created lazily on first use and reused by every model that
+    targets the same host with the same credentials, so connections (and
+    TLS sessions) are kept alive across workers and requests.
+
+    Args:
+        host: Base URL of the Ollama host.
+        api_key: Bearer token for the host, if it needs one.
+
+    Returns:
+        A pooled ollama.AsyncClient bound to the running event loop.
+    """
+    host = host.rstrip("/")
+    credentials = hashlib.sha256(api_key.encode()).hexdigest() if api_key else None
+    loop = asyncio.get_running_loop()
+    pooled = _clients.get((host, credentials))
+    # httpx connections belong to the loop that opened them.
+    if pooled is not None and pooled[0] is loop:
+        return pooled[1]
+    if pooled is not None:
+        _close_stale(*pooled)
+
+    http2 = HTTP2_AVAILABLE and host.startswith("https://")
+    client = AsyncClient(
+        host=host,
+        headers={"Authorization": f"Bearer {api_key}"} if api_key else None,
+        limits=httpx.Limits(
+            max_connections=OLLAMA_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=OLLAMA_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=OLLAMA_HTTP_KEEPALIVE_S,
+        ),
+        http2=http2,
+    )
+    logger.info("Created Ollama client for %s (http2=%s)", host, http2)
+    _clients[(host, credentials)] = (loop, client)
+    return client
@@ -1,60 +1,97 @@
+from collections.abc import AsyncGenerator
+from typing import Any
+
 from google.adk.models.base_llm import BaseLlm
-from google.genai import types as genai_types
+from google.adk.models.llm_request import LlmRequest
 from google.adk.models.llm_response import LlmResponse
 
 from ollama import AsyncClient
 from pydantic import PrivateAttr
 import os
 
+from app.model_policy import call_with_policy, get_call_policy
+from app.ollama_chat import ollama_chat
+from app.ollama_clients import get_async_client
+from app.ollama_messages import ollama_messages, ollama_options, ollama_tools
+from app.ollama_scheduler import get_scheduler
+from app.response_cache import ResponseCache
+
+CLOUD_OLLAMA_HOST = "https://ollama.com"
+# Ollama Cloud keeps every model warm; only the number of concurrent calls
+# per API key needs to be bounded.
+CLOUD_PARALLEL_SLOTS = int(os.getenv("OLLAMA_CLOUD_NUM_PARALLEL") or 16)
+
 class OllamaCloudLlm(BaseLlm):
-    _client: AsyncClient = PrivateAttr()
+    response_cache: ResponseCache | None = None
+    _client: AsyncClient | None = PrivateAttr(default=None)
 
-    def __init__(self, model_name: str):
+    def __init__(
+        self, model_name: str, response_cache: ResponseCache | None = None
+    ) -> None:
         super().__init__(model=model_name)
-        self._client = AsyncClient(
-            host="https://ollama.com",
-            headers={
-                "Authorization": f"Bearer {os.environ['OLLAMA_API_KEY']}"
-            }
-        )
+        self.response_cache = response_cache
+
+    @property
+    def client(self) -> AsyncClient:
+        """The pooled Ollama Cloud client, resolved on first use.
 
-    async def generate_content_async(self, contents, **kwargs):
-        # --- build messages (unchanged) ---
-        flat_contents = []
-        for item in contents:
-            if isinstance(item, (list, tuple)):
-                flat_contents.extend(item)
-            else:
-                flat_contents.append(item)
-
-        messages = []   
-        for c in flat_contents:
-            if not hasattr(c, "parts"):
-                continue
-            text = " ".join(
-                part.text for part in c.parts
-                if hasattr(part, "text") and part.text
+        The API key is read at call time so that importing the agents does
+        not require cloud credentials.
+        """
+        if self._client is not None:
+            return self._client
+        api_key = os.getenv("OLLAMA_API_KEY")
+        if not api_key:
+            raise RuntimeError(f"OLLAMA_API_KEY must be set to call {self.model}")
+        return get_async_client(CLOUD_OLLAMA_HOST, api_key)
+
+    def client_for(self, hedged: bool) -> AsyncClient:
+        """The client of an attempt; hedges may go to the policy's hedge host."""
+        hedge_host = get_call_policy(self.model).hedge_api_base
+        if hedged and hedge_host and self._client is None:
+            # A local daemon that is signed in to ollama.com serves cloud models too.
+            return get_async_client(hedge_host)
+        return self.client
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        if self.response_cache is None:
+            responses = self._generate(llm_request, stream)
+        else:
+            responses = self.response_cache.serve(
+                self.model, llm_request, lambda: self._generate(llm_request, stream)
             )
-            if text:
-                messages.append({"role": "user", "content": text})
+        async for llm_response in responses:
+            yield llm_response
 
-        # --- call Ollama Cloud ---
-        resp = await self._client.chat(
-            model=self.model,
-            messages=messages,
-        )
+    async def _generate(
+        self, llm_request: LlmRequest, stream: bool
+    ) -> AsyncGenerator[LlmResponse, None]:
+        request: dict[str, Any] = {
+            "model": self.model,
+            "messages": ollama_messages(llm_request),
+            "tools": ollama_tools(llm_request),
+            "options": ollama_options(llm_request),
+        }
 
-        # --- build GenAI response ---
-        llm_response = genai_types.GenerateContentResponse(
-            candidates=[
-                genai_types.Candidate(
-                    content=genai_types.Content(
-                        parts=[genai_types.Part(text=resp["message"]["content"])]
-                    ),
-                    finish_reason="STOP",
-                )
-            ]
-        )
+        # --- call Ollama Cloud under the model's call policy ---
+        async for llm_response in call_with_policy(
+            self.model,
+            lambda hedged: self._attempt(request, stream, hedged),
+            stream=stream,
+        ):
+            yield llm_response
 
-        # --- wrap in ADK Event (CRITICAL) ---
-        yield LlmResponse.create(llm_response)
+    async def _attempt(
+        self, request: dict[str, Any], stream: bool, hedged: bool
+    ) -> AsyncGenerator[LlmResponse, None]:
+        client = self.client_for(hedged)
+        scheduler = get_scheduler(
+            CLOUD_OLLAMA_HOST,
+            parallel_slots=CLOUD_PARALLEL_SLOTS,
+            max_loaded_models=None,
+        )
+        async with scheduler.slot(self.model):
+            async for llm_response in ollama_chat(client, request, stream):
+                yield llm_response
@@ -1,6 +1,16 @@
 
-from google.adk.models.lite_llm import LiteLlm
+from collections.abc import AsyncGenerator
+
 import litellm
+from google.adk.models.lite_llm import LiteLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from pydantic import PrivateAttr
+
+from app.model_policy import call_with_policy, get_call_policy
+from app.ollama_scheduler import LOCAL_OLLAMA_BASE, get_scheduler
+from app.ollama_usage import record_usage
+from app.response_cache import ResponseCache
 
 def normalize_messages_for_ollama(messages):
     """
@@ -49,9 +59,77 @@ class OllamaLiteLlm(LiteLlm):
     """
     Subclass of LiteLlm that wraps the internal client to normalize messages
     for Ollama compatibility.
+
+    Calls are admitted through the scheduler of the Ollama host they target,
+    so concurrent workers respect the host's slots and loaded-model budget.
+    An optional response cache is consulted before taking a slot, and each
+    call runs under the model's call policy (timeouts, retries, hedging).
     """
+    response_cache: ResponseCache | None = None
+    _hedge_llm: "OllamaLiteLlm | None" = PrivateAttr(default=None)
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        # Our own fields must not be forwarded to litellm.completion
+        self._additional_args.pop("response_cache", None)
         # Wrap the llm_client to intercept calls
         self.llm_client = OllamaClientWrapper(self.llm_client)
 
+    @property
+    def api_base(self) -> str:
+        return self._additional_args.get("api_base") or LOCAL_OLLAMA_BASE
+
+    @property
+    def ollama_model(self) -> str:
+        """The Ollama model id, without the LiteLLM provider prefix."""
+        return self.model.split("/", 1)[-1]
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        if self.response_cache is None:
+            responses = self._generate_with_policy(llm_request, stream)
+        else:
+            responses = self.response_cache.serve(
+                self.ollama_model,
+                llm_request,
+                lambda: self._generate_with_policy(llm_request, stream),
+            )
+        async for llm_response in responses:
+            yield llm_response
+
+    def _generate_with_policy(
+        self, llm_request: LlmRequest, stream: bool
+    ) -> AsyncGenerator[LlmResponse, None]:
+        return call_with_policy(
+            self.ollama_model,
+            lambda hedged: (
+                self._hedge_target() if hedged else self
+            )._generate_scheduled(llm_request, stream),
+            stream=stream,
+        )
+
+    def _hedge_target(self) -> "OllamaLiteLlm":
+        """The same model on the policy's hedge backend, created on first use."""
+        api_base = get_call_policy(self.ollama_model).hedge_api_base
+        if not api_base or api_base == self.api_base:
+            return self
+        if self._hedge_llm is None:
+            self._hedge_llm = OllamaLiteLlm(
+                model=self.model, **{**self._additional_args, "api_base": api_base}
+            )
+        return self._hedge_llm
+
+    async def _generate_scheduled(
+        self, llm_request: LlmRequest, stream: bool
+    ) -> AsyncGenerator[LlmResponse, None]:
+        async with get_scheduler(self.api_base).slot(self.ollama_model):
+            async for llm_response in super().generate_content_async(
+                llm_request, stream=stream
+            ):
+                if not llm_response.partial and llm_response.usage_metadata:
+                    # litellm keeps Ollama's token counts but drops its
+                    # load/prefill/decode durations.
+                    record_usage(self.ollama_model, llm_response.usage_metadata)
+                yield llm_response
+
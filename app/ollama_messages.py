@@ -0,0 +1,155 @@
+import json
+import uuid
+from typing import Any
+
+from google.adk.models.llm_request import LlmRequest
+from google.genai import types as genai_types
+
+from app.llm_utils import response_text
+
+# GenerateContentConfig fields and the Ollama options they map to.
+_CONFIG_OPTIONS = {
+    "temperature": "temperature",
+    "top_p": "top_p",
+    "top_k": "top_k",
+    "max_output_tokens": "num_predict",
+    "stop_sequences": "stop",
+    "seed": "seed",
+    "presence_penalty": "presence_penalty",
+    "frequency_penalty": "frequency_penalty",
+}
+
+
+def _json_schema(schema: genai_types.Schema) -> dict:
+    """Converts a GenAI schema (upper-case types) to JSON schema."""
+
+    def lower_types(node: Any) -> Any:
+        if isinstance(node, dict):
+            return {
+                key: value.lower()
+                if key == "type" and isinstance(value, str)
+                else lower_types(value)
+                for key, value in node.items()
+            }
+        if isinstance(node, list):
+            return [lower_types(item) for item in node]
+        return node
+
+    return lower_types(schema.model_dump(exclude_none=True, mode="json"))
+
+
+def ollama_tools(llm_request: LlmRequest) -> list[dict] | None:
+    """The function declarations of a request as Ollama tool definitions."""
+    tools = []
+    for tool in (llm_request.config.tools if llm_request.config else None) or []:
+        for declaration in getattr(tool, "function_declarations", None) or []:
+            if declaration.parameters_json_schema is not None:
+                parameters = declaration.parameters_json_schema
+            elif declaration.parameters is not None:
+                parameters = _json_schema(declaration.parameters)
+            else:
+                parameters = {"type": "object", "properties": {}}
+            tools.append(
+                {
+                    "type": "function",
+                    "function": {
+                        "name": declaration.name,
+                        "description": declaration.description or "",
+                        "parameters": parameters,
+                    },
+                }
+            )
+    return tools or None
+
+
+def ollama_options(
+    llm_request: LlmRequest, defaults: dict | None = None
+) -> dict | None:
+    """The request's generation config as Ollama options, over `defaults`."""
+    options = dict(defaults or {})
+    config = llm_request.config
+    for field, option in _CONFIG_OPTIONS.items():
+        value = getattr(config, field, None) if config else None
+        if value is not None:
+            options[option] = value
+    return options or None
+
+
+def ollama_messages(llm_request: LlmRequest) -> list[dict]:
+    """
+    Converts the request contents to Ollama chat messages.
+
+    Roles are preserved: the system instruction becomes a system message,
+    model turns become assistant messages (with their tool calls) and each
+    function response becomes a tool message.
+
+    Args:
+        llm_request: The ADK request.
+
+    Returns:
+        The messages for `AsyncClient.chat`.
+    """
+    messages: list[dict] = []
+    system_instruction = (
+        llm_request.config.system_instruction if llm_request.config else None
+    )
+    if isinstance(system_instruction, genai_types.Content):
+        system_instruction = response_text(system_instruction)
+    if system_instruction:
+        messages.append({"role": "system", "content": str(system_instruction)})
+
+    for content in llm_request.contents:
+        role = "assistant" if content.role == "model" else "user"
+        text = []
+        tool_calls = []
+        for part in content.parts or []:
+            if part.function_response is not None:
+                messages.append(
+                    {
+                        "role": "tool",
+                        "tool_name": part.function_response.name,
+                        "content": json.dumps(
+                            part.function_response.response, default=str
+                        ),
+                    }
+                )
+            elif part.function_call is not None:
+                tool_calls.append(
+                    {
+                        "function": {
+                            "name": part.function_call.name,
+                            "arguments": part.function_call.args or {},
+                        }
+                    }
+                )
+            elif part.text and not part.thought:
+                text.append(part.text)
+        if text or tool_calls:
+            message: dict = {"role": role, "content": "\n".join(text)}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            messages.append(message)
+    return messages
+
+
+def response_parts(
+    text: str, thinking: str = "", tool_calls: list | None = None
+) -> list[genai_types.Part]:
+    """The GenAI parts of an Ollama reply: thinking, text and tool calls."""
+    parts = []
+    if thinking:
+        parts.append(genai_types.Part(text=thinking, thought=True))
+    if text:
+        parts.append(genai_types.Part(text=text))
+    for tool_call in tool_calls or []:
+        function = tool_call["function"]
+        parts.append(
+            genai_types.Part(
+                function_call=genai_types.FunctionCall(
+                    id=f"call_{uuid.uuid4().hex[:12]}",
+                    name=function["name"],
+                    args=dict(function.get("arguments") or {}),
+                )
+            )
+        )
+    return parts
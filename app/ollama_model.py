@@ -0,0 +1,88 @@
+import os
+from collections.abc import AsyncGenerator
+from typing import Any
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from ollama import AsyncClient
+from pydantic import PrivateAttr
+
+from app.model_policy import call_with_policy, get_call_policy
+from app.ollama_chat import ollama_chat
+from app.ollama_clients import get_async_client
+from app.ollama_messages import ollama_messages, ollama_options, ollama_tools
+from app.ollama_scheduler import LOCAL_OLLAMA_BASE, get_scheduler
+from app.response_cache import ResponseCache
+
+# How long Ollama keeps a model loaded after a call (Ollama's default is 5m).
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE") or None
+
+
+class OllamaLlm(BaseLlm):
+    """
+    Native Ollama backend for local models, built on the pooled
+    `ollama.AsyncClient` instead of LiteLLM.
+
+    Messages keep their roles, function declarations are passed as Ollama
+    tools and the request's generation config is mapped to Ollama options.
+    Like the other backends, calls go through the response cache, the call
+    policy and the host scheduler, and report Ollama's usage and timings.
+    """
+
+    host: str = LOCAL_OLLAMA_BASE
+    """Base URL of the Ollama server."""
+
+    options: dict | None = None
+    """Default Ollama options; the request's generation config overrides them."""
+
+    keep_alive: str | None = OLLAMA_KEEP_ALIVE
+    """How long the model stays loaded after a call."""
+
+    response_cache: ResponseCache | None = None
+    _client: AsyncClient | None = PrivateAttr(default=None)
+
+    def client_for(self, host: str) -> AsyncClient:
+        if self._client is not None:
+            return self._client
+        return get_async_client(host)
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        if self.response_cache is None:
+            responses = self._generate(llm_request, stream)
+        else:
+            responses = self.response_cache.serve(
+                self.model, llm_request, lambda: self._generate(llm_request, stream)
+            )
+        async for llm_response in responses:
+            yield llm_response
+
+    async def _generate(
+        self, llm_request: LlmRequest, stream: bool
+    ) -> AsyncGenerator[LlmResponse, None]:
+        request: dict[str, Any] = {
+            "model": self.model,
+            "messages": ollama_messages(llm_request),
+            "tools": ollama_tools(llm_request),
+            "options": ollama_options(llm_request, self.options),
+            "keep_alive": self.keep_alive,
+        }
+        hedge_host = get_call_policy(self.model).hedge_api_base or self.host
+        async for llm_response in call_with_policy(
+            self.model,
+            lambda hedged: self._attempt(
+                hedge_host if hedged else self.host, request, stream
+            ),
+            stream=stream,
+        ):
+            yield llm_response
+
+    async def _attempt(
+        self, host: str, request: dict[str, Any], stream: bool
+    ) -> AsyncGenerator[LlmResponse, None]:
+        client = self.client_for(host)
+        async with get_scheduler(host).slot(self.model):
+            async for llm_response in ollama_chat(client, request, stream):
+                yield llm_response
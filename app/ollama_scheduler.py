@@ -0,0 +1,268 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict, defaultdict, deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any
+
+from opentelemetry import trace
+
+from app.model_policy import mark_dispatched, mark_queued
+
+logger = logging.getLogger(__name__)
+
+LOCAL_OLLAMA_BASE = os.getenv("OLLAMA_API_BASE", "http://localhost:11434")
+
+# Same names as the Ollama server settings, so one .env describes both sides.
+DEFAULT_PARALLEL_SLOTS = int(os.getenv("OLLAMA_NUM_PARALLEL") or 4)
+DEFAULT_MAX_LOADED_MODELS = int(os.getenv("OLLAMA_MAX_LOADED_MODELS") or 3)
+# How long a request for a cold model may be passed over in favour of
+# requests for models that are already loaded.
+MAX_AFFINITY_WAIT_S = float(os.getenv("OLLAMA_MAX_AFFINITY_WAIT_S") or 10)
+
+
+@dataclass
+class _Waiter:
+    model: str
+    enqueued_at: float
+    future: asyncio.Future
+
+
+@dataclass
+class _ModelStats:
+    calls: int = 0
+    total_wait_s: float = 0.0
+    max_wait_s: float = 0.0
+    loads: int = 0
+    recent_waits: deque = field(default_factory=lambda: deque(maxlen=200))
+
+
+class OllamaHostScheduler:
+    """
+    Admits model calls to a single Ollama host.
+
+    Calls are queued per model and only admitted when the host has a free
+    parallel slot and the model is loaded or fits in the resident-model
+    budget (evicting an idle model if needed). When a slot frees up,
+    queued calls for models that are already loaded go first, so calls from
+    concurrent sessions are grouped by model instead of making the host
+    swap models back and forth. A call for a cold model is never passed
+    over for longer than `max_affinity_wait_s`; after that the scheduler
+    stops admitting other calls until the model can be loaded.
+
+    The resident set is the scheduler's own view of the host, built from the
+    calls it admitted. It is not refreshed from the server.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        parallel_slots: int = DEFAULT_PARALLEL_SLOTS,
+        max_loaded_models: int | None = DEFAULT_MAX_LOADED_MODELS,
+        max_affinity_wait_s: float = MAX_AFFINITY_WAIT_S,
+    ) -> None:
+        """Initializes the scheduler for one host.
+
+        Args:
+            host: Base URL of the Ollama host.
+            parallel_slots: Number of calls the host serves concurrently.
+            max_loaded_models: Number of models the host keeps loaded at once,
+                or None when residency is not a concern (e.g. Ollama Cloud).
+            max_affinity_wait_s: Longest time a cold model may be passed over.
+        """
+        self.host = host
+        self.parallel_slots = parallel_slots
+        self.max_loaded_models = max_loaded_models
+        self.max_affinity_wait_s = max_affinity_wait_s
+        self._active: dict[str, int] = defaultdict(int)
+        self._queues: dict[str, deque[_Waiter]] = defaultdict(deque)
+        self._resident: OrderedDict[str, None] = OrderedDict()
+        self._stats: dict[str, _ModelStats] = defaultdict(_ModelStats)
+
+    @asynccontextmanager
+    async def slot(self, model: str) -> AsyncIterator[None]:
+        """Waits for a slot to run one call to `model` on this host.
+
+        Args:
+            model: The Ollama model id, without any provider prefix.
+        """
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(model, loop.time(), loop.create_future())
+        self._queues[model].append(waiter)
+        mark_queued()
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitted in the same tick: hand the slot back.
+                self._release(model)
+            else:
+                # `_dispatch` may already have dropped the cancelled waiter.
+                if waiter in self._queues[model]:
+                    self._queues[model].remove(waiter)
+                self._dispatch()
+            raise
+
+        wait_s = loop.time() - waiter.enqueued_at
+        self._record_wait(model, wait_s)
+        mark_dispatched()
+        try:
+            yield
+        finally:
+            self._release(model)
+
+    def stats(self) -> dict:
+        """Returns queue depth, concurrency and wait times per model."""
+        models = {}
+        for model in sorted(set(self._stats) | set(self._queues) | set(self._active)):
+            stats = self._stats[model]
+            waits = sorted(stats.recent_waits)
+            models[model] = {
+                "queued": len(self._queues[model]),
+                "active": self._active[model],
+                "resident": model in self._resident,
+                "calls": stats.calls,
+                "loads": stats.loads,
+                "avg_wait_s": stats.total_wait_s / stats.calls if stats.calls else 0.0,
+                "p95_wait_s": waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+                "max_wait_s": stats.max_wait_s,
+            }
+        return {
+            "host": self.host,
+            "parallel_slots": self.parallel_slots,
+            "max_loaded_models": self.max_loaded_models,
+            "active": sum(self._active.values()),
+            "queued": self.queue_depth(),
+            "models": models,
+        }
+
+    def mark_unloaded(self, model: str) -> None:
+        """Records that `model` was unloaded from the host outside the scheduler."""
+        if self._active[model]:
+            # Ollama only unloads the model once its running calls are done.
+            return
+        self._resident.pop(model, None)
+        self._dispatch()
+
+    def in_use(self, model: str) -> bool:
+        """Whether calls to `model` are running or waiting for a slot."""
+        return bool(self._active.get(model) or self._queues.get(model))
+
+    def load(self) -> float:
+        """Returns running plus queued calls as a share of the host's slots."""
+        return (sum(self._active.values()) + self.queue_depth()) / self.parallel_slots
+
+    def queue_depth(self) -> int:
+        """Returns the number of calls waiting for a slot on this host."""
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _record_wait(self, model: str, wait_s: float) -> None:
+        stats = self._stats[model]
+        stats.calls += 1
+        stats.total_wait_s += wait_s
+        stats.max_wait_s = max(stats.max_wait_s, wait_s)
+        stats.recent_waits.append(wait_s)
+
+        span = trace.get_current_span()
+        span.set_attribute("ollama.host", self.host)
+        span.set_attribute("ollama.scheduler.wait_ms", round(wait_s * 1000, 1))
+        span.set_attribute("ollama.scheduler.queue_depth", self.queue_depth())
+
+    def _release(self, model: str) -> None:
+        self._active[model] -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Admits queued calls while the host has capacity."""
+        loop_time = asyncio.get_running_loop().time()
+        while sum(self._active.values()) < self.parallel_slots:
+            model = self._next_model(loop_time)
+            if model is None:
+                return
+            waiter = self._queues[model].popleft()
+            if waiter.future.done():
+                continue
+            self._admit(model)
+            waiter.future.set_result(None)
+
+    def _next_model(self, now: float) -> str | None:
+        """Picks the model whose queued call should run next, if any can."""
+        heads = [queue[0] for queue in self._queues.values() if queue]
+        if not heads:
+            return None
+        heads.sort(key=lambda waiter: waiter.enqueued_at)
+
+        oldest = heads[0]
+        if now - oldest.enqueued_at > self.max_affinity_wait_s:
+            # Starvation guard: run the oldest call or hold the slot for it.
+            return oldest.model if self._can_load(oldest.model) else None
+
+        for waiter in heads:
+            if waiter.model in self._resident:
+                return waiter.model
+        for waiter in heads:
+            if self._can_load(waiter.model):
+                return waiter.model
+        return None
+
+    def _can_load(self, model: str) -> bool:
+        if self.max_loaded_models is None or model in self._resident:
+            return True
+        if len(self._resident) < self.max_loaded_models:
+            return True
+        return self._evictable() is not None
+
+    def _evictable(self) -> str | None:
+        """Returns the least recently used loaded model with no calls in flight."""
+        idle = [model for model in self._resident if not self._active[model]]
+        # Prefer evicting a model nobody is waiting for.
+        for model in idle:
+            if not self._queues[model]:
+                return model
+        return idle[0] if idle else None
+
+    def _admit(self, model: str) -> None:
+        if model not in self._resident:
+            if (
+                self.max_loaded_models is not None
+                and len(self._resident) >= self.max_loaded_models
+            ):
+                evicted = self._evictable()
+                if evicted is not None:
+                    logger.debug(
+                        "Ollama %s: swapping %s for %s", self.host, evicted, model
+                    )
+                    del self._resident[evicted]
+            self._stats[model].loads += 1
+            self._resident[model] = None
+        self._resident.move_to_end(model)
+        self._active[model] += 1
+
+
+_schedulers: dict[str, OllamaHostScheduler] = {}
+
+
+def get_scheduler(host: str, **kwargs: Any) -> OllamaHostScheduler:
+    """Returns the process-wide scheduler for `host`, creating it on first use.
+
+    Args:
+        host: Base URL of the Ollama host.
+        **kwargs: Scheduler settings, only used when the scheduler is created.
+    """
+    host = host.rstrip("/")
+    if host not in _schedulers:
+        _schedulers[host] = OllamaHostScheduler(host, **kwargs)
+    return _schedulers[host]
+
+
+def scheduler_stats() -> list[dict]:
+    """Returns the stats of every Ollama host scheduler, for monitoring."""
+    return [scheduler.stats() for scheduler in _schedulers.values()]
+
+
+def max_host_load() -> float:
+    """Returns the load of the busiest Ollama host, see `load()`."""
+    return max((scheduler.load() for scheduler in _schedulers.values()), default=0.0)
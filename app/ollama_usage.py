@@ -0,0 +1,77 @@
+from collections.abc import Mapping
+
+from google.genai import types as genai_types
+from opentelemetry import trace
+
+# Ollama reports durations in nanoseconds.
+_DURATION_FIELDS = {
+    "load_duration": "load_ms",
+    "prompt_eval_duration": "prompt_eval_ms",
+    "eval_duration": "eval_ms",
+    "total_duration": "total_ms",
+}
+
+
+def ollama_timings(response: Mapping) -> dict[str, float]:
+    """
+    Extracts the timings of a final Ollama chat/generate response.
+
+    Args:
+        response: The `done` response (or last stream chunk) from Ollama.
+
+    Returns:
+        Durations in milliseconds and prefill/decode rates in tokens per
+        second, for the fields Ollama reported.
+    """
+    timings = {
+        name: response[field] / 1e6
+        for field, name in _DURATION_FIELDS.items()
+        if response.get(field)
+    }
+    for count_field, ms_name, rate_name in (
+        ("prompt_eval_count", "prompt_eval_ms", "prefill_tokens_per_s"),
+        ("eval_count", "eval_ms", "decode_tokens_per_s"),
+    ):
+        if response.get(count_field) and timings.get(ms_name):
+            timings[rate_name] = response[count_field] / timings[ms_name] * 1e3
+    return timings
+
+
+def ollama_usage_metadata(
+    response: Mapping,
+) -> genai_types.GenerateContentResponseUsageMetadata | None:
+    """Maps Ollama's token counts to GenAI usage metadata."""
+    prompt_tokens = response.get("prompt_eval_count")
+    output_tokens = response.get("eval_count")
+    if prompt_tokens is None and output_tokens is None:
+        return None
+    return genai_types.GenerateContentResponseUsageMetadata(
+        prompt_token_count=prompt_tokens or 0,
+        candidates_token_count=output_tokens or 0,
+        total_token_count=(prompt_tokens or 0) + (output_tokens or 0),
+    )
+
+
+def record_usage(
+    model: str,
+    usage: genai_types.GenerateContentResponseUsageMetadata | None,
+    timings: Mapping[str, float] | None = None,
+) -> None:
+    """
+    Attaches the token usage and timings of a model call to the current span.
+
+    The span is the `call_llm` span of the agent that made the call, so the
+    attributes are reported per worker.
+
+    Args:
+        model: The Ollama model id.
+        usage: Token counts of the call.
+        timings: Output of `ollama_timings`, when the backend exposes them.
+    """
+    span = trace.get_current_span()
+    span.set_attribute("ollama.model", model)
+    if usage is not None:
+        span.set_attribute("ollama.prompt_tokens", usage.prompt_token_count or 0)
+        span.set_attribute("ollama.output_tokens", usage.candidates_token_count or 0)
+    for name, value in (timings or {}).items():
+        span.set_attribute(f"ollama.{name}", round(value, 3))
@@ -0,0 +1,344 @@
+import asyncio
+import logging
+import math
+from collections.abc import AsyncGenerator
+
+from google.adk.agents import BaseAgent, LlmAgent, ParallelAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.agents.parallel_agent import _create_branch_ctx_for_sub_agent
+from google.adk.events import Event, EventActions
+from opentelemetry import trace
+
+from app.degradation import DEGRADATION_KEY
+from app.llm_utils import response_text
+from app.residency import ResidencyManager, local_model
+from app.worker_selection import FULL_PANEL_KEY, Selection, WorkerSelector
+
+logger = logging.getLogger(__name__)
+
+PANEL_STATUS_KEY = "panel_status"
+MISSING_EXPERTS_KEY = "panel_missing_experts"
+RESIDENCY_REPORT_KEY = "panel_residency"
+SELECTION_KEY = "panel_selection"
+
+
+class PanelAgent(ParallelAgent):
+    """
+    ParallelAgent for the worker panel with an optional quorum/deadline mode.
+
+    With neither `quorum` nor `deadline_s` set it behaves exactly like
+    ParallelAgent and waits for every worker. Otherwise it proceeds once
+    `quorum` workers have answered or `deadline_s` seconds have passed,
+    cancels the workers that are still running and records which experts
+    are missing in session state so the verifier does not read stale or
+    empty `*_response` keys.
+
+    With a `residency` manager the workers run in waves of models that fit
+    in the host's memory together, models that are already loaded first,
+    instead of making Ollama evict and reload models mid-request.
+
+    With a `selector` only the workers relevant to the question are run;
+    the others are reported as not consulted rather than missing. Under a
+    degradation policy the selection shrinks further. Quorum, deadline and
+    waves then apply to the selected workers.
+    """
+
+    quorum: int | None = None
+    """Number of answered workers after which the panel stops waiting."""
+
+    deadline_s: float | None = None
+    """Seconds after which the panel stops waiting, whatever the quorum."""
+
+    residency: ResidencyManager | None = None
+    """Runs the workers in memory-sized waves on the manager's host."""
+
+    selector: WorkerSelector | None = None
+    """Picks the workers relevant to each question."""
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        selection = self._select(ctx)
+        sub_agents = [
+            sub_agent
+            for sub_agent in self.sub_agents
+            if selection is None or sub_agent.name in selection.selected
+        ]
+        answered: list[str] = []
+        report: dict | None = None
+        if self.residency is not None:
+            report = {}
+            async for event in self._run_in_waves(ctx, answered, report, sub_agents):
+                yield event
+        elif (
+            self.quorum is None
+            and self.deadline_s is None
+            and len(sub_agents) == len(self.sub_agents)
+        ):
+            async for event in super()._run_async_impl(ctx):
+                yield event
+            answered = [sub_agent.name for sub_agent in self.sub_agents]
+        else:
+            async for event in self._run_until_quorum(
+                ctx,
+                answered,
+                sub_agents,
+                self._quorum(len(sub_agents)),
+                self._deadline(),
+            ):
+                yield event
+
+        yield self._panel_status_event(ctx, answered, report, selection)
+
+    def _select(self, ctx: InvocationContext) -> Selection | None:
+        """Selects the workers to run, recording the selection on the trace."""
+        selection = None
+        if self.selector is not None:
+            selection = self.selector.select(
+                response_text(ctx.user_content),
+                self.sub_agents,
+                full_panel=bool(ctx.session.state.get(FULL_PANEL_KEY)),
+            )
+        # Under overload, only the most relevant workers are consulted.
+        policy = ctx.session.state.get(DEGRADATION_KEY) or {}
+        if policy.get("panel_fraction", 1.0) < 1.0:
+            names = (
+                selection.selected
+                if selection is not None
+                else [sub_agent.name for sub_agent in self.sub_agents]
+            )
+            keep = max(1, math.ceil(len(names) * policy["panel_fraction"]))
+            if keep < len(names):
+                selection = Selection(
+                    names[:keep],
+                    selection.scores if selection is not None else {},
+                    reason=f"degraded to level {policy['level']}",
+                )
+        if selection is None:
+            return None
+
+        logger.info(
+            "Panel fan-out %d/%d (%s): %s",
+            len(selection.selected),
+            len(self.sub_agents),
+            selection.reason,
+            ", ".join(selection.selected),
+        )
+        span = trace.get_current_span()
+        span.set_attribute("panel.fan_out", len(selection.selected))
+        span.set_attribute("panel.selected", selection.selected)
+        span.set_attribute("panel.selection_reason", selection.reason)
+        return selection
+
+    def _quorum(self, n_workers: int) -> int:
+        return min(self.quorum or n_workers, n_workers)
+
+    def _deadline(self) -> float | None:
+        if not self.deadline_s:
+            return None
+        return asyncio.get_running_loop().time() + self.deadline_s
+
+    async def _run_in_waves(
+        self,
+        ctx: InvocationContext,
+        answered: list[str],
+        report: dict,
+        sub_agents: list[BaseAgent],
+    ) -> AsyncGenerator[Event, None]:
+        """Runs the workers wave by wave, as planned by the residency manager.
+
+        Workers that do not use a local model on the manager's host run in
+        the first wave. Quorum and deadline apply across all waves.
+
+        Args:
+            ctx: The invocation context of the panel.
+            answered: Filled with the names of workers that finished cleanly.
+            report: Filled with the waves, model loads and wall-clock time.
+            sub_agents: The workers to run.
+
+        Yields:
+            The events of the workers, in the order they are produced.
+        """
+        residency = self.residency
+        if residency is None:
+            raise ValueError(f"{self.name} has no residency manager")
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        quorum, deadline = self._quorum(len(sub_agents)), self._deadline()
+        models = {}
+        for sub_agent in sub_agents:
+            target = local_model(sub_agent)
+            if target is not None and target[0] == residency.host:
+                models[sub_agent.name] = target[1]
+        planned = list(dict.fromkeys(models.values()))
+        waves, resident = await residency.plan(planned)
+        report["waves"] = waves
+        report["loads"] = len(set(models.values()) - resident)
+
+        released: list[str] = []
+        try:
+            for index, wave in enumerate(waves):
+                wave_agents = [
+                    sub_agent
+                    for sub_agent in sub_agents
+                    if models.get(sub_agent.name) in wave
+                    or (index == 0 and sub_agent.name not in models)
+                ]
+                async for event in self._run_until_quorum(
+                    ctx, answered, wave_agents, quorum, deadline, len(sub_agents)
+                ):
+                    yield event
+                if len(answered) >= quorum or (deadline and loop.time() >= deadline):
+                    break
+                if index < len(waves) - 1:
+                    # The last wave stays loaded for the next request.
+                    released.extend(wave)
+                    await residency.release(wave)
+        finally:
+            residency.finish(model for model in planned if model not in released)
+        report["wall_s"] = round(loop.time() - started, 3)
+
+    async def _run_until_quorum(
+        self,
+        ctx: InvocationContext,
+        answered: list[str],
+        sub_agents: list[BaseAgent],
+        quorum: int,
+        deadline: float | None,
+        consulted: int | None = None,
+    ) -> AsyncGenerator[Event, None]:
+        """Runs workers concurrently until quorum or deadline is reached.
+
+        Args:
+            ctx: The invocation context of the panel.
+            answered: Filled with the names of workers that finished cleanly.
+            sub_agents: The workers to run.
+            quorum: Number of answers, counting `answered`, to stop at.
+            deadline: Loop time at which to stop waiting, if any.
+            consulted: Number of workers consulted this turn, when the
+                workers run in several calls (waves). Defaults to
+                `len(sub_agents)`.
+
+        Yields:
+            The events of the workers, in the order they are produced.
+        """
+        sentinel = object()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def run_worker(name: str, agen: AsyncGenerator[Event, None]) -> None:
+            status = "cancelled"
+            try:
+                async for event in agen:
+                    resume_signal = asyncio.Event()
+                    await queue.put((name, event, resume_signal))
+                    # Wait for upstream to consume event before generating more.
+                    await resume_signal.wait()
+                status = "answered"
+            except Exception:
+                logger.exception("Panel worker %s failed", name)
+                status = "failed"
+            finally:
+                queue.put_nowait((name, sentinel, status))
+
+        agent_runs = {
+            sub_agent.name: sub_agent.run_async(
+                _create_branch_ctx_for_sub_agent(self, sub_agent, ctx)
+            )
+            for sub_agent in sub_agents
+        }
+        tasks = [
+            asyncio.create_task(run_worker(name, agen))
+            for name, agen in agent_runs.items()
+        ]
+        loop = asyncio.get_running_loop()
+
+        finished = 0
+        try:
+            while finished < len(tasks) and len(answered) < quorum:
+                timeout = None if deadline is None else max(0.0, deadline - loop.time())
+                try:
+                    name, event, extra = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    logger.warning(
+                        "Panel deadline of %ss reached with %d/%d answers",
+                        self.deadline_s,
+                        len(answered),
+                        consulted or len(sub_agents),
+                    )
+                    break
+                if event is sentinel:
+                    finished += 1
+                    if extra == "answered":
+                        answered.append(name)
+                    continue
+                yield event
+                extra.set()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for agen in agent_runs.values():
+                await agen.aclose()
+
+    def _panel_status_event(
+        self,
+        ctx: InvocationContext,
+        answered: list[str],
+        residency_report: dict | None = None,
+        selection: Selection | None = None,
+    ) -> Event:
+        """Builds the event recording which experts answered and which are missing."""
+        consulted = [
+            sub_agent
+            for sub_agent in self.sub_agents
+            if selection is None or sub_agent.name in selection.selected
+        ]
+        missing = [
+            sub_agent for sub_agent in consulted if sub_agent.name not in answered
+        ]
+        skipped = [
+            sub_agent for sub_agent in self.sub_agents if sub_agent not in consulted
+        ]
+        state_delta: dict = {MISSING_EXPERTS_KEY: [agent.name for agent in missing]}
+        for agent in missing + skipped:
+            # Clear outputs left over from a previous turn.
+            if isinstance(agent, LlmAgent) and agent.output_key:
+                state_delta[agent.output_key] = ""
+
+        if missing:
+            status = (
+                f"{len(answered)} of {len(consulted)} experts answered. "
+                "The following experts did NOT answer in time and must be "
+                f"ignored: {', '.join(agent.name for agent in missing)}."
+            )
+        else:
+            status = f"All {len(consulted)} experts answered."
+        if skipped:
+            status += (
+                " The following experts were not consulted on this question "
+                f"and must be ignored: {', '.join(agent.name for agent in skipped)}."
+            )
+        state_delta[PANEL_STATUS_KEY] = status
+        if selection is not None:
+            state_delta[SELECTION_KEY] = {
+                "selected": selection.selected,
+                "fan_out": len(selection.selected),
+                "panel_size": len(self.sub_agents),
+                "reason": selection.reason,
+            }
+
+        span = trace.get_current_span()
+        span.set_attribute("panel.answered", answered)
+        span.set_attribute("panel.missing", state_delta[MISSING_EXPERTS_KEY])
+        if residency_report is not None:
+            state_delta[RESIDENCY_REPORT_KEY] = residency_report
+            span.set_attribute("residency.waves", len(residency_report["waves"]))
+            span.set_attribute("residency.loads", residency_report["loads"])
+            span.set_attribute("residency.wall_s", residency_report.get("wall_s", 0))
+
+        return Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            actions=EventActions(state_delta=state_delta),
+        )
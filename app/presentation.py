@@ -0,0 +1,67 @@
+import logging
+import os
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types as genai_types
+from opentelemetry import trace
+
+logger = logging.getLogger(__name__)
+
+PASS_THROUGH_ENABLED = os.getenv("PASS_THROUGH_ENABLED", "true").lower() == "true"
+# Put in front of the verified answer; empty for none.
+PASS_THROUGH_PREFIX = os.getenv("PASS_THROUGH_PREFIX", "The team has found:\n\n")
+
+
+class PassThroughPresenter:
+    """
+    `before_model_callback` that shows the research team's answer as is.
+
+    When the orchestrator's next model call would only re-present the
+    research tool's result, the verified answer is returned directly behind
+    an optional prefix instead of being generated a second time. Asking to
+    reformat the answer is a new user turn, handled by the intent router or
+    the orchestrator LLM.
+    """
+
+    def __init__(
+        self,
+        research_tool: str,
+        prefix: str = PASS_THROUGH_PREFIX,
+        enabled: bool = PASS_THROUGH_ENABLED,
+    ) -> None:
+        """Initializes the presenter.
+
+        Args:
+            research_tool: Name of the tool that runs the research team.
+            prefix: Text put in front of the answer.
+            enabled: Whether to pass answers through at all.
+        """
+        self.research_tool = research_tool
+        self.prefix = prefix
+        self.enabled = enabled
+        self.passed_through = 0
+
+    def __call__(
+        self, callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> LlmResponse | None:
+        if not self.enabled or not llm_request.contents:
+            return None
+        parts = llm_request.contents[-1].parts or []
+        responses = [part.function_response for part in parts if part.function_response]
+        if len(responses) != 1 or responses[0].name != self.research_tool:
+            return None
+        answer = (responses[0].response or {}).get("result")
+        if not isinstance(answer, str) or not answer.strip():
+            # Errors and empty answers need the model to explain them.
+            return None
+
+        self.passed_through += 1
+        trace.get_current_span().set_attribute("presentation.pass_through", True)
+        logger.info("Passing the research answer through (%d chars)", len(answer))
+        return LlmResponse(
+            content=genai_types.Content(
+                role="model", parts=[genai_types.Part(text=self.prefix + answer)]
+            )
+        )
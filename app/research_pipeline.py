@@ -0,0 +1,539 @@
+import asyncio
+import dataclasses
+import logging
+from collections.abc import AsyncGenerator, Callable
+
+from google.adk.agents import BaseAgent, LlmAgent, SequentialAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.agents.parallel_agent import _create_branch_ctx_for_sub_agent
+from google.adk.events import Event, EventActions
+from google.adk.models.base_llm import BaseLlm
+from google.genai import types as genai_types
+from opentelemetry import trace
+from pydantic import PrivateAttr
+
+from app.cascade import Cascade
+from app.consensus import ConsensusScorer
+from app.degradation import DEGRADATION_KEY, DegradationController
+from app.history import estimate_tokens
+from app.intent_router import FOLLOW_UP_INTENTS, classify
+from app.llm_utils import generate_text, response_text
+
+logger = logging.getLogger(__name__)
+
+RESEARCH_QUESTION_KEY = "research_question"
+PANEL_DIGESTS_KEY = "panel_digests"
+FOLLOW_UP_KEY = "research_follow_up"
+CONSENSUS_KEY = "panel_consensus"
+CASCADE_KEY = "research_cascade"
+
+DIGEST_INSTRUCTION = """
+You are preparing the answer of one expert for a Lead Researcher.
+Condense the expert answer into a short bullet list of its key claims,
+facts, figures and caveats that are relevant to the question.
+Keep the expert's wording for facts and numbers. Do not add anything.
+"""
+
+MERGE_INSTRUCTION = """
+You are merging the answers of several experts to the same question for a
+Lead Researcher. Combine them into one answer that keeps every distinct
+claim, fact, figure and caveat, and say where the experts disagree.
+Keep the experts' wording for facts and numbers. Do not add anything.
+"""
+
+PICK_BEST_INSTRUCTION = """
+You are a Lead Researcher. A panel of experts answered the question
+independently and agreed with each other. Present the most representative
+expert answer below as the final answer: fix obvious mistakes and
+formatting, but do not add new claims.
+"""
+
+FOLLOW_UP_INSTRUCTION = """
+The user is following up on the earlier research question: {question}
+
+The experts answered:
+{answers}
+
+Your previous answer was:
+{answer}
+
+Do not search again. Rework your previous answer as the user asks, drawing
+on the expert answers for any added detail.
+"""
+
+
+class ResearchPipeline(SequentialAgent):
+    """
+    SequentialAgent running the worker panel followed by the verifier.
+
+    In incremental mode the stages are pipelined: the verifier's model
+    digests every worker answer as soon as its `*_response` key lands in
+    state, while the slower workers are still running. Once the panel is
+    done the digests are stored under `panel_digests` and the verifier runs
+    on its own branch, so it merges the digests instead of re-reading every
+    raw worker answer.
+
+    Once the panel's answers (or digests) add up to more than
+    `reduce_threshold_tokens`, they are tree-reduced before the verifier
+    sees them: groups of `reduce_fan_in` answers are merged in parallel,
+    level by level, until few enough remain for the verifier to merge at
+    the root from `panel_digests`. This keeps the verifier's prompt bounded
+    however large the panel is.
+
+    With a `consensus` scorer, the panel's agreement is scored before any
+    synthesis and stored under `panel_consensus`. When the workers agree,
+    the verifier's full synthesis (and its web search) is skipped: the
+    verifier's model only polishes the most representative answer with a
+    short pick-best prompt.
+
+    With a `cascade`, a fast model answers first and rates its own answer;
+    only answers below the cascade's threshold escalate to the panel and
+    the verifier. The confidence is stored under `research_cascade`.
+
+    With a `degradation` controller, every run is counted as in flight and
+    gets the controller's current policy under `degradation`, which the
+    panel and the model callbacks apply while the server is overloaded.
+
+    With `reuse_follow_ups`, a request that refines the previous research
+    turn ("make that shorter", "expand point 2") skips the panel: only the
+    verifier runs, over its previous answer and any worker answers stored
+    in state by that turn, with `research_follow_up` instructions.
+
+    With `refresh_roster`, the panel may be rebuilt (e.g. after the roster
+    file changed), but only at the start of a run while no other run is in
+    flight, so a run never mixes the workers of two rosters.
+    """
+
+    incremental: bool = False
+    """Whether to digest worker answers while the panel is still running."""
+
+    digest_instruction: str = DIGEST_INSTRUCTION
+    """System instruction for the per-worker digest calls."""
+
+    reduce_fan_in: int = 3
+    """Number of answers merged together at each level of the tree."""
+
+    reduce_threshold_tokens: int | None = None
+    """Size of the panel's answers above which they are tree-reduced."""
+
+    merge_instruction: str = MERGE_INSTRUCTION
+    """System instruction for the merge calls of the tree reduction."""
+
+    consensus: ConsensusScorer | None = None
+    """Scores the panel's agreement to skip the full verification."""
+
+    pick_best_instruction: str = PICK_BEST_INSTRUCTION
+    """System instruction for presenting an answer the panel agreed on."""
+
+    cascade: Cascade | None = None
+    """Answers with a fast model first, escalating to the panel when unsure."""
+
+    reuse_follow_ups: bool = False
+    """Whether follow-ups re-run only the verifier over the stored answers."""
+
+    degradation: DegradationController | None = None
+    """Sheds quality under overload, see `DegradationController`."""
+
+    refresh_roster: Callable[[], None] | None = None
+    """Rebuilds the panel and verifier for an edited roster, between runs."""
+
+    _active_runs: int = PrivateAttr(default=0)
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        if self.refresh_roster is not None and not self._active_runs:
+            self.refresh_roster()
+        self._active_runs += 1
+        try:
+            async for event in self._run_tracked(ctx):
+                yield event
+        finally:
+            self._active_runs -= 1
+
+    async def _run_tracked(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        if self.degradation is None:
+            async for event in self._run_research(ctx):
+                yield event
+            return
+
+        with self.degradation.track() as policy:
+            yield Event(
+                invocation_id=ctx.invocation_id,
+                author=self.name,
+                branch=ctx.branch,
+                actions=EventActions(
+                    state_delta={DEGRADATION_KEY: dataclasses.asdict(policy)}
+                ),
+            )
+            async for event in self._run_research(ctx):
+                yield event
+
+    async def _run_research(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        request = response_text(ctx.user_content)
+        follow_up = self._is_follow_up(ctx, request)
+        span = trace.get_current_span()
+        span.set_attribute("research.follow_up", follow_up)
+        if follow_up:
+            logger.info("Follow-up, re-running only the verifier: %r", request)
+            async for event in self._run_follow_up(ctx):
+                yield event
+            return
+
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            actions=EventActions(
+                state_delta={
+                    RESEARCH_QUESTION_KEY: request,
+                    FOLLOW_UP_KEY: "",
+                    PANEL_DIGESTS_KEY: "",
+                    CONSENSUS_KEY: None,
+                }
+            ),
+        )
+        if self.cascade is None:
+            async for event in self._run_panel_and_verifier(ctx, request):
+                yield event
+            return
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        result = await self.cascade.answer(request)
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            actions=EventActions(
+                state_delta={
+                    CASCADE_KEY: {
+                        "confidence": result.confidence,
+                        "escalated": result.escalate,
+                    }
+                }
+            ),
+        )
+        if not result.escalate:
+            # Answers of an earlier turn do not belong to this question.
+            panel = self.sub_agents[0]
+            stale = {
+                agent.output_key: ""
+                for agent in panel.sub_agents
+                if isinstance(agent, LlmAgent) and agent.output_key
+            }
+            yield self._answer_event(ctx, result.answer, stale)
+            self.cascade.record(escalated=False, elapsed_s=loop.time() - started)
+            return
+
+        async for event in self._run_panel_and_verifier(ctx, request):
+            yield event
+        self.cascade.record(escalated=True, elapsed_s=loop.time() - started)
+
+    async def _run_panel_and_verifier(
+        self, ctx: InvocationContext, request: str
+    ) -> AsyncGenerator[Event, None]:
+        """Runs the panel, then the verifier on its answers or their digests."""
+        if (
+            not self.incremental
+            and not self.reduce_threshold_tokens
+            and self.consensus is None
+        ):
+            async for event in super()._run_async_impl(ctx):
+                yield event
+            return
+
+        panel, *synthesis_agents = self.sub_agents
+        produced: dict = {}
+        panel_events = (
+            self._run_panel_with_digests(ctx, panel, request)
+            if self.incremental
+            else panel.run_async(ctx)
+        )
+        async for event in panel_events:
+            yield event
+            produced.update(event.actions.state_delta)
+
+        # Only this turn's answers: quorum mode may leave older ones in state.
+        answers, sections = {}, []
+        for agent in panel.sub_agents:
+            if not isinstance(agent, LlmAgent) or not agent.output_key:
+                continue
+            if produced.get(agent.output_key):
+                answers[agent.name] = str(produced[agent.output_key])
+            key = f"{agent.name}_digest" if self.incremental else agent.output_key
+            if produced.get(key):
+                sections.append((agent.name, str(produced[key])))
+
+        if self.consensus is not None:
+            consensus = await self.consensus.score(answers)
+            agreed = self.consensus.agrees(consensus)
+            trace.get_current_span().set_attribute("research.consensus", agreed)
+            if consensus is not None:
+                yield Event(
+                    invocation_id=ctx.invocation_id,
+                    author=self.name,
+                    branch=ctx.branch,
+                    actions=EventActions(
+                        state_delta={CONSENSUS_KEY: dataclasses.asdict(consensus)}
+                    ),
+                )
+            if agreed and consensus is not None:
+                logger.info(
+                    "Panel agrees (%.2f), presenting %s's answer",
+                    consensus.score,
+                    consensus.best,
+                )
+                yield await self._pick_best(ctx, request, answers[consensus.best])
+                return
+
+        reduced = self._needs_reduction(sections)
+        if reduced:
+            sections = await self._tree_reduce(request, sections)
+            yield Event(
+                invocation_id=ctx.invocation_id,
+                author=self.name,
+                branch=ctx.branch,
+                actions=EventActions(
+                    state_delta={PANEL_DIGESTS_KEY: _join_sections(sections)}
+                ),
+            )
+
+        for agent in synthesis_agents:
+            # The verifier reads the digests, not the raw answers.
+            agent_ctx = (
+                _create_branch_ctx_for_sub_agent(self, agent, ctx)
+                if self.incremental or reduced
+                else ctx
+            )
+            async for event in agent.run_async(agent_ctx):
+                yield event
+
+    async def _pick_best(
+        self, ctx: InvocationContext, question: str, answer: str
+    ) -> Event:
+        """Presents the answer the panel agreed on as the verifier's answer."""
+        try:
+            text = await generate_text(
+                self._verifier_model(),
+                self.pick_best_instruction,
+                f"Question: {question}\n\nExpert answer:\n{answer}",
+            )
+        except Exception:
+            logger.exception("Pick-best failed, passing the answer through")
+            text = ""
+        return self._answer_event(ctx, text or answer)
+
+    def _answer_event(
+        self, ctx: InvocationContext, text: str, state_delta: dict | None = None
+    ) -> Event:
+        """An answer given in the verifier's name, without running it."""
+        verifier = self.sub_agents[-1]
+        state_delta = dict(state_delta or {})
+        output_key = getattr(verifier, "output_key", None)
+        if output_key:
+            state_delta[output_key] = text
+        return Event(
+            invocation_id=ctx.invocation_id,
+            author=verifier.name,
+            branch=ctx.branch,
+            content=genai_types.Content(
+                role="model", parts=[genai_types.Part(text=text)]
+            ),
+            actions=EventActions(state_delta=state_delta),
+        )
+
+    def _needs_reduction(self, sections: list[tuple[str, str]]) -> bool:
+        if not self.reduce_threshold_tokens or len(sections) < 2:
+            return False
+        return _section_tokens(sections) > self.reduce_threshold_tokens
+
+    async def _tree_reduce(
+        self, question: str, sections: list[tuple[str, str]]
+    ) -> list[tuple[str, str]]:
+        """Merges the answers level by level until the root can take them.
+
+        Args:
+            question: The research question being answered.
+            sections: (name, answer) pairs, one per worker.
+
+        Returns:
+            At most `reduce_fan_in` merged sections, whose names list the
+            workers they cover.
+        """
+        fan_in = max(2, self.reduce_fan_in)
+        threshold = self.reduce_threshold_tokens or 0
+        levels = 0
+        input_tokens = _section_tokens(sections)
+        while len(sections) > 1 and (
+            len(sections) > fan_in or _section_tokens(sections) > threshold
+        ):
+            groups = [
+                sections[start : start + fan_in]
+                for start in range(0, len(sections), fan_in)
+            ]
+            merged = await asyncio.gather(
+                *(self._merge(question, group) for group in groups)
+            )
+            sections = [
+                (" + ".join(name for name, _ in group), text)
+                for group, text in zip(groups, merged, strict=True)
+            ]
+            levels += 1
+
+        span = trace.get_current_span()
+        span.set_attribute("research.tree_reduce.levels", levels)
+        span.set_attribute("research.tree_reduce.input_tokens", input_tokens)
+        span.set_attribute(
+            "research.tree_reduce.output_tokens", _section_tokens(sections)
+        )
+        logger.info(
+            "Tree-reduced %d tokens of panel answers in %d levels",
+            input_tokens,
+            levels,
+        )
+        return sections
+
+    async def _merge(self, question: str, group: list[tuple[str, str]]) -> str:
+        """Merges one group of answers with the verifier's model."""
+        if len(group) == 1:
+            return group[0][1]
+        model = self._verifier_model()
+        try:
+            merged = await generate_text(
+                model,
+                self.merge_instruction,
+                f"Question: {question}\n\nExpert answers:\n\n" + _join_sections(group),
+            )
+        except Exception:
+            logger.exception("Merge failed, passing the answers through")
+            return _join_sections(group)
+        return merged or _join_sections(group)
+
+    def _is_follow_up(self, ctx: InvocationContext, request: str) -> bool:
+        """Whether `request` refines a research turn answered in this session."""
+        if not self.reuse_follow_ups:
+            return False
+        if classify(request).label not in FOLLOW_UP_INTENTS:
+            return False
+        verifier = self.sub_agents[-1]
+        state = ctx.session.state
+        # Worker answers are optional: the cascade may have answered alone.
+        return bool(
+            state.get(RESEARCH_QUESTION_KEY)
+            and state.get(getattr(verifier, "output_key", None) or "")
+        )
+
+    async def _run_follow_up(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        """Runs only the verifier, over the answers of the previous turn."""
+        panel, *_, verifier = self.sub_agents
+        state = ctx.session.state
+        # The verifier runs in a fresh session for every request, so the
+        # stored answers must be in its instructions.
+        answers = [
+            (agent.name, str(state[agent.output_key]))
+            for agent in panel.sub_agents
+            if isinstance(agent, LlmAgent)
+            and agent.output_key
+            and state.get(agent.output_key)
+        ]
+        instructions = FOLLOW_UP_INSTRUCTION.format(
+            question=state[RESEARCH_QUESTION_KEY],
+            answers=_join_sections(answers) or "(none)",
+            answer=state.get(getattr(verifier, "output_key", None) or ""),
+        )
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            # The previous turn's digests must not pick the verifier's template.
+            actions=EventActions(
+                state_delta={FOLLOW_UP_KEY: instructions, PANEL_DIGESTS_KEY: ""}
+            ),
+        )
+        if isinstance(verifier, LlmAgent) and verifier.tools:
+            # The stored answers are reworked, not researched again.
+            verifier = verifier.clone(update={"tools": []})
+        async for event in verifier.run_async(ctx):
+            yield event
+
+    async def _run_panel_with_digests(
+        self, ctx: InvocationContext, panel: BaseAgent, question: str
+    ) -> AsyncGenerator[Event, None]:
+        """Runs the panel and digests each worker answer as it arrives.
+
+        Args:
+            ctx: The invocation context of the pipeline.
+            panel: The agent fanning out to the workers.
+            question: The research question being answered.
+
+        Yields:
+            The panel events, followed by an event storing the digests.
+        """
+        workers = {
+            agent.output_key: agent.name
+            for agent in panel.sub_agents
+            if isinstance(agent, LlmAgent) and agent.output_key
+        }
+        digests: dict[str, asyncio.Task] = {}
+        try:
+            async for event in panel.run_async(ctx):
+                yield event
+                for key, value in event.actions.state_delta.items():
+                    if key in workers and value and workers[key] not in digests:
+                        digests[workers[key]] = asyncio.create_task(
+                            self._digest(question, str(value))
+                        )
+
+            state_delta: dict = {}
+            sections = []
+            for agent in panel.sub_agents:
+                if agent.name not in digests:
+                    continue
+                digest = await digests[agent.name]
+                state_delta[f"{agent.name}_digest"] = digest
+                sections.append((agent.name, digest))
+            state_delta[PANEL_DIGESTS_KEY] = _join_sections(sections)
+        finally:
+            for task in digests.values():
+                task.cancel()
+
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            actions=EventActions(state_delta=state_delta),
+        )
+
+    def _verifier_model(self) -> BaseLlm:
+        """Returns the model of the verifier, the last sub-agent."""
+        verifier = self.sub_agents[-1]
+        if not isinstance(verifier, LlmAgent):
+            raise TypeError(f"The verifier {verifier.name!r} must be an LlmAgent")
+        return verifier.canonical_model
+
+    async def _digest(self, question: str, answer: str) -> str:
+        """Condenses one worker answer with the verifier's model."""
+        model = self._verifier_model()
+        try:
+            digest = await generate_text(
+                model,
+                self.digest_instruction,
+                f"Question: {question}\n\nExpert answer:\n{answer}",
+            )
+        except Exception:
+            logger.exception("Digest failed, passing the raw answer through")
+            return answer
+        return digest or answer
+
+
+def _join_sections(sections: list[tuple[str, str]]) -> str:
+    return "\n\n".join(f"### {name}\n{text}" for name, text in sections)
+
+
+def _section_tokens(sections: list[tuple[str, str]]) -> int:
+    return sum(estimate_tokens(text) for _, text in sections)
@@ -0,0 +1,220 @@
+import logging
+import os
+from collections import Counter
+from collections.abc import Iterable
+
+from google.adk.agents import BaseAgent, LlmAgent
+from google.adk.models.base_llm import BaseLlm
+from ollama import AsyncClient
+
+from app.model_router import RoutedLlm
+from app.ollama_clients import get_async_client
+from app.ollama_fix import OllamaLiteLlm
+from app.ollama_model import OllamaLlm
+from app.ollama_scheduler import LOCAL_OLLAMA_BASE, get_scheduler
+
+logger = logging.getLogger(__name__)
+
+# Memory the panel models may use together on the local Ollama host. Unset
+# (or 0) runs the panel without residency waves.
+OLLAMA_MEMORY_BUDGET_GB = float(os.getenv("OLLAMA_MEMORY_BUDGET_GB") or 0)
+# Models kept loaded for good, e.g. the verifier's model.
+RESIDENCY_PINNED_MODELS = [
+    model
+    for model in (os.getenv("RESIDENCY_PINNED_MODELS") or "").split(",")
+    if model.strip()
+]
+
+# Approximate bits per weight of Ollama's quantization levels.
+_QUANT_BITS = {
+    "Q4_0": 4.5,
+    "Q4_1": 5.0,
+    "Q4_K_S": 4.6,
+    "Q4_K_M": 4.9,
+    "Q5_0": 5.5,
+    "Q5_K_M": 5.7,
+    "Q6_K": 6.6,
+    "Q8_0": 8.5,
+    "F16": 16.0,
+    "BF16": 16.0,
+}
+# Weights are only part of a loaded model: the KV cache and compute buffers
+# come on top.
+_RUNTIME_OVERHEAD = 1.2
+
+
+def local_model(agent: BaseAgent) -> tuple[str, str] | None:
+    """Returns the (host, model) a local Ollama agent calls, if it is one."""
+    if not isinstance(agent, LlmAgent):
+        return None
+    return local_endpoint(agent.model)
+
+
+def local_endpoint(model: BaseLlm | str) -> tuple[str, str] | None:
+    """Returns the (host, model) a local Ollama model is served from, if any."""
+    if isinstance(model, OllamaLiteLlm):
+        return model.api_base.rstrip("/"), model.ollama_model
+    if isinstance(model, OllamaLlm):
+        return model.host.rstrip("/"), model.model
+    if isinstance(model, RoutedLlm):
+        endpoint = model.primary_endpoint
+        if endpoint.backend != "cloud":
+            return endpoint.api_base, model.model
+    return None
+
+
+def plan_waves(
+    models: list[str],
+    footprints: dict[str, int],
+    budget: int,
+    resident: Iterable[str] = (),
+    pinned: Iterable[str] = (),
+) -> list[list[str]]:
+    """
+    Packs models into waves whose footprints fit in the memory budget.
+
+    Pinned models are always loaded, so their memory is taken off the budget
+    and they run in the first wave. Models that are already resident go
+    first as well; the rest are packed first-fit, largest first. A model
+    that does not fit on its own gets a wave to itself.
+
+    Args:
+        models: The models to run.
+        footprints: Memory used by each model once loaded, in bytes.
+        budget: Memory available for all models together, in bytes.
+        resident: Models that are currently loaded.
+        pinned: Models that stay loaded.
+
+    Returns:
+        The waves, each a list of models, in the order they should run.
+    """
+    resident, pinned = set(resident), set(pinned)
+    capacity = budget - sum(footprints.get(model, 0) for model in pinned)
+    first = [model for model in models if model in pinned or model in resident]
+    rest = sorted(
+        (model for model in models if model not in first),
+        key=lambda model: -footprints.get(model, 0),
+    )
+    waves: list[list[str]] = []
+    used: list[int] = []
+    for model in first + rest:
+        cost = 0 if model in pinned else footprints.get(model, 0)
+        for index, wave_used in enumerate(used):
+            if wave_used + cost <= capacity:
+                waves[index].append(model)
+                used[index] += cost
+                break
+        else:
+            waves.append([model])
+            used.append(cost)
+    return waves
+
+
+class ResidencyManager:
+    """
+    Tracks which models fit in memory on one Ollama host.
+
+    Footprints are learned from `ps` once a model has been loaded and
+    estimated from `show` (parameter count and quantization) before that.
+    The models of every planned request are reference counted, so a model
+    is only unloaded once no other request planned it and the scheduler
+    has no calls running or queued for it.
+    """
+
+    def __init__(
+        self,
+        memory_budget_bytes: int,
+        host: str = LOCAL_OLLAMA_BASE,
+        pinned: list[str] | None = None,
+    ) -> None:
+        """Initializes the manager.
+
+        Args:
+            memory_budget_bytes: Memory the models may use together.
+            host: Base URL of the Ollama host.
+            pinned: Models kept loaded with `keep_alive=-1`.
+        """
+        self.memory_budget_bytes = memory_budget_bytes
+        self.host = host.rstrip("/")
+        self.pinned = set(pinned or ())
+        self._footprints: dict[str, int] = {}
+        self._claims: Counter[str] = Counter()
+
+    @property
+    def client(self) -> AsyncClient:
+        return get_async_client(self.host)
+
+    async def resident(self) -> set[str]:
+        """Returns the loaded models, recording their actual footprints."""
+        response = await self.client.ps()
+        loaded = set()
+        for model in response["models"]:
+            loaded.add(model["model"])
+            self._footprints[model["model"]] = model["size"]
+        return loaded
+
+    async def footprint(self, model: str) -> int:
+        """Returns the memory `model` uses once loaded, in bytes."""
+        if model not in self._footprints:
+            self._footprints[model] = await self._estimate(model)
+        return self._footprints[model]
+
+    async def _estimate(self, model: str) -> int:
+        show = await self.client.show(model)
+        params = (show.get("modelinfo") or {}).get("general.parameter_count") or 0
+        quantization = (show.get("details") or {}).get("quantization_level") or ""
+        bits = _QUANT_BITS.get(quantization.upper(), 5.0)
+        return int(params * bits / 8 * _RUNTIME_OVERHEAD)
+
+    async def plan(self, models: list[str]) -> tuple[list[list[str]], set[str]]:
+        """
+        Plans the waves for a request and pins the pinned models.
+
+        The request holds its models until it passes them to `release` or
+        `finish`.
+
+        Args:
+            models: The models the request needs.
+
+        Returns:
+            The waves, and the models that were resident before the request.
+        """
+        self._claims.update(models)
+        resident = await self.resident()
+        footprints = {
+            model: await self.footprint(model) for model in {*models, *self.pinned}
+        }
+        for model in self.pinned - resident:
+            await self.client.generate(model=model, prompt="", keep_alive=-1)
+        waves = plan_waves(
+            models, footprints, self.memory_budget_bytes, resident, self.pinned
+        )
+        return waves, resident
+
+    def finish(self, models: Iterable[str]) -> None:
+        """Drops a request's hold on `models` without unloading them."""
+        self._claims.subtract(models)
+        for model in [model for model, count in self._claims.items() if count <= 0]:
+            del self._claims[model]
+
+    async def release(self, models: list[str]) -> None:
+        """
+        Drops a request's hold on finished models and unloads them to free
+        memory, unless they are pinned or still used by another request.
+        """
+        self.finish(models)
+        scheduler = get_scheduler(self.host)
+        for model in models:
+            if model in self.pinned or self._claims[model] or scheduler.in_use(model):
+                continue
+            await self.client.generate(model=model, prompt="", keep_alive=0)
+            scheduler.mark_unloaded(model)
+
+
+def get_residency_manager() -> ResidencyManager | None:
+    """Returns the residency manager for the local host, if a budget is set."""
+    if not OLLAMA_MEMORY_BUDGET_GB:
+        return None
+    return ResidencyManager(
+        int(OLLAMA_MEMORY_BUDGET_GB * 1024**3), pinned=RESIDENCY_PINNED_MODELS
+    )
@@ -0,0 +1,307 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict, defaultdict
+from collections.abc import AsyncGenerator, Awaitable, Callable
+from dataclasses import dataclass
+
+import numpy as np
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from opentelemetry import trace
+
+from app.llm_utils import response_text
+from app.ollama_clients import get_async_client
+from app.ollama_scheduler import LOCAL_OLLAMA_BASE
+
+logger = logging.getLogger(__name__)
+
+Embedder = Callable[[str], Awaitable[list[float]]]
+
+
+# Generation settings that change the response, so they are part of the key.
+# Labels are too: callbacks use them to mark requests served at a lower
+# quality, e.g. the degradation level.
+_GENERATION_FIELDS = {
+    "labels",
+    "temperature",
+    "top_p",
+    "top_k",
+    "max_output_tokens",
+    "stop_sequences",
+    "seed",
+    "presence_penalty",
+    "frequency_penalty",
+    "response_mime_type",
+    "response_schema",
+}
+
+
+@dataclass
+class _Entry:
+    model: str
+    context: str
+    """Hash of everything in the request but its last user turn."""
+    response: LlmResponse
+    stored_at: float
+    embedding: np.ndarray | None = None
+    """Unit embedding of the last user turn."""
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def split_prompt(llm_request: LlmRequest) -> tuple[str, str]:
+    """Splits a request into its context and its last user turn.
+
+    The context holds the system instruction, the generation settings and
+    the earlier turns. Case and whitespace are normalized so trivially
+    different phrasings of the same question share a cache entry.
+
+    Returns:
+        The normalized context and last user turn.
+    """
+    contents = list(llm_request.contents)
+    question = ""
+    if contents and contents[-1].role == "user":
+        question = response_text(contents.pop())
+    lines = []
+    config = llm_request.config
+    if config:
+        if config.system_instruction:
+            lines.append(f"system: {config.system_instruction}")
+        settings = config.model_dump(
+            mode="json", include=_GENERATION_FIELDS, exclude_none=True
+        )
+        if settings:
+            lines.append(f"config: {json.dumps(settings, sort_keys=True)}")
+    for content in contents:
+        lines.append(f"{content.role}: {response_text(content)}")
+    return _normalize("\n".join(lines)), _normalize(question)
+
+
+def _hash(*parts: str) -> str:
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def _unit(vector: list[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm > 0 else array
+
+
+class ResponseCache:
+    """
+    Cache of final model responses, keyed on model id plus normalized prompt.
+
+    Lookups first try an exact hash of the model, the normalized prompt and
+    the generation settings. When an `embedder` and `similarity_threshold`
+    are configured, a miss falls back to the cached request with the same
+    model and context (system instruction, settings and earlier turns)
+    whose last user turn is most similar, served if its cosine similarity
+    reaches the threshold. Only the last user turn is embedded, so a long
+    shared system instruction does not make every question look alike.
+    Entries expire after
+    `ttl_s` and the least recently used ones are evicted beyond
+    `max_entries`.
+
+    Only tool-less requests are cached, and only final text responses
+    are stored.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_s: float = 3600,
+        embedder: Embedder | None = None,
+        similarity_threshold: float | None = None,
+    ) -> None:
+        """Initializes the cache.
+
+        Args:
+            max_entries: Size bound, least recently used entries go first.
+            ttl_s: Seconds after which an entry is no longer served.
+            embedder: Optional async function embedding a prompt.
+            similarity_threshold: Minimum cosine similarity of a semantic hit.
+        """
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.embedder = embedder
+        self.similarity_threshold = similarity_threshold
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._stats: dict[str, dict[str, int]] = defaultdict(
+            lambda: {"exact_hits": 0, "semantic_hits": 0, "misses": 0}
+        )
+
+    async def serve(
+        self,
+        model: str,
+        llm_request: LlmRequest,
+        generate: Callable[[], AsyncGenerator[LlmResponse, None]],
+    ) -> AsyncGenerator[LlmResponse, None]:
+        """Serves `llm_request` from the cache, or generates and stores it.
+
+        Args:
+            model: The model id the request is sent to.
+            llm_request: The request, read before `generate` may modify it.
+            generate: Starts the actual model call.
+
+        Yields:
+            The cached response, or the responses of the model call.
+        """
+        if llm_request.config and llm_request.config.tools:
+            async for llm_response in generate():
+                yield llm_response
+            return
+
+        context, question = split_prompt(llm_request)
+        context = _hash(model, context)
+        key = _hash(context, question)
+        cached, embedding = await self._lookup(model, key, context, question)
+        if cached is not None:
+            yield cached
+            return
+
+        async for llm_response in generate():
+            yield llm_response
+            if self._cacheable(llm_response):
+                self._store(
+                    key,
+                    _Entry(model, context, llm_response, time.monotonic(), embedding),
+                )
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """Returns hit and miss counts and the hit ratio per model."""
+        report = {}
+        for model, counts in self._stats.items():
+            hits = counts["exact_hits"] + counts["semantic_hits"]
+            total = hits + counts["misses"]
+            report[model] = {**counts, "hit_ratio": hits / total if total else 0.0}
+        return report
+
+    async def _lookup(
+        self, model: str, key: str, context: str, question: str
+    ) -> tuple[LlmResponse | None, np.ndarray | None]:
+        """Returns a cached response, if any, and the question's embedding."""
+        span = trace.get_current_span()
+        entry = self._entries.get(key)
+        if entry is not None and not self._expired(entry):
+            self._entries.move_to_end(key)
+            self._stats[model]["exact_hits"] += 1
+            span.set_attribute("cache.result", "exact")
+            return self._hit(entry, "exact"), None
+
+        embedding = None
+        if (
+            self.embedder is not None
+            and self.similarity_threshold is not None
+            and question
+        ):
+            try:
+                embedding = _unit(await self.embedder(question))
+            except Exception:
+                logger.exception("Prompt embedding failed, skipping semantic lookup")
+            if embedding is not None:
+                best_key, best_score = self._most_similar(context, embedding)
+                if best_key is not None and best_score >= self.similarity_threshold:
+                    self._entries.move_to_end(best_key)
+                    self._stats[model]["semantic_hits"] += 1
+                    span.set_attribute("cache.result", "semantic")
+                    span.set_attribute("cache.similarity", best_score)
+                    return self._hit(self._entries[best_key], "semantic"), embedding
+
+        self._stats[model]["misses"] += 1
+        span.set_attribute("cache.result", "miss")
+        return None, embedding
+
+    def _most_similar(
+        self, context: str, embedding: np.ndarray
+    ) -> tuple[str | None, float]:
+        """Returns the live entry with the same context closest to `embedding`."""
+        keys, vectors = [], []
+        for entry_key, entry in self._entries.items():
+            if (
+                entry.context == context
+                and entry.embedding is not None
+                and entry.embedding.shape == embedding.shape
+                and not self._expired(entry)
+            ):
+                keys.append(entry_key)
+                vectors.append(entry.embedding)
+        if not keys:
+            return None, 0.0
+        scores = np.stack(vectors) @ embedding
+        best = int(scores.argmax())
+        return keys[best], float(scores[best])
+
+    def _store(self, key: str, entry: _Entry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _expired(self, entry: _Entry) -> bool:
+        return time.monotonic() - entry.stored_at > self.ttl_s
+
+    @staticmethod
+    def _cacheable(llm_response: LlmResponse) -> bool:
+        return (
+            not llm_response.partial
+            and not llm_response.error_code
+            and llm_response.content is not None
+            and not any(part.function_call for part in llm_response.content.parts or [])
+            and bool(response_text(llm_response.content))
+        )
+
+    @staticmethod
+    def _hit(entry: _Entry, kind: str) -> LlmResponse:
+        response = entry.response.model_copy(deep=True)
+        response.custom_metadata = {**(response.custom_metadata or {}), "cache": kind}
+        return response
+
+
+def ollama_embedder(model: str, host: str) -> Embedder:
+    """Returns an embedder backed by the embedding endpoint of an Ollama host."""
+
+    async def embed(text: str) -> list[float]:
+        response = await get_async_client(host).embed(model=model, input=text)
+        return list(response["embeddings"][0])
+
+    return embed
+
+
+_response_cache: ResponseCache | None = None
+
+
+def get_response_cache() -> ResponseCache | None:
+    """Returns the process-wide worker response cache, or None when disabled.
+
+    Configured from the environment:
+        WORKER_CACHE_ENABLED: "true" to enable the cache.
+        WORKER_CACHE_MAX_ENTRIES, WORKER_CACHE_TTL_S: Size and age bounds.
+        WORKER_CACHE_EMBED_MODEL: Ollama embedding model for semantic hits.
+        WORKER_CACHE_SIMILARITY: Cosine similarity threshold for semantic hits.
+    """
+    global _response_cache
+    if os.getenv("WORKER_CACHE_ENABLED", "false").lower() != "true":
+        return None
+    if _response_cache is None:
+        embed_model = os.getenv("WORKER_CACHE_EMBED_MODEL")
+        _response_cache = ResponseCache(
+            max_entries=int(os.getenv("WORKER_CACHE_MAX_ENTRIES") or 1024),
+            ttl_s=float(os.getenv("WORKER_CACHE_TTL_S") or 3600),
+            embedder=(
+                ollama_embedder(embed_model, LOCAL_OLLAMA_BASE) if embed_model else None
+            ),
+            similarity_threshold=float(os.getenv("WORKER_CACHE_SIMILARITY") or 0.95),
+        )
+    return _response_cache
+
+
+def response_cache_stats() -> dict[str, dict[str, float]]:
+    """Returns the hit ratios of the worker response cache, for monitoring."""
+    return _response_cache.stats() if _response_cache is not None else {}
@@ -0,0 +1,66 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    """
+    Coalesces concurrent calls with the same key into a single execution.
+
+    The first caller for a key starts the work in its own task; callers that
+    arrive while it is in flight await the same task. Callers are shielded
+    from each other: cancelling one of them does not cancel the shared work.
+    With `cancel_abandoned`, the work is cancelled once every caller is gone.
+    """
+
+    def __init__(self, cancel_abandoned: bool = False) -> None:
+        """Initializes the group.
+
+        Args:
+            cancel_abandoned: Whether to cancel an execution whose last
+                caller was cancelled.
+        """
+        self.cancel_abandoned = cancel_abandoned
+        self._inflight: dict[Hashable, asyncio.Task[T]] = {}
+        self._waiters: dict[asyncio.Task[T], int] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Runs `fn` for `key`, or joins the run already in flight.
+
+        Args:
+            key: Identifies calls that are interchangeable.
+            fn: Starts the work when no call for `key` is in flight.
+
+        Returns:
+            The result of the shared execution.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if self.cancel_abandoned and not task.done():
+                    # Callers arriving while it unwinds start a new execution.
+                    if self._inflight.get(key) is task:
+                        del self._inflight[key]
+                    task.cancel()
+
+    def in_flight(self) -> int:
+        """Returns the number of distinct executions currently running."""
+        return len(self._inflight)
+
+    def _forget(self, key: Hashable, task: asyncio.Task[T]) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the error as retrieved in case every caller was cancelled.
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import os
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from google.adk.agents import BaseAgent, LlmAgent
+from google.adk.tools.agent_tool import AgentTool
+from opentelemetry import trace
+
+from app.ollama_clients import get_async_client
+from app.ollama_scheduler import get_scheduler
+from app.residency import local_model
+
+logger = logging.getLogger(__name__)
+tracer = trace.get_tracer(__name__)
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+# How long warmed models stay loaded; longer than Ollama's 5m default so the
+# first requests after a deploy still find them.
+WARMUP_KEEP_ALIVE = os.getenv("WARMUP_KEEP_ALIVE") or "30m"
+
+
+def model_roster(agent: BaseAgent) -> list[tuple[str, str]]:
+    """
+    Lists the local Ollama models an agent tree calls.
+
+    Sub-agents and agents wrapped in an AgentTool are followed. Ollama Cloud
+    models are left out since they are always loaded.
+
+    Args:
+        agent: The root of the agent tree.
+
+    Returns:
+        (host, model) pairs in the order the agents were found, without
+        duplicates.
+    """
+    roster: dict[tuple[str, str], None] = {}
+    pending = [agent]
+    while pending:
+        current = pending.pop(0)
+        pending.extend(current.sub_agents)
+        if not isinstance(current, LlmAgent):
+            continue
+        pending.extend(
+            tool.agent for tool in current.tools if isinstance(tool, AgentTool)
+        )
+        target = local_model(current)
+        if target is not None:
+            roster[target] = None
+    return list(roster)
+
+
+class Warmup:
+    """Preloads the roster's models and tracks whether the server is ready."""
+
+    def __init__(self, roster: list[tuple[str, str]], keep_alive: str) -> None:
+        """Initializes the warm-up.
+
+        Args:
+            roster: (host, model) pairs to preload, in priority order.
+            keep_alive: How long Ollama keeps each preloaded model.
+        """
+        self.roster = roster
+        self.keep_alive = keep_alive
+        self.ready = False
+        self.models: dict[str, dict] = {}
+
+    async def run(self) -> None:
+        """Preloads every host's models, one host-wide load at a time."""
+        hosts: dict[str, list[str]] = {}
+        for host, model in self.roster:
+            hosts.setdefault(host, []).append(model)
+        with tracer.start_as_current_span("warmup"):
+            await asyncio.gather(
+                *(self._warm_host(host, models) for host, models in hosts.items())
+            )
+        self.ready = True
+        logger.info("Warm-up finished: %s", self.models)
+
+    async def _warm_host(self, host: str, models: list[str]) -> None:
+        scheduler = get_scheduler(host)
+        budget = scheduler.max_loaded_models
+        for index, model in enumerate(models):
+            key = f"{host}/{model}"
+            if budget is not None and index >= budget:
+                # Loading it would only evict a model warmed a moment ago.
+                self.models[key] = {"status": "skipped", "reason": "over budget"}
+                continue
+            # Loads run one at a time so they don't compete for the host.
+            started = time.monotonic()
+            try:
+                async with scheduler.slot(model):
+                    response = await get_async_client(host).generate(
+                        model=model, prompt="", keep_alive=self.keep_alive
+                    )
+            except Exception as error:
+                logger.warning("Warm-up of %s failed: %s", key, error)
+                self.models[key] = {"status": "failed", "error": str(error)}
+                continue
+            self.models[key] = {
+                "status": "loaded",
+                "wall_s": round(time.monotonic() - started, 3),
+                "load_s": round((response.get("load_duration") or 0) / 1e9, 3),
+            }
+
+    def status(self) -> dict:
+        """Returns readiness and the load results per model."""
+        return {"ready": self.ready, "models": self.models}
+
+
+@asynccontextmanager
+async def warmup_lifespan(warmup: Warmup) -> AsyncIterator[None]:
+    """
+    Runs the warm-up in the background for the lifetime of the server.
+
+    The server starts serving straight away; readiness checks report
+    not-ready until the warm-up finishes. With WARMUP_ENABLED=false the
+    server is ready immediately.
+
+    Args:
+        warmup: The warm-up to run.
+    """
+    if not WARMUP_ENABLED:
+        warmup.ready = True
+        yield
+        return
+    task = asyncio.create_task(warmup.run())
+    try:
+        yield
+    finally:
+        task.cancel()
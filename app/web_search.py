@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from ddgs import DDGS
+
+from app.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+SEARCH_MAX_WORKERS = int(os.getenv("SEARCH_MAX_WORKERS") or 4)
+SEARCH_CACHE_TTL_S = float(os.getenv("SEARCH_CACHE_TTL_S") or 900)
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS") or 3)
+SEARCH_MAX_QUERIES = 5
+# "compact" returns budgeted title/url/snippet records, "raw" the DDGS dicts.
+SEARCH_RESULT_MODE = os.getenv("SEARCH_RESULT_MODE", "compact")
+SEARCH_RESULT_CHARS = int(os.getenv("SEARCH_RESULT_CHARS") or 300)
+SEARCH_TOTAL_CHARS = int(os.getenv("SEARCH_TOTAL_CHARS") or 2000)
+
+
+class WebSearch:
+    """
+    Non-blocking DuckDuckGo search.
+
+    DDGS is synchronous, so searches run on a bounded thread pool with one
+    reusable client per thread. Results are cached for `ttl_s` and identical
+    queries that are already in flight share a single search.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = SEARCH_MAX_WORKERS,
+        ttl_s: float = SEARCH_CACHE_TTL_S,
+        max_results: int = SEARCH_MAX_RESULTS,
+    ) -> None:
+        """Initializes the search client.
+
+        Args:
+            max_workers: Number of searches that may run at the same time.
+            ttl_s: Seconds a result list is served from the cache.
+            max_results: Number of results fetched per query.
+        """
+        self.ttl_s = ttl_s
+        self.max_results = max_results
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="ddgs"
+        )
+        self._local = threading.local()
+        self._cache: dict[str, tuple[float, list[dict]]] = {}
+        self._inflight: SingleFlight[list[dict]] = SingleFlight()
+
+    async def search(self, query: str) -> list[dict]:
+        """Returns the results for `query`, from the cache when still fresh."""
+        key = re.sub(r"\s+", " ", query).strip().lower()
+        cached = self._cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < self.ttl_s:
+            return cached[1]
+        return await self._inflight.do(key, lambda: self._fetch(key, query))
+
+    async def _fetch(self, key: str, query: str) -> list[dict]:
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(self._executor, self._search_sync, query)
+        self._cache[key] = (time.monotonic(), results)
+        self._evict_expired()
+        return results
+
+    def _search_sync(self, query: str) -> list[dict]:
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = DDGS()
+        return client.text(query, max_results=self.max_results) or []
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, (at, _) in self._cache.items() if now - at >= self.ttl_s]:
+            del self._cache[key]
+
+
+def _truncate(text: str, limit: int) -> tuple[str, bool]:
+    text = re.sub(r"\s+", " ", text).strip()
+    if len(text) <= limit:
+        return text, False
+    return text[: max(limit - 3, 0)].rsplit(" ", 1)[0] + "...", True
+
+
+def compact_results(
+    results_by_query: dict[str, list[dict]],
+    result_chars: int = SEARCH_RESULT_CHARS,
+    total_chars: int = SEARCH_TOTAL_CHARS,
+) -> dict:
+    """
+    Turns raw DDGS results into budgeted title/url/snippet records.
+
+    Only the first result per domain is kept, each snippet is cut to
+    `result_chars` and records stop once `total_chars` is spent. The
+    returned dict says when anything was cut so the model knows the
+    results are incomplete.
+
+    Args:
+        results_by_query: DDGS results for each query.
+        result_chars: Character budget of one snippet.
+        total_chars: Character budget of all records together.
+
+    Returns:
+        A dict with the `results` records and truncation details.
+    """
+    records = []
+    seen_domains = set()
+    spent = 0
+    cut_snippets = 0
+    dropped = 0
+    for query, results in results_by_query.items():
+        for result in results:
+            url = result.get("href", "")
+            domain = urlparse(url).netloc.removeprefix("www.")
+            if domain:
+                if domain in seen_domains:
+                    continue
+                seen_domains.add(domain)
+
+            title, _ = _truncate(result.get("title", ""), 120)
+            snippet, cut = _truncate(result.get("body", ""), result_chars)
+            size = len(title) + len(url) + len(snippet)
+            if spent + size > total_chars:
+                dropped += 1
+                continue
+            spent += size
+            cut_snippets += cut
+            records.append(
+                {"query": query, "title": title, "url": url, "snippet": snippet}
+            )
+
+    compact: dict = {"results": records, "truncated": bool(cut_snippets or dropped)}
+    if compact["truncated"]:
+        compact["note"] = (
+            f"Results were truncated to fit the context budget: {cut_snippets} "
+            f"snippets shortened, {dropped} results omitted."
+        )
+    return compact
+
+
+web_search = WebSearch()
+
+
+async def duckduckgo_search_tool(queries: str | list[str]) -> dict | str:
+    """
+    Performs web searches using DuckDuckGo.
+
+    Pass every fact you need to check as a separate query; all queries are
+    searched concurrently in a single call.
+
+    Args:
+        queries: One search query, or a list of them.
+
+    Returns:
+        The search results as title/url/snippet records, one source per domain.
+    """
+    if isinstance(queries, str):
+        queries = [queries]
+    unique = list(dict.fromkeys(q for q in queries if q.strip()))
+    queries = unique[:SEARCH_MAX_QUERIES]
+    if len(unique) > len(queries):
+        logger.warning(
+            "Searching the first %d of %d queries, dropped: %s",
+            len(queries),
+            len(unique),
+            unique[len(queries) :],
+        )
+    if not queries:
+        return "No query given."
+
+    outcomes = await asyncio.gather(
+        *(web_search.search(query) for query in queries), return_exceptions=True
+    )
+    if SEARCH_RESULT_MODE == "compact":
+        results_by_query = {}
+        errors = {}
+        for query, outcome in zip(queries, outcomes, strict=True):
+            if isinstance(outcome, BaseException):
+                logger.warning("Search for %r failed: %s", query, outcome)
+                errors[query] = f"Search failed: {outcome}"
+            else:
+                results_by_query[query] = outcome
+        compact = compact_results(results_by_query)
+        if not compact["results"] and not compact["truncated"]:
+            compact["note"] = "No results found."
+        if errors:
+            compact["errors"] = errors
+        return compact
+
+    sections = []
+    for query, outcome in zip(queries, outcomes, strict=True):
+        if isinstance(outcome, BaseException):
+            logger.warning("Search for %r failed: %s", query, outcome)
+            body = f"Search failed: {outcome}"
+        elif not outcome:
+            body = "No results found."
+        else:
+            body = str(outcome)
+        sections.append(f"Results for {query!r}:\n{body}")
+    return "\n\n".join(sections)
@@ -0,0 +1,168 @@
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+
+from google.adk.agents import BaseAgent
+
+logger = logging.getLogger(__name__)
+
+WORKER_SELECTION_ENABLED = (
+    os.getenv("WORKER_SELECTION_ENABLED", "false").lower() == "true"
+)
+# Consult every worker on every question, whatever it is about.
+PANEL_ALWAYS_FULL = os.getenv("PANEL_ALWAYS_FULL", "false").lower() == "true"
+# Smallest panel a question is answered by. Keep it at 2 or more so the
+# verifier still has answers to cross-check when a keyword misfires.
+WORKER_SELECTION_MIN_PANEL = int(os.getenv("WORKER_SELECTION_MIN_PANEL") or 2)
+
+# Session state flag forcing the full panel for the next research requests.
+FULL_PANEL_KEY = "panel_full"
+
+# Words marking a question, or a worker's focus, as belonging to a domain.
+_DOMAINS = {
+    "coding": frozenset(
+        """
+        code coding program programming programmer software function functions
+        bug bugs debug compile compiler python javascript typescript java rust
+        golang c++ c# sql regex api library script class method exception
+        stacktrace algorithm algorithms refactor git docker kubernetes technical
+        """.split()
+    ),
+    "reasoning": frozenset(
+        """
+        reasoning logic logical math maths mathematics calculate calculation
+        proof prove probability equation equations solve puzzle riddle
+        deduce deduction derive
+        """.split()
+    ),
+    "knowledge": frozenset(
+        """
+        knowledge synthesis history historical science scientific culture
+        economy economics politics political geography biology physics
+        chemistry medicine literature philosophy overview background
+        """.split()
+    ),
+    "creative": frozenset(
+        """
+        creative creativity story stories poem poetry lyrics fiction novel
+        brainstorm slogan imagine
+        """.split()
+    ),
+    "vision": frozenset(
+        """
+        vision visual image images photo photos picture pictures diagram
+        screenshot chart
+        """.split()
+    ),
+}
+# Focus words of workers that are worth asking about anything.
+_GENERALIST = frozenset({"general", "generalist", "purpose"})
+_WORD = re.compile(r"[a-z][a-z0-9+#'-]*")
+_FILLER = frozenset(
+    """
+    about and are can does for from how into its large-scale open-source
+    that the this what when where which who why with your
+    """.split()
+)
+
+
+def _words(text: str) -> set[str]:
+    return {word.strip("'-") for word in _WORD.findall(text.lower())}
+
+
+def domains(text: str) -> set[str]:
+    """Returns the domains a question or focus string is about."""
+    words = _words(text)
+    return {domain for domain, terms in _DOMAINS.items() if words & terms}
+
+
+@dataclass
+class Selection:
+    selected: list[str]
+    """Names of the workers consulted, best match first."""
+    scores: dict[str, float] = field(default_factory=dict)
+    """Relevance of every worker to the question."""
+    reason: str = "matched"
+    """"matched", or why the full panel was used."""
+
+
+class WorkerSelector:
+    """
+    Picks the workers worth consulting on a question.
+
+    Each worker's `description` holds the focus it was created with. The
+    question and the focus strings are classified into domains (coding,
+    reasoning, knowledge, ...) with keyword lists, and a worker is relevant
+    when its focus shares a domain, or a word, with the question. Workers
+    with a general focus fill the panel up to `min_panel_size` first.
+    Questions that match no domain get the full panel, as does every
+    question with `always_full_panel` or the `panel_full` state flag.
+    """
+
+    def __init__(
+        self,
+        min_panel_size: int = WORKER_SELECTION_MIN_PANEL,
+        always_full_panel: bool = PANEL_ALWAYS_FULL,
+    ) -> None:
+        """Initializes the selector.
+
+        Args:
+            min_panel_size: Smallest number of workers to consult.
+            always_full_panel: Whether to consult every worker regardless.
+        """
+        self.min_panel_size = min_panel_size
+        self.always_full_panel = always_full_panel
+
+    def select(
+        self, question: str, workers: list[BaseAgent], full_panel: bool = False
+    ) -> Selection:
+        """
+        Selects the workers to consult on `question`.
+
+        Args:
+            question: The research question.
+            workers: The whole panel, in roster order.
+            full_panel: Whether this request asked for the full panel.
+
+        Returns:
+            The selected workers, and every worker's relevance score.
+        """
+        everyone = [worker.name for worker in workers]
+        if self.always_full_panel or full_panel:
+            return Selection(everyone, reason="full panel requested")
+        question_domains = domains(question)
+        if not question_domains:
+            return Selection(everyone, reason="no domain recognized")
+
+        question_words = _words(question) - _FILLER
+        scores = {}
+        for worker in workers:
+            focus = worker.description or ""
+            focus_words = _words(focus) - _FILLER - _GENERALIST
+            scores[worker.name] = len(question_domains & domains(focus)) + 0.5 * len(
+                question_words & focus_words
+            )
+        ranked = sorted(everyone, key=lambda name: -scores[name])
+        selected = [name for name in ranked if scores[name] > 0]
+
+        min_panel_size = max(1, self.min_panel_size)
+        if len(selected) < min_panel_size:
+            generalists = [
+                worker.name
+                for worker in workers
+                if _words(worker.description or "") & _GENERALIST
+            ]
+            for name in generalists + ranked:
+                if len(selected) >= min_panel_size:
+                    break
+                if name not in selected:
+                    selected.append(name)
+        return Selection(selected, scores)
+
+
+def get_worker_selector() -> WorkerSelector | None:
+    """Returns the panel's worker selector, or None when disabled."""
+    if not WORKER_SELECTION_ENABLED:
+        return None
+    return WorkerSelector()
@@ -0,0 +1,117 @@
+"""
+Compares the per-call overhead of the native Ollama backend (OllamaLlm) with
+the LiteLLM route (OllamaLiteLlm).
+
+Both backends talk to a local fake Ollama server that answers instantly, so
+the measured time is the client-side cost of building the request, the HTTP
+round trip and turning the answer into an LlmResponse.
+
+Usage: python benchmark_backends.py [--calls 200]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+MODEL = "llama3.2:latest"
+CHAT_RESPONSE = {
+    "model": MODEL,
+    "created_at": "2025-01-01T00:00:00Z",
+    "message": {"role": "assistant", "content": "Paris is the capital of France."},
+    "done": True,
+    "done_reason": "stop",
+    "prompt_eval_count": 30,
+    "eval_count": 8,
+    "total_duration": 1_000_000,
+    "load_duration": 0,
+    "prompt_eval_duration": 500_000,
+    "eval_duration": 500_000,
+}
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        body = json.dumps(CHAT_RESPONSE).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+def import_time(module: str) -> float:
+    """Seconds a fresh interpreter needs to import `module`."""
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", f"import {module}"], check=True)
+    return time.perf_counter() - started
+
+
+async def time_calls(model: Any, calls: int) -> list[float]:
+    from google.adk.models.llm_request import LlmRequest
+    from google.genai import types as genai_types
+
+    request = LlmRequest(
+        contents=[
+            genai_types.Content(
+                role="user", parts=[genai_types.Part(text="Capital of France?")]
+            )
+        ],
+        config=genai_types.GenerateContentConfig(system_instruction="Be brief."),
+    )
+    durations = []
+    for _ in range(calls + 5):
+        started = time.perf_counter()
+        async for _ in model.generate_content_async(request):
+            pass
+        durations.append(time.perf_counter() - started)
+    return durations[5:]  # drop warm-up calls
+
+
+async def main(calls: int) -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOllamaHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_base = f"http://127.0.0.1:{server.server_port}"
+
+    from app.ollama_fix import OllamaLiteLlm
+    from app.ollama_model import OllamaLlm
+
+    backends = {
+        "litellm": OllamaLiteLlm(model=f"ollama_chat/{MODEL}", api_base=api_base),
+        "native": OllamaLlm(model=MODEL, host=api_base),
+    }
+    # The app package imports every agent, so time the client libraries instead.
+    modules = {"litellm": "google.adk.models.lite_llm", "native": "ollama"}
+
+    print(f"{'backend':<10}{'import s':>10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, model in backends.items():
+        durations = sorted(await time_calls(model, calls))
+        print(
+            f"{name:<10}{import_time(modules[name]):>10.2f}"
+            f"{statistics.mean(durations) * 1e3:>10.2f}"
+            f"{durations[len(durations) // 2] * 1e3:>10.2f}"
+            f"{durations[int(len(durations) * 0.95)] * 1e3:>10.2f}"
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=200)
+    asyncio.run(main(parser.parse_args().calls))
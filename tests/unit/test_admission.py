@@ -0,0 +1,258 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from starlette.types import Message, Receive, Scope, Send
+
+from app.admission import AdmissionController, AdmissionMiddleware, AdmissionRejected
+
+
+async def run_requests(
+    controller: AdmissionController, requests: list[tuple[str, str]]
+) -> list[str]:
+    """Starts one run per (user, priority), in order, and returns the admission order."""
+    order: list[str] = []
+    release = asyncio.Event()
+
+    async def run(user: str, priority: str) -> None:
+        async with controller.slot(user, priority):
+            order.append(f"{user}:{priority}")
+            await release.wait()
+            await asyncio.sleep(0)
+
+    tasks = []
+    for user, priority in requests:
+        tasks.append(asyncio.create_task(run(user, priority)))
+        await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(*tasks)
+    return order
+
+
+@pytest.mark.asyncio
+async def test_rejects_beyond_queue() -> None:
+    controller = AdmissionController(max_concurrent=1, max_queue=1, retry_after_s=7)
+    release = asyncio.Event()
+
+    async def run() -> None:
+        async with controller.slot("u"):
+            await release.wait()
+
+    running = asyncio.create_task(run())
+    queued = asyncio.create_task(run())
+    await asyncio.sleep(0)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        async with controller.slot("u"):
+            pass
+    assert rejected.value.retry_after_s == 7
+    assert controller.stats()["active"] == 1
+    assert controller.stats()["queued"] == 1
+
+    release.set()
+    await asyncio.gather(running, queued)
+    stats = controller.stats()["priorities"]["normal"]
+    assert (stats["admitted"], stats["rejected"]) == (2, 1)
+    assert stats["queue_wait"]["avg_s"] > 0
+    assert controller.stats()["active"] == 0
+
+
+@pytest.mark.asyncio
+async def test_priority_then_round_robin_across_users() -> None:
+    controller = AdmissionController(max_concurrent=1, max_queue=10)
+
+    order = await run_requests(
+        controller,
+        [
+            ("first", "normal"),
+            ("a", "normal"),
+            ("a", "normal"),
+            ("a", "normal"),
+            ("b", "normal"),
+            ("c", "low"),
+            ("d", "high"),
+        ],
+    )
+
+    assert order == [
+        "first:normal",
+        "d:high",
+        "a:normal",
+        "b:normal",
+        "a:normal",
+        "a:normal",
+        "c:low",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_queue() -> None:
+    controller = AdmissionController(max_concurrent=1, max_queue=1)
+    release = asyncio.Event()
+
+    async def run() -> None:
+        async with controller.slot("u"):
+            await release.wait()
+
+    running = asyncio.create_task(run())
+    await asyncio.sleep(0)
+    queued = asyncio.create_task(run())
+    await asyncio.sleep(0)
+    queued.cancel()
+    await asyncio.sleep(0)
+
+    assert controller.stats()["queued"] == 0
+    release.set()
+    await running
+    assert controller.stats()["active"] == 0
+
+
+@pytest.mark.asyncio
+async def test_priority_comes_from_the_user_not_the_client() -> None:
+    controller = AdmissionController(max_concurrent=1, user_priorities={"ops": "high"})
+    release = asyncio.Event()
+    order: list[str] = []
+
+    async def run(user: str) -> None:
+        async with controller.slot(user):
+            order.append(user)
+            await release.wait()
+
+    tasks = [asyncio.create_task(run(user)) for user in ("a", "b", "ops")]
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(*tasks)
+
+    assert order == ["a", "ops", "b"]
+    assert controller.stats()["priorities"]["high"]["admitted"] == 1
+
+
+@pytest.mark.asyncio
+async def test_middleware_drops_requests_whose_client_left() -> None:
+    controller = AdmissionController(max_concurrent=1, max_queue=4)
+    release = asyncio.Event()
+    calls: list[str] = []
+
+    async def app(scope: Scope, receive: Receive, send: Send) -> None:
+        calls.append(scope["path"])
+        await release.wait()
+
+    middleware = AdmissionMiddleware(app, controller)
+    scope: Scope = {"type": "http", "path": "/run", "headers": []}
+    body = json.dumps({"user_id": "u"}).encode()
+
+    def client(disconnect: asyncio.Event) -> Receive:
+        sent = False
+
+        async def receive() -> Message:
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body}
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        return receive
+
+    async def send(message: Message) -> None:
+        pass
+
+    running = asyncio.create_task(middleware(scope, client(asyncio.Event()), send))
+    await asyncio.sleep(0)
+    gone = asyncio.Event()
+    queued = asyncio.create_task(middleware(scope, client(gone), send))
+    await asyncio.sleep(0.01)
+    assert controller.stats()["queued"] == 1
+
+    gone.set()
+    await queued
+    assert controller.stats()["queued"] == 0
+    assert controller.stats()["priorities"]["normal"]["abandoned"] == 1
+
+    release.set()
+    await running
+    assert calls == ["/run"]
+    assert controller.stats()["active"] == 0
+
+
+@pytest.mark.parametrize("admitted", [True, False])
+@pytest.mark.asyncio
+async def test_waiter_cancelled_around_dispatch_keeps_no_slot(admitted: bool) -> None:
+    controller = AdmissionController(max_concurrent=1, max_queue=1)
+    holder = controller.slot("u")
+    await holder.__aenter__()
+
+    async def run() -> None:
+        async with controller.slot("u"):
+            pytest.fail("a cancelled waiter must not run")
+
+    queued = asyncio.create_task(run())
+    await asyncio.sleep(0)
+    if admitted:
+        # The waiter is handed the slot, then cancelled before it resumes.
+        await holder.__aexit__(None, None, None)
+        queued.cancel()
+    else:
+        # The waiter is cancelled, then skipped by a dispatch before it resumes.
+        queued.cancel()
+        await holder.__aexit__(None, None, None)
+
+    with pytest.raises(asyncio.CancelledError):
+        await queued
+    assert controller.stats()["active"] == 0
+    assert controller.stats()["queued"] == 0
+
+
+@pytest.mark.asyncio
+async def test_middleware_returns_429_with_retry_after() -> None:
+    controller = AdmissionController(max_concurrent=1, max_queue=0, retry_after_s=3)
+    started = asyncio.Event()
+    release = asyncio.Event()
+    api = FastAPI()
+
+    @api.post("/run")
+    async def run(request: dict) -> dict:
+        started.set()
+        await release.wait()
+        return {"user": request["user_id"]}
+
+    @api.get("/health")
+    async def health() -> dict:
+        return {}
+
+    api.add_middleware(
+        AdmissionMiddleware,
+        controller=controller,
+        exempt=lambda text: text == "hi",
+    )
+    transport = httpx.ASGITransport(app=api)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        first = asyncio.create_task(client.post("/run", json={"user_id": "u1"}))
+        await started.wait()
+
+        rejected = await client.post("/run", json={"user_id": "u2"})
+        assert rejected.status_code == 429
+        assert rejected.headers["retry-after"] == "3"
+        assert (await client.get("/health")).status_code == 200
+
+        greeting = asyncio.create_task(
+            client.post(
+                "/run",
+                json={"user_id": "u3", "new_message": {"parts": [{"text": "hi"}]}},
+            )
+        )
+        await asyncio.sleep(0.05)
+        # Exempt messages are not queued, so they pass the full queue.
+        assert not greeting.done()
+        assert controller.stats()["priorities"]["normal"]["rejected"] == 1
+
+        release.set()
+        response = await first
+        assert response.json() == {"user": "u1"}
+        assert "x-queue-wait-ms" in response.headers
+        assert (await greeting).json() == {"user": "u3"}
+        assert "x-queue-wait-ms" not in (await greeting).headers
+
+    assert controller.stats()["priorities"]["normal"]["rejected"] == 1
@@ -0,0 +1,51 @@
+from collections.abc import AsyncGenerator
+
+import pytest
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from app.cascade import Cascade, parse_confidence
+
+
+class ScriptedLlm(BaseLlm):
+    """Model that gives its replies in order."""
+
+    replies: list[str]
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        yield LlmResponse(
+            content=types.Content(
+                role="model", parts=[types.Part(text=self.replies.pop(0))]
+            )
+        )
+
+
+@pytest.mark.parametrize(
+    ("rating", "confidence"),
+    [("9", 0.9), ("Confidence: 7.5/10", 0.75), ("42", 1.0), ("unsure", 0.0)],
+)
+def test_parse_confidence(rating: str, confidence: float) -> None:
+    assert parse_confidence(rating) == pytest.approx(confidence)
+
+
+@pytest.mark.asyncio
+async def test_low_confidence_answers_escalate() -> None:
+    model = ScriptedLlm(model="fast", replies=["Paris", "9", "Maybe 1912?", "3"])
+    cascade = Cascade(model, threshold=0.8)
+
+    kept = await cascade.answer("Capital of France?")
+    escalated = await cascade.answer("Who won the 1911 chess olympiad?")
+    cascade.record(escalated=False, elapsed_s=1.0)
+    cascade.record(escalated=True, elapsed_s=11.0)
+
+    assert (kept.answer, kept.escalate) == ("Paris", False)
+    assert escalated.escalate
+    stats = cascade.stats()
+    assert stats["escalation_rate"] == 0.5
+    assert stats["estimated_saved_s"] == pytest.approx(10.0)
+    assert stats["escalation_rate_at"]["0.9"] == 0.5
+    assert stats["escalation_rate_at"]["0.5"] == 0.5
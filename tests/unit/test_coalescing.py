@@ -0,0 +1,202 @@
+import asyncio
+from collections.abc import AsyncGenerator
+
+import pytest
+from google.adk.agents import Agent, BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+from pydantic import Field
+
+from app.coalescing import CoalescingAgentTool, normalize_request
+from app.llm_utils import response_text
+from app.singleflight import SingleFlight
+from app.worker_selection import FULL_PANEL_KEY
+
+
+class DelegatingLlm(BaseLlm):
+    """Sends the user's message to the research tool, then echoes its result."""
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        last = (llm_request.contents[-1].parts or [types.Part()])[0]
+        if last.function_response is not None:
+            response = last.function_response.response or {}
+            part = types.Part(text=str(response["result"]))
+        else:
+            part = types.Part.from_function_call(
+                name="research_team", args={"request": last.text}
+            )
+        yield LlmResponse(content=types.Content(role="model", parts=[part]))
+
+
+class SlowTeam(BaseAgent):
+    """Stands in for the research pipeline, taking a while to answer."""
+
+    runs: int = 0
+    finished: int = 0
+    seen: list[tuple[str, dict]] = Field(default_factory=list)
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        self.runs += 1
+        run = self.runs
+        self.seen.append((ctx.session.user_id, dict(ctx.session.state)))
+        question = response_text(ctx.user_content)
+        await asyncio.sleep(0.05)
+        self.finished += 1
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            content=types.Content(
+                role="model", parts=[types.Part(text=f"answer {run}")]
+            ),
+            actions=EventActions(state_delta={"research_question": question}),
+        )
+
+
+async def ask(runner: Runner, user: str, text: str) -> tuple[str, dict]:
+    session = await runner.session_service.create_session(app_name="test", user_id=user)
+    message = types.Content(role="user", parts=[types.Part(text=text)])
+    events = [
+        event
+        async for event in runner.run_async(
+            user_id=user, session_id=session.id, new_message=message
+        )
+    ]
+    updated = await runner.session_service.get_session(
+        app_name="test", user_id=user, session_id=session.id
+    )
+    assert updated is not None
+    return response_text(events[-1].content), updated.state
+
+
+def make_runner() -> tuple[Runner, SlowTeam, CoalescingAgentTool]:
+    team = SlowTeam(name="research_team")
+    tool = CoalescingAgentTool(team)
+    agent = Agent(name="orchestrator", model=DelegatingLlm(model="fake"), tools=[tool])
+    runner = Runner(
+        app_name="test", agent=agent, session_service=InMemorySessionService()
+    )
+    return runner, team, tool
+
+
+def test_normalize_request() -> None:
+    assert normalize_request("  What is  RAFT? ") == normalize_request("what is raft")
+
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_requests_share_one_run() -> None:
+    runner, team, tool = make_runner()
+
+    results = await asyncio.gather(
+        ask(runner, "u1", "What is Raft?"),
+        ask(runner, "u2", "what is  raft"),
+        ask(runner, "u3", "What is Paxos?"),
+    )
+
+    assert team.runs == 2
+    assert results[0][0] == results[1][0]
+    assert results[2][0] != results[0][0]
+    # Every caller's session gets the shared run's state changes.
+    assert results[1][1]["research_question"] == "What is Raft?"
+    assert tool.stats() == {
+        "requests": 3,
+        "executions": 2,
+        "coalesced": 1,
+        "in_flight": 0,
+    }
+
+
+@pytest.mark.asyncio
+async def test_caller_disconnecting_does_not_cancel_shared_run() -> None:
+    runner, team, _ = make_runner()
+
+    first = asyncio.create_task(ask(runner, "u1", "What is Raft?"))
+    await asyncio.sleep(0.01)
+    second = asyncio.create_task(ask(runner, "u2", "What is Raft?"))
+    await asyncio.sleep(0.01)
+    first.cancel()
+
+    text, _ = await second
+    assert text == "answer 1"
+    assert first.cancelled()
+    assert team.runs == 1
+
+
+@pytest.mark.asyncio
+async def test_shared_run_is_cancelled_when_every_caller_disconnects() -> None:
+    runner, team, tool = make_runner()
+
+    first = asyncio.create_task(ask(runner, "u1", "What is Raft?"))
+    second = asyncio.create_task(ask(runner, "u2", "What is Raft?"))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    second.cancel()
+    await asyncio.sleep(0.1)
+
+    assert team.runs == 1
+    assert team.finished == 0
+    assert tool.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_caller_arriving_while_abandoned_run_unwinds_starts_a_new_one() -> None:
+    flight: SingleFlight[str] = SingleFlight(cancel_abandoned=True)
+    runs = 0
+
+    async def work() -> str:
+        nonlocal runs
+        runs += 1
+        run = runs
+        try:
+            await asyncio.sleep(0.05)
+        except asyncio.CancelledError:
+            await asyncio.sleep(0.01)  # Cleanup takes a while.
+            raise
+        return f"run {run}"
+
+    first = asyncio.create_task(flight.do("key", work))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+
+    assert await flight.do("key", work) == "run 2"
+    assert first.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_shared_run_sees_only_the_state_keys() -> None:
+    runner, team, _ = make_runner()
+    session = await runner.session_service.create_session(
+        app_name="test",
+        user_id="u1",
+        state={FULL_PANEL_KEY: True, "user:name": "Ada", "summary": "earlier turns"},
+    )
+    message = types.Content(role="user", parts=[types.Part(text="What is Raft?")])
+    async for _ in runner.run_async(
+        user_id="u1", session_id=session.id, new_message=message
+    ):
+        pass
+
+    assert team.seen == [("coalesced", {FULL_PANEL_KEY: True})]
+
+
+@pytest.mark.asyncio
+async def test_follow_ups_are_not_coalesced() -> None:
+    runner, team, tool = make_runner()
+
+    await asyncio.gather(
+        ask(runner, "u1", "Make it shorter"),
+        ask(runner, "u2", "Make it shorter"),
+    )
+
+    assert team.runs == 2
+    assert tool.stats()["requests"] == 0
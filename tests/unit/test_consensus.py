@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from app.consensus import ConsensusScorer, claim_overlap, key_claims
+
+
+def test_key_claims_keep_numbers_and_content_words() -> None:
+    assert key_claims("The Eiffel Tower is 330 metres tall, about 1,083 ft.") == {
+        "eiffel",
+        "tower",
+        "330",
+        "metres",
+        "tall",
+        "1,083",
+    }
+
+
+def test_claim_overlap_is_pairwise_jaccard() -> None:
+    overlap = claim_overlap(["paris france", "paris france", "berlin germany"])
+
+    assert np.allclose(overlap[0, 1], 1.0)
+    assert np.allclose(overlap[0, 2], 0.0)
+    assert np.allclose(np.diag(overlap), 1.0)
+
+
+@pytest.mark.asyncio
+async def test_agreeing_answers_pass_the_threshold() -> None:
+    scorer = ConsensusScorer(threshold=0.5)
+    consensus = await scorer.score(
+        {
+            "a": "Water boils at 100 degrees Celsius at sea level.",
+            "b": "At sea level water boils at 100 degrees Celsius.",
+            "c": "Water boils at 100 degrees Celsius at sea level pressure.",
+        }
+    )
+
+    assert consensus is not None
+    assert consensus.similarity is None
+    assert consensus.best == "a"
+    assert scorer.agrees(consensus)
+
+
+@pytest.mark.asyncio
+async def test_embeddings_are_blended_with_claim_overlap() -> None:
+    async def embed(texts: list[str]) -> list[list[float]]:
+        return [[1.0, 0.0], [0.0, 1.0]]
+
+    scorer = ConsensusScorer(embedder=embed, embedding_weight=0.5, threshold=0.5)
+    consensus = await scorer.score({"a": "same words", "b": "same words"})
+
+    assert consensus is not None
+    assert consensus.similarity == pytest.approx(0.0)
+    assert consensus.overlap == pytest.approx(1.0)
+    assert consensus.score == pytest.approx(0.5)
+    assert await scorer.score({"a": "alone"}) is None
@@ -0,0 +1,129 @@
+import dataclasses
+from collections.abc import AsyncGenerator
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.apps.app import App
+from google.adk.events import Event, EventActions
+from google.adk.models.llm_request import LlmRequest
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.adk.tools import FunctionTool
+from google.genai import types
+
+from app.degradation import (
+    DEGRADATION_KEY,
+    LEVELS,
+    DegradationController,
+    DegradationMetadataPlugin,
+    GenerationLimits,
+)
+
+
+def test_levels_rise_at_once_and_recover_one_at_a_time() -> None:
+    load = {"value": 0.0}
+    controller = DegradationController(
+        max_in_flight=4,
+        thresholds=[1.25, 2, 3],
+        recovery=0.7,
+        host_load=lambda: load["value"],
+    )
+
+    assert controller.update().level == 0
+    load["value"] = 3.5
+    assert controller.update().level == 3
+    # Below level 3's threshold but not below its recovery point.
+    load["value"] = 2.5
+    assert controller.update().level == 3
+    load["value"] = 1.0
+    assert controller.update().level == 1
+    load["value"] = 0.5
+    assert controller.update().level == 0
+
+
+def test_in_flight_runs_count_as_pressure() -> None:
+    controller = DegradationController(
+        max_in_flight=1, thresholds=[1.25, 2, 3], host_load=lambda: 0.0
+    )
+
+    with controller.track() as first:
+        with controller.track() as second:
+            assert (first.level, second.level) == (0, 2)
+    assert controller.level == 0
+    assert controller.status()["runs_by_level"] == [1, 0, 1, 0]
+
+
+def test_generation_limits_cap_tokens_and_drop_search() -> None:
+    def search(query: str) -> str:
+        return query
+
+    def other(query: str) -> str:
+        return query
+
+    llm_request = LlmRequest(config=types.GenerateContentConfig())
+    llm_request.append_tools([FunctionTool(search), FunctionTool(other)])
+    context: Any = SimpleNamespace(
+        state={DEGRADATION_KEY: dataclasses.asdict(LEVELS[3])}
+    )
+
+    GenerationLimits(search_tools=("search",))(context, llm_request)
+
+    assert llm_request.config.max_output_tokens == LEVELS[3].max_output_tokens
+    assert llm_request.config.labels == {DEGRADATION_KEY: "3"}
+    (tool,) = llm_request.config.tools or []
+    assert isinstance(tool, types.Tool)
+    declarations = tool.function_declarations or []
+    assert [declaration.name for declaration in declarations] == ["other"]
+    assert "search" not in llm_request.tools_dict
+
+
+class DegradedTeam(BaseAgent):
+    """Stores the policy of `level` like the research pipeline, then answers."""
+
+    level: int | None = None
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        if self.level is not None:
+            yield Event(
+                invocation_id=ctx.invocation_id,
+                author=self.name,
+                actions=EventActions(
+                    state_delta={
+                        DEGRADATION_KEY: dataclasses.asdict(LEVELS[self.level])
+                    }
+                ),
+            )
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            content=types.Content(role="model", parts=[types.Part(text="answer")]),
+        )
+
+
+@pytest.mark.asyncio
+async def test_final_responses_carry_their_run_s_degradation_level() -> None:
+    team = DegradedTeam(name="team", level=2)
+    app = App(name="test", root_agent=team, plugins=[DegradationMetadataPlugin()])
+    session_service = InMemorySessionService()
+    runner = Runner(app=app, session_service=session_service)
+    session = await session_service.create_session(app_name="test", user_id="u")
+    message = types.Content(role="user", parts=[types.Part(text="hi")])
+
+    async def final_metadata() -> dict | None:
+        events = [
+            event
+            async for event in runner.run_async(
+                user_id="u", session_id=session.id, new_message=message
+            )
+        ]
+        return events[-1].custom_metadata
+
+    assert await final_metadata() == {"degradation_level": 2}
+    # A later run that stored no policy reports no level, whatever the state.
+    team.level = None
+    assert await final_metadata() is None
@@ -0,0 +1,133 @@
+from collections.abc import AsyncGenerator
+
+import pytest
+from google.adk.agents import Agent
+from google.adk.events import Event
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+from pydantic import Field
+
+from app.history import HistoryWindow
+
+
+class RecordingLlm(BaseLlm):
+    """Records the contents it is called with and answers `reply`."""
+
+    reply: str = "ok"
+    requests: list[list[str]] = Field(default_factory=list)
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        self.requests.append(
+            [part.text for c in llm_request.contents for part in c.parts or []]
+        )
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text=self.reply)])
+        )
+
+
+def message(role: str, text: str) -> types.Content:
+    return types.Content(role=role, parts=[types.Part(text=text)])
+
+
+class FailingLlm(RecordingLlm):
+    """Records the call, then fails like an unreachable model."""
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        self.requests.append([])
+        if self.requests:
+            raise ConnectionError("summarizer is down")
+        yield LlmResponse()
+
+
+async def run_turns(
+    texts: list[str],
+    summarizer: RecordingLlm | None = None,
+    summarizer_num_ctx: int = 4096,
+) -> tuple[RecordingLlm, RecordingLlm]:
+    worker = RecordingLlm(model="worker", requests=[])
+    if summarizer is None:
+        summarizer = RecordingLlm(model="summarizer", reply="SUMMARY", requests=[])
+    window = HistoryWindow(
+        summarizer=summarizer,
+        default_num_ctx=400,
+        summarizer_num_ctx=summarizer_num_ctx,
+    )
+    agent = Agent(name="worker", model=worker, before_model_callback=window)
+
+    session_service = InMemorySessionService()
+    runner = Runner(app_name="test", agent=agent, session_service=session_service)
+    session = await session_service.create_session(app_name="test", user_id="u")
+    for index in range(6):
+        author, role = ("user", "user") if index % 2 == 0 else ("worker", "model")
+        await session_service.append_event(
+            session,
+            Event(author=author, content=message(role, f"turn {index} " + "x" * 400)),
+        )
+    for text in texts:
+        async for _ in runner.run_async(
+            user_id="u", session_id=session.id, new_message=message("user", text)
+        ):
+            pass
+    return worker, summarizer
+
+
+@pytest.mark.asyncio
+async def test_old_turns_are_replaced_by_a_summary() -> None:
+    worker, summarizer = await run_turns(["latest question"])
+
+    (contents,) = worker.requests
+    assert contents[0] == "Summary of the earlier conversation:\nSUMMARY"
+    assert contents[-1] == "latest question"
+    assert not any(text.startswith("turn 0") for text in contents)
+    assert len(summarizer.requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_summary_is_reused_while_the_cut_stays() -> None:
+    _, summarizer = await run_turns(["first question", "second question"])
+
+    assert len(summarizer.requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_summary_is_extended_incrementally() -> None:
+    _, summarizer = await run_turns(["first question", "second " + "y" * 400])
+
+    assert len(summarizer.requests) == 2
+    second_prompt = summarizer.requests[1][0]
+    assert "Current summary:\nSUMMARY" in second_prompt
+    assert "turn 0" not in second_prompt
+    assert "first question" in second_prompt
+
+
+@pytest.mark.asyncio
+async def test_failing_summarizer_drops_the_old_turns() -> None:
+    worker, summarizer = await run_turns(
+        ["latest question"], summarizer=FailingLlm(model="summarizer")
+    )
+
+    (contents,) = worker.requests
+    assert contents[-1] == "latest question"
+    assert not any("Summary of the earlier" in text for text in contents)
+    assert not any(text.startswith("turn 0") for text in contents)
+    assert len(summarizer.requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_long_history_is_summarized_in_chunks() -> None:
+    _, summarizer = await run_turns(["latest question"], summarizer_num_ctx=1000)
+
+    # Each old turn is ~100 tokens; with ~160 tokens left per call after the
+    # instruction and summary, the turns are folded in one by one.
+    assert len(summarizer.requests) > 1
+    first, second = summarizer.requests[0][0], summarizer.requests[1][0]
+    assert "turn 0" in first and "turn 1" not in first
+    assert "Current summary:\nSUMMARY" in second and "turn 0" not in second
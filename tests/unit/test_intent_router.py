@@ -0,0 +1,135 @@
+from collections.abc import AsyncGenerator
+
+import pytest
+from google.adk.agents import Agent, BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.adk.tools.agent_tool import AgentTool
+from google.genai import types
+
+from app.intent_router import GREETING_REPLY, IntentRouter, classify
+from app.llm_utils import response_text
+
+
+class CountingLlm(BaseLlm):
+    """Model that counts its calls and always answers "llm"."""
+
+    calls: int = 0
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        self.calls += 1
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text="llm")])
+        )
+
+
+class ResearchTeam(BaseAgent):
+    """Stands in for the research pipeline."""
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            content=types.Content(role="model", parts=[types.Part(text="verified")]),
+        )
+
+
+@pytest.mark.parametrize(
+    ("text", "label", "routed"),
+    [
+        ("Hello there!", "greeting", True),
+        ("thanks a lot", "thanks", True),
+        ("What can you do?", "about", True),
+        ("What are the main causes of inflation in Europe?", "research", True),
+        ("Compare Rust and Go for web servers", "research", True),
+        ("Make it shorter please", "reformat", True),
+        ("Expand point 2", "elaborate", True),
+        ("Could you put that in a table?", "reformat", True),
+        ("Tell me more about the second point", "elaborate", True),
+        ("Simplify (x+1)^2", "unknown", False),
+        ("Translate hello into French", "unknown", False),
+        ("Rewrite this SQL query to use a join", "unknown", False),
+        ("Explain this code: print(sum(range(10)))", "research", True),
+        ("Format a date in Python", "unknown", False),
+        ("ok", "unknown", False),
+        ("rust?", "unknown", False),
+    ],
+)
+def test_classify(text: str, label: str, routed: bool) -> None:
+    intent = classify(text)
+    assert intent.label == label
+    assert (intent.confidence >= 0.8) is routed
+
+
+async def run_turn(
+    text: str, state: dict | None = None
+) -> tuple[list[Event], CountingLlm, IntentRouter]:
+    llm = CountingLlm(model="fake")
+    tool = AgentTool(ResearchTeam(name="research_team"))
+    router = IntentRouter(research_tool=tool.name, follow_up_key="question")
+    agent = Agent(
+        name="orchestrator", model=llm, tools=[tool], before_model_callback=router
+    )
+    session_service = InMemorySessionService()
+    runner = Runner(app_name="test", agent=agent, session_service=session_service)
+    session = await session_service.create_session(
+        app_name="test", user_id="u", state=state
+    )
+    message = types.Content(role="user", parts=[types.Part(text=text)])
+    events = [
+        event
+        async for event in runner.run_async(
+            user_id="u", session_id=session.id, new_message=message
+        )
+    ]
+    return events, llm, router
+
+
+@pytest.mark.asyncio
+async def test_greeting_is_answered_without_the_model() -> None:
+    events, llm, router = await run_turn("hi")
+
+    assert response_text(events[-1].content) == GREETING_REPLY
+    assert llm.calls == 0
+    assert router.stats()["llm_calls_saved"] == 1
+
+
+@pytest.mark.asyncio
+async def test_research_question_goes_straight_to_the_team() -> None:
+    events, llm, router = await run_turn("Why is the sky blue during the day?")
+
+    calls = events[0].get_function_calls()
+    assert calls[0].name == "research_team"
+    assert calls[0].args == {"request": "Why is the sky blue during the day?"}
+    # Only the presentation of the tool result reached the model.
+    assert llm.calls == 1
+    assert router.stats() == {
+        "template": 0,
+        "research": 1,
+        "follow_up": 0,
+        "llm": 0,
+        "llm_calls_saved": 1,
+    }
+
+
+@pytest.mark.asyncio
+async def test_follow_up_goes_to_the_team_once_it_has_answered() -> None:
+    events, llm, router = await run_turn("Make it shorter", {"question": "Why?"})
+
+    calls = events[0].get_function_calls()
+    assert calls[0].args == {"request": "Make it shorter"}
+    assert router.stats()["follow_up"] == 1
+
+    _, llm, router = await run_turn("Make it shorter")
+
+    assert llm.calls == 1
+    assert router.stats()["llm"] == 1
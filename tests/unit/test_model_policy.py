@@ -0,0 +1,205 @@
+import asyncio
+from collections.abc import AsyncGenerator, Callable
+
+import httpx
+import pytest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from app import model_policy
+from app.llm_utils import response_text
+from app.model_policy import CallPolicy, call_with_policy, is_retryable
+from app.ollama_scheduler import OllamaHostScheduler
+
+
+def text_response(text: str, partial: bool | None = None) -> LlmResponse:
+    return LlmResponse(
+        content=types.Content(role="model", parts=[types.Part(text=text)]),
+        partial=partial,
+    )
+
+
+class FakeBackend:
+    """Attempts fail, stall or answer according to a script."""
+
+    def __init__(self, script: list[str | float | Exception]) -> None:
+        self.script = script
+        self.calls: list[bool] = []
+        self.cancelled = 0
+
+    async def start(self, hedged: bool) -> AsyncGenerator[LlmResponse, None]:
+        self.calls.append(hedged)
+        step = self.script[len(self.calls) - 1]
+        if isinstance(step, Exception):
+            raise step
+        if isinstance(step, float):
+            try:
+                await asyncio.sleep(step)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+            step = "slow"
+        yield text_response(step)
+
+
+async def collect(
+    model: str,
+    start: Callable[[bool], AsyncGenerator[LlmResponse, None]],
+    policy: CallPolicy,
+) -> list[str]:
+    return [
+        response_text(r.content)
+        async for r in call_with_policy(model, start, policy=policy)
+    ]
+
+
+def test_is_retryable() -> None:
+    class StatusError(Exception):
+        def __init__(self, status_code: int) -> None:
+            self.status_code = status_code
+
+    assert is_retryable(asyncio.TimeoutError())
+    assert is_retryable(httpx.ConnectError("refused"))
+    assert is_retryable(StatusError(503))
+    assert not is_retryable(StatusError(400))
+    assert not is_retryable(ValueError())
+
+
+@pytest.mark.asyncio
+async def test_retries_retryable_errors_then_succeeds() -> None:
+    backend = FakeBackend([httpx.ConnectError("refused"), 0.2, "ok"])
+    policy = CallPolicy(timeout_s=0.05, max_retries=2, backoff_base_s=0.001)
+
+    assert await collect(model="m", start=backend.start, policy=policy) == ["ok"]
+    assert len(backend.calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_does_not_retry_other_errors() -> None:
+    backend = FakeBackend([ValueError("bad request"), "ok"])
+
+    with pytest.raises(ValueError):
+        await collect(model="m", start=backend.start, policy=CallPolicy())
+    assert len(backend.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_hedges_slow_call_past_its_quantile() -> None:
+    policy = CallPolicy(hedge=True, hedge_min_samples=3, backoff_base_s=0.001)
+    warmup = FakeBackend(["a", "b", "c"])
+    for _ in range(3):
+        await collect(model="hedged", start=warmup.start, policy=policy)
+
+    backend = FakeBackend([1.0, "fast"])
+    started = asyncio.get_running_loop().time()
+    assert await collect(model="hedged", start=backend.start, policy=policy) == ["fast"]
+    assert asyncio.get_running_loop().time() - started < 0.5
+    assert backend.calls == [False, True]
+
+
+@pytest.mark.asyncio
+async def test_stream_is_not_retried_after_first_chunk() -> None:
+    calls = 0
+
+    async def start(hedged: bool) -> AsyncGenerator[LlmResponse, None]:
+        nonlocal calls
+        calls += 1
+        yield text_response("partial", partial=True)
+        raise httpx.ReadError("connection reset")
+
+    with pytest.raises(httpx.ReadError):
+        async for _ in call_with_policy(
+            "m", start, stream=True, policy=CallPolicy(backoff_base_s=0.001)
+        ):
+            pass
+    assert calls == 1
+
+
+@pytest.mark.asyncio
+async def test_stream_runs_in_the_consuming_task_and_times_out() -> None:
+    tasks = []
+
+    async def start(hedged: bool) -> AsyncGenerator[LlmResponse, None]:
+        tasks.append(asyncio.current_task())
+        await asyncio.sleep(1.0 if len(tasks) == 1 else 0)
+        yield text_response("ok")
+
+    policy = CallPolicy(timeout_s=0.05, max_retries=1, backoff_base_s=0.001)
+    responses = [
+        response_text(r.content)
+        async for r in call_with_policy("m", start, stream=True, policy=policy)
+    ]
+
+    assert responses == ["ok"]
+    assert tasks == [asyncio.current_task()] * 2
+
+
+@pytest.mark.asyncio
+async def test_timeout_starts_when_the_attempt_is_dispatched() -> None:
+    scheduler = OllamaHostScheduler("http://test", parallel_slots=1)
+    calls = 0
+
+    async def start(hedged: bool) -> AsyncGenerator[LlmResponse, None]:
+        nonlocal calls
+        calls += 1
+        async with scheduler.slot("m"):
+            await asyncio.sleep(0.02)
+            yield text_response("ok")
+
+    async def occupy() -> None:
+        async with scheduler.slot("m"):
+            await asyncio.sleep(0.15)
+
+    busy = asyncio.create_task(occupy())
+    await asyncio.sleep(0)
+    policy = CallPolicy(timeout_s=0.1, max_retries=0)
+
+    assert await collect(model="queued", start=start, policy=policy) == ["ok"]
+    assert calls == 1
+    # The latency sample of the hedge quantile leaves out the queue time.
+    assert max(model_policy._latencies["queued"].samples) < 0.1
+    await busy
+
+
+@pytest.mark.asyncio
+async def test_stream_timeout_starts_when_the_attempt_is_dispatched() -> None:
+    scheduler = OllamaHostScheduler("http://test", parallel_slots=1)
+
+    async def start(hedged: bool) -> AsyncGenerator[LlmResponse, None]:
+        async with scheduler.slot("m"):
+            await asyncio.sleep(0.02)
+            yield text_response("ok")
+
+    async def occupy() -> None:
+        async with scheduler.slot("m"):
+            await asyncio.sleep(0.15)
+
+    busy = asyncio.create_task(occupy())
+    await asyncio.sleep(0)
+    policy = CallPolicy(timeout_s=0.1, max_retries=0)
+
+    responses = [
+        response_text(r.content)
+        async for r in call_with_policy("m", start, stream=True, policy=policy)
+    ]
+    assert responses == ["ok"]
+    await busy
+
+
+@pytest.mark.asyncio
+async def test_cancelling_a_hedged_call_cancels_its_attempts() -> None:
+    policy = CallPolicy(hedge=True, hedge_min_samples=3, backoff_base_s=0.001)
+    warmup = FakeBackend([0.05, 0.05, 0.05])
+    for _ in range(3):
+        await collect(model="cancelled", start=warmup.start, policy=policy)
+
+    for wait_s in (0.01, 0.1):  # before and after the hedge is sent
+        backend = FakeBackend([1.0, 1.0])
+        call = asyncio.create_task(
+            collect(model="cancelled", start=backend.start, policy=policy)
+        )
+        await asyncio.sleep(wait_s)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        assert backend.cancelled == len(backend.calls)
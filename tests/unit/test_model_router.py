@@ -0,0 +1,115 @@
+import os
+import time
+from collections.abc import AsyncGenerator, Collection
+from pathlib import Path
+
+import httpx
+import pytest
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from app.llm_utils import response_text
+from app.model_router import ModelRouter, RoutedLlm
+from app.ollama_scheduler import get_scheduler
+
+ROSTER = """
+endpoints:
+  box-a: {api_base: "http://router-a:11434", backend: native}
+  box-b: {api_base: "http://router-b:11434", backend: native}
+  spill: {api_base: "http://router-spill:11434", backend: native, overflow: true}
+models:
+  m: [box-a, box-b, spill]
+workers:
+  - {name: worker_m, model: m, focus: everything}
+"""
+
+
+class FakeBackend(BaseLlm):
+    """Answers with its endpoint name, or fails with a connection error."""
+
+    fail: bool = False
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        if self.fail:
+            raise httpx.ConnectError("refused")
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text=self.model)])
+        )
+
+
+def make_router(tmp_path: Path, failing: Collection[str] = ()) -> ModelRouter:
+    path = tmp_path / "roster.yaml"
+    path.write_text(ROSTER)
+    router = ModelRouter(str(path))
+    backends = {
+        name: FakeBackend(model=name, fail=name in failing)
+        for name in ("box-a", "box-b", "spill")
+    }
+    router.backend = lambda endpoint, model: backends[endpoint.name]  # type: ignore[method-assign]
+    return router
+
+
+async def call(router: ModelRouter) -> str:
+    llm = RoutedLlm(model="m", router=router)
+    responses = [r async for r in llm.generate_content_async(LlmRequest())]
+    return response_text(responses[-1].content)
+
+
+@pytest.mark.asyncio
+async def test_picks_least_loaded_then_overflow(tmp_path: Path) -> None:
+    router = make_router(tmp_path)
+    scheduler_a = get_scheduler("http://router-a:11434", parallel_slots=1)
+    scheduler_b = get_scheduler("http://router-b:11434", parallel_slots=1)
+
+    async with scheduler_a.slot("m"):
+        assert await call(router) == "box-b"
+        async with scheduler_b.slot("m"):
+            assert await call(router) == "spill"
+
+
+@pytest.mark.asyncio
+async def test_fails_over_and_skips_unhealthy_endpoint(tmp_path: Path) -> None:
+    router = make_router(tmp_path, failing={"box-a"})
+
+    for _ in range(3):
+        assert await call(router) == "box-b"
+
+    box_a = router.roster.endpoints["box-a"]
+    assert box_a.failures == 3
+    assert not box_a.healthy(time.monotonic())
+
+
+def test_roster_is_reloaded_when_the_file_changes(tmp_path: Path) -> None:
+    router = make_router(tmp_path)
+    router.roster.endpoints["box-a"].failures = 2
+    assert router.refresh() is False
+
+    path = Path(router.path)
+    path.write_text(ROSTER.replace("everything", "nothing"))
+    os.utime(path, (0, os.stat(path).st_mtime + 1))
+
+    assert router.refresh() is True
+    assert router.roster.workers[0]["focus"] == "nothing"
+    assert router.roster.endpoints["box-a"].failures == 2
+
+
+@pytest.mark.asyncio
+async def test_dropped_model_keeps_its_endpoints_and_deleted_file_is_ignored(
+    tmp_path: Path,
+) -> None:
+    router = make_router(tmp_path)
+    path = Path(router.path)
+    path.write_text(ROSTER.replace("  m: [box-a, box-b, spill]", "  n: [box-a]"))
+    os.utime(path, (0, os.stat(path).st_mtime + 1))
+
+    assert router.refresh() is True
+    assert not router.routes("m")
+    assert await call(router) in {"box-a", "box-b"}
+
+    path.unlink()
+    assert router.refresh() is False
+    assert router.routes("n")
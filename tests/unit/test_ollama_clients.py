@@ -0,0 +1,23 @@
+import asyncio
+
+from ollama import AsyncClient
+
+from app.ollama_clients import get_async_client
+
+
+def test_client_of_a_finished_loop_is_closed_when_replaced() -> None:
+    async def client() -> AsyncClient:
+        return get_async_client("http://clients.test")
+
+    stale = asyncio.run(client())
+
+    async def replaced() -> AsyncClient:
+        fresh = get_async_client("http://clients.test")
+        await asyncio.sleep(0.01)
+        return fresh
+
+    fresh = asyncio.run(replaced())
+
+    assert fresh is not stale
+    assert stale._client.is_closed
+    assert not fresh._client.is_closed
@@ -0,0 +1,187 @@
+import dataclasses
+from collections.abc import AsyncIterator
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from google.adk.models.llm_request import LlmRequest
+from google.genai import types
+
+from app.degradation import DEGRADATION_KEY, LEVELS, GenerationLimits
+from app.llm_utils import response_text
+from app.ollama_cloud_model import OllamaCloudLlm
+
+STATS = {
+    "prompt_eval_count": 10,
+    "eval_count": 40,
+    "load_duration": 2_000_000_000,
+    "prompt_eval_duration": 100_000_000,
+    "eval_duration": 800_000_000,
+}
+
+
+class FakeChatClient:
+    """Stands in for ollama.AsyncClient.chat."""
+
+    def __init__(self, chunks: list[str]) -> None:
+        self.chunks = chunks
+        self.calls: list[dict] = []
+
+    async def chat(self, **kwargs: object) -> dict | AsyncIterator[dict]:
+        self.calls.append(kwargs)
+        if not kwargs.get("stream"):
+            return {"message": {"content": "".join(self.chunks)}, **STATS}
+
+        async def stream() -> AsyncIterator[dict]:
+            for chunk in self.chunks:
+                yield {"message": {"content": chunk}}
+            yield {"message": {"content": ""}, "done": True, **STATS}
+
+        return stream()
+
+
+def make_model(chunks: list[str]) -> tuple[OllamaCloudLlm, FakeChatClient]:
+    model = OllamaCloudLlm("gpt-oss:20b-cloud")
+    client = FakeChatClient(chunks)
+    model._client = client  # type: ignore[assignment]
+    return model, client
+
+
+def make_request() -> LlmRequest:
+    return LlmRequest(
+        contents=[types.Content(role="user", parts=[types.Part(text="Why?")])]
+    )
+
+
+@pytest.mark.asyncio
+async def test_stream_yields_partials_then_aggregate() -> None:
+    model, client = make_model(["Because ", "", "physics."])
+
+    responses = [
+        response
+        async for response in model.generate_content_async(make_request(), stream=True)
+    ]
+
+    assert [r.partial for r in responses] == [True, True, None]
+    assert [response_text(r.content) for r in responses] == [
+        "Because ",
+        "physics.",
+        "Because physics.",
+    ]
+    assert client.calls[0]["messages"] == [{"role": "user", "content": "Why?"}]
+    usage = responses[-1].usage_metadata
+    assert usage is not None
+    assert usage.total_token_count == 50
+
+
+@pytest.mark.asyncio
+async def test_non_stream_yields_single_response() -> None:
+    model, client = make_model(["Because ", "physics."])
+
+    responses = [
+        response async for response in model.generate_content_async(make_request())
+    ]
+
+    assert len(responses) == 1
+    assert response_text(responses[0].content) == "Because physics."
+    assert "stream" not in client.calls[0]
+
+
+@pytest.mark.asyncio
+async def test_final_response_carries_usage_and_timings() -> None:
+    model, _ = make_model(["Because ", "physics."])
+
+    responses = [
+        response async for response in model.generate_content_async(make_request())
+    ]
+
+    usage = responses[0].usage_metadata
+    assert usage is not None
+    assert (usage.prompt_token_count, usage.candidates_token_count) == (10, 40)
+    assert responses[0].custom_metadata is not None
+    timings = responses[0].custom_metadata["ollama_timings"]
+    assert timings["load_ms"] == 2000
+    assert timings["prefill_tokens_per_s"] == 100
+    assert timings["decode_tokens_per_s"] == 50
+
+
+@pytest.mark.asyncio
+async def test_request_keeps_roles_instruction_and_tools() -> None:
+    model, client = make_model(["ok"])
+    search = types.FunctionDeclaration(
+        name="search",
+        description="Web search.",
+        parameters=types.Schema(
+            type=types.Type.OBJECT,
+            properties={"query": types.Schema(type=types.Type.STRING)},
+        ),
+    )
+    request = LlmRequest(
+        contents=[
+            types.Content(role="user", parts=[types.Part(text="Why?")]),
+            types.Content(role="model", parts=[types.Part(text="Because.")]),
+            types.Content(role="user", parts=[types.Part(text="Shorter.")]),
+        ],
+        config=types.GenerateContentConfig(
+            system_instruction="Be brief.",
+            tools=[types.Tool(function_declarations=[search])],
+        ),
+    )
+
+    async for _ in model.generate_content_async(request):
+        pass
+
+    sent = client.calls[0]
+    assert sent["messages"] == [
+        {"role": "system", "content": "Be brief."},
+        {"role": "user", "content": "Why?"},
+        {"role": "assistant", "content": "Because."},
+        {"role": "user", "content": "Shorter."},
+    ]
+    assert sent["tools"] == [
+        {
+            "type": "function",
+            "function": {
+                "name": "search",
+                "description": "Web search.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {"query": {"type": "string"}},
+                },
+            },
+        }
+    ]
+
+
+@pytest.mark.asyncio
+async def test_degraded_token_cap_reaches_the_chat_options() -> None:
+    model, client = make_model(["ok"])
+    request = make_request()
+    request.config = types.GenerateContentConfig(temperature=0.2, seed=7)
+    context: Any = SimpleNamespace(
+        state={DEGRADATION_KEY: dataclasses.asdict(LEVELS[3])}
+    )
+    GenerationLimits()(context, request)
+
+    async for _ in model.generate_content_async(request):
+        pass
+
+    assert client.calls[0]["options"] == {
+        "temperature": 0.2,
+        "seed": 7,
+        "num_predict": LEVELS[3].max_output_tokens,
+    }
+
+
+@pytest.mark.asyncio
+async def test_client_is_pooled_and_needs_no_key_at_import(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.delenv("OLLAMA_API_KEY", raising=False)
+    model = OllamaCloudLlm("gpt-oss:20b-cloud")
+    with pytest.raises(RuntimeError, match="OLLAMA_API_KEY"):
+        _ = model.client
+
+    monkeypatch.setenv("OLLAMA_API_KEY", "test-key")
+    other = OllamaCloudLlm("qwen3-coder:480b-cloud")
+    assert model.client is other.client
@@ -0,0 +1,136 @@
+from collections.abc import AsyncIterator
+
+import pytest
+from google.adk.models.llm_request import LlmRequest
+from google.genai import types
+
+from app.llm_utils import response_text
+from app.ollama_messages import ollama_messages, ollama_tools
+from app.ollama_model import OllamaLlm
+
+
+class FakeChatClient:
+    """Stands in for ollama.AsyncClient.chat."""
+
+    def __init__(self, messages: list[dict]) -> None:
+        self.messages = messages
+        self.calls: list[dict] = []
+
+    async def chat(self, **kwargs: object) -> dict | AsyncIterator[dict]:
+        self.calls.append(kwargs)
+        if not kwargs.get("stream"):
+            return {"message": self.messages[-1], "eval_count": 3, "done": True}
+
+        async def stream() -> AsyncIterator[dict]:
+            for message in self.messages:
+                yield {"message": message}
+            yield {"message": {"content": ""}, "eval_count": 3, "done": True}
+
+        return stream()
+
+
+def make_request() -> LlmRequest:
+    declaration = types.FunctionDeclaration(
+        name="search",
+        description="Searches the web.",
+        parameters=types.Schema(
+            type=types.Type.OBJECT,
+            properties={
+                "queries": types.Schema(
+                    type=types.Type.ARRAY, items=types.Schema(type=types.Type.STRING)
+                )
+            },
+        ),
+    )
+    return LlmRequest(
+        contents=[
+            types.Content(role="user", parts=[types.Part(text="Who won?")]),
+            types.Content(
+                role="model",
+                parts=[
+                    types.Part.from_function_call(
+                        name="search", args={"queries": ["q"]}
+                    )
+                ],
+            ),
+            types.Content(
+                role="user",
+                parts=[
+                    types.Part.from_function_response(
+                        name="search", response={"result": "A"}
+                    )
+                ],
+            ),
+        ],
+        config=types.GenerateContentConfig(
+            system_instruction="Be brief.",
+            temperature=0.2,
+            max_output_tokens=64,
+            tools=[types.Tool(function_declarations=[declaration])],
+        ),
+    )
+
+
+def test_messages_keep_roles_and_tool_turns() -> None:
+    messages = ollama_messages(make_request())
+
+    assert [m["role"] for m in messages] == ["system", "user", "assistant", "tool"]
+    assert messages[2]["tool_calls"] == [
+        {"function": {"name": "search", "arguments": {"queries": ["q"]}}}
+    ]
+    assert messages[3] == {
+        "role": "tool",
+        "tool_name": "search",
+        "content": '{"result": "A"}',
+    }
+
+
+def test_tools_use_json_schema() -> None:
+    tools = ollama_tools(make_request())
+
+    assert tools is not None
+    (tool,) = tools
+
+    assert tool["function"]["name"] == "search"
+    assert tool["function"]["parameters"] == {
+        "type": "object",
+        "properties": {"queries": {"type": "array", "items": {"type": "string"}}},
+    }
+
+
+@pytest.mark.asyncio
+async def test_stream_maps_options_partials_and_tool_calls() -> None:
+    model = OllamaLlm(model="llama3.2:latest", options={"num_ctx": 4096})
+    client = FakeChatClient(
+        [
+            {"content": "Looking "},
+            {"content": "it up."},
+            {
+                "content": "",
+                "tool_calls": [
+                    {"function": {"name": "search", "arguments": {"queries": ["x"]}}}
+                ],
+            },
+        ]
+    )
+    model._client = client  # type: ignore[assignment]
+
+    responses = [
+        r async for r in model.generate_content_async(make_request(), stream=True)
+    ]
+
+    assert [r.partial for r in responses] == [True, True, None]
+    final = responses[-1]
+    assert response_text(final.content) == "Looking it up."
+    assert final.content is not None
+    calls = [
+        part.function_call for part in final.content.parts or [] if part.function_call
+    ]
+    assert calls[0].args == {"queries": ["x"]}
+    assert final.usage_metadata is not None
+    assert final.usage_metadata.candidates_token_count == 3
+    assert client.calls[0]["options"] == {
+        "num_ctx": 4096,
+        "temperature": 0.2,
+        "num_predict": 64,
+    }
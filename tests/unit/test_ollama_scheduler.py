@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from app.ollama_scheduler import OllamaHostScheduler
+
+
+async def run_calls(
+    scheduler: OllamaHostScheduler, models: list[str], duration: float = 0.01
+) -> list[str]:
+    """Starts one call per model, in order, and returns the admission order."""
+    order: list[str] = []
+
+    async def call(model: str) -> None:
+        async with scheduler.slot(model):
+            order.append(model)
+            await asyncio.sleep(duration)
+
+    tasks = []
+    for model in models:
+        tasks.append(asyncio.create_task(call(model)))
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    return order
+
+
+@pytest.mark.asyncio
+async def test_groups_calls_by_loaded_model() -> None:
+    scheduler = OllamaHostScheduler(
+        "http://host", parallel_slots=1, max_loaded_models=1
+    )
+
+    order = await run_calls(scheduler, ["a", "b", "a", "b", "a"])
+
+    assert order == ["a", "a", "a", "b", "b"]
+    assert scheduler.stats()["models"]["a"]["loads"] == 1
+    assert scheduler.stats()["models"]["b"]["loads"] == 1
+
+
+@pytest.mark.asyncio
+async def test_respects_parallel_slots() -> None:
+    scheduler = OllamaHostScheduler("http://host", parallel_slots=2)
+    peak = 0
+
+    async def call() -> None:
+        nonlocal peak
+        async with scheduler.slot("a"):
+            peak = max(peak, scheduler.stats()["active"])
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(call() for _ in range(6)))
+
+    assert peak == 2
+    assert scheduler.stats()["models"]["a"]["calls"] == 6
+
+
+@pytest.mark.asyncio
+async def test_cold_model_is_not_starved() -> None:
+    scheduler = OllamaHostScheduler(
+        "http://host", parallel_slots=1, max_loaded_models=1, max_affinity_wait_s=0
+    )
+
+    order = await run_calls(scheduler, ["a", "b", "a", "a"])
+
+    assert order.index("b") == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_frees_its_place() -> None:
+    scheduler = OllamaHostScheduler("http://host", parallel_slots=1)
+
+    async def hold(model: str, duration: float) -> None:
+        async with scheduler.slot(model):
+            await asyncio.sleep(duration)
+
+    running = asyncio.create_task(hold("a", 0.05))
+    await asyncio.sleep(0)
+    waiting = asyncio.create_task(hold("a", 0))
+    await asyncio.sleep(0)
+    waiting.cancel()
+    await asyncio.gather(running, waiting, return_exceptions=True)
+
+    stats = scheduler.stats()
+    assert stats["active"] == 0
+    assert stats["queued"] == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("admitted", [False, True])
+async def test_waiter_cancelled_as_slot_frees(admitted: bool) -> None:
+    scheduler = OllamaHostScheduler("http://host", parallel_slots=1)
+    release = asyncio.Event()
+
+    async def hold() -> None:
+        async with scheduler.slot("a"):
+            await release.wait()
+
+    async def wait() -> None:
+        async with scheduler.slot("a"):
+            pass
+
+    running = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    waiting = asyncio.create_task(wait())
+    await asyncio.sleep(0)
+    # The slot frees up and the waiting call is cancelled in the same tick,
+    # before or after the scheduler hands it the slot.
+    release.set()
+    if admitted:
+        await asyncio.sleep(0)
+    waiting.cancel()
+    results = await asyncio.gather(running, waiting, return_exceptions=True)
+
+    assert results[0] is None
+    assert isinstance(results[1], asyncio.CancelledError)
+    stats = scheduler.stats()
+    assert stats["active"] == 0
+    assert stats["queued"] == 0
@@ -0,0 +1,136 @@
+import asyncio
+from collections.abc import AsyncGenerator
+from typing import Any
+
+import pytest
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from app.degradation import DEGRADATION_KEY
+from app.panel_agent import (
+    MISSING_EXPERTS_KEY,
+    PANEL_STATUS_KEY,
+    SELECTION_KEY,
+    PanelAgent,
+)
+from app.worker_selection import WorkerSelector
+
+
+class SlowWorker(BaseAgent):
+    """Worker that answers after `delay` seconds."""
+
+    delay: float = 0.0
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        await asyncio.sleep(self.delay)
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=types.Content(role="model", parts=[types.Part(text=self.name)]),
+            actions=EventActions(state_delta={f"{self.name}_response": self.name}),
+        )
+
+
+async def run_panel(
+    panel: PanelAgent, text: str = "question", state: dict | None = None
+) -> dict:
+    session_service = InMemorySessionService()
+    runner = Runner(app_name="test", agent=panel, session_service=session_service)
+    session = await session_service.create_session(
+        app_name="test", user_id="u", state=state
+    )
+    message = types.Content(role="user", parts=[types.Part(text=text)])
+    async for _ in runner.run_async(
+        user_id="u", session_id=session.id, new_message=message
+    ):
+        pass
+    updated = await session_service.get_session(
+        app_name="test", user_id="u", session_id=session.id
+    )
+    assert updated is not None
+    return updated.state
+
+
+def make_panel(**kwargs: Any) -> PanelAgent:
+    return PanelAgent(
+        name="panel",
+        sub_agents=[
+            SlowWorker(name="fast", delay=0.0),
+            SlowWorker(name="medium", delay=0.05),
+            SlowWorker(name="stalled", delay=10.0),
+        ],
+        **kwargs,
+    )
+
+
+@pytest.mark.asyncio
+async def test_quorum_proceeds_without_slowest_worker() -> None:
+    state = await asyncio.wait_for(run_panel(make_panel(quorum=2)), timeout=5)
+
+    assert state["fast_response"] == "fast"
+    assert state["medium_response"] == "medium"
+    assert state[MISSING_EXPERTS_KEY] == ["stalled"]
+    assert "stalled" in state[PANEL_STATUS_KEY]
+
+
+@pytest.mark.asyncio
+async def test_deadline_cancels_unfinished_workers() -> None:
+    state = await asyncio.wait_for(run_panel(make_panel(deadline_s=0.02)), timeout=5)
+
+    assert state["fast_response"] == "fast"
+    assert state[MISSING_EXPERTS_KEY] == ["medium", "stalled"]
+
+
+@pytest.mark.asyncio
+async def test_default_waits_for_all_workers() -> None:
+    panel = PanelAgent(
+        name="panel",
+        sub_agents=[SlowWorker(name="a"), SlowWorker(name="b", delay=0.01)],
+    )
+    state = await run_panel(panel)
+
+    assert state["a_response"] == "a"
+    assert state["b_response"] == "b"
+    assert state[MISSING_EXPERTS_KEY] == []
+
+
+@pytest.mark.asyncio
+async def test_selector_runs_only_the_relevant_workers() -> None:
+    panel = PanelAgent(
+        name="panel",
+        sub_agents=[
+            SlowWorker(name="coder", description="Coding"),
+            SlowWorker(name="historian", description="History", delay=10.0),
+        ],
+        selector=WorkerSelector(min_panel_size=1),
+    )
+
+    state = await asyncio.wait_for(
+        run_panel(panel, "Why does my Python script raise an exception?"), timeout=5
+    )
+
+    assert state["coder_response"] == "coder"
+    assert state[MISSING_EXPERTS_KEY] == []
+    assert state[SELECTION_KEY]["selected"] == ["coder"]
+    assert state[SELECTION_KEY]["fan_out"] == 1
+    assert "historian" in state[PANEL_STATUS_KEY]
+
+
+@pytest.mark.asyncio
+async def test_degraded_panel_consults_fewer_workers() -> None:
+    policy = {"level": 1, "panel_fraction": 0.5}
+
+    state = await asyncio.wait_for(
+        run_panel(make_panel(), state={DEGRADATION_KEY: policy}), timeout=5
+    )
+
+    assert state[SELECTION_KEY]["selected"] == ["fast", "medium"]
+    assert state[SELECTION_KEY]["reason"] == "degraded to level 1"
+    assert "stalled" in state[PANEL_STATUS_KEY]
@@ -0,0 +1,86 @@
+from collections.abc import AsyncGenerator
+
+import pytest
+from google.adk.agents import Agent, BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.adk.tools.agent_tool import AgentTool
+from google.genai import types
+
+from app.llm_utils import response_text
+from app.presentation import PassThroughPresenter
+
+
+class DelegatingLlm(BaseLlm):
+    """Calls the research tool on the first turn, then re-presents its result."""
+
+    calls: int = 0
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        self.calls += 1
+        part = (
+            types.Part.from_function_call(name="research_team", args={"request": "q"})
+            if self.calls == 1
+            else types.Part(text="The team has found... (again)")
+        )
+        yield LlmResponse(content=types.Content(role="model", parts=[part]))
+
+
+class ResearchTeam(BaseAgent):
+    """Stands in for the research pipeline."""
+
+    answer: str = "Verified answer."
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            content=types.Content(role="model", parts=[types.Part(text=self.answer)]),
+        )
+
+
+async def run_turn(answer: str) -> tuple[str, DelegatingLlm, PassThroughPresenter]:
+    llm = DelegatingLlm(model="fake")
+    tool = AgentTool(ResearchTeam(name="research_team", answer=answer))
+    presenter = PassThroughPresenter(research_tool=tool.name, prefix="Found: ")
+    agent = Agent(
+        name="orchestrator", model=llm, tools=[tool], before_model_callback=presenter
+    )
+    session_service = InMemorySessionService()
+    runner = Runner(app_name="test", agent=agent, session_service=session_service)
+    session = await session_service.create_session(app_name="test", user_id="u")
+    message = types.Content(role="user", parts=[types.Part(text="question")])
+    events = [
+        event
+        async for event in runner.run_async(
+            user_id="u", session_id=session.id, new_message=message
+        )
+    ]
+    return response_text(events[-1].content), llm, presenter
+
+
+@pytest.mark.asyncio
+async def test_research_answer_is_passed_through() -> None:
+    text, llm, presenter = await run_turn("Verified answer.")
+
+    assert text == "Found: Verified answer."
+    assert llm.calls == 1
+    assert presenter.passed_through == 1
+
+
+@pytest.mark.asyncio
+async def test_empty_answer_goes_to_the_model() -> None:
+    text, llm, presenter = await run_turn("")
+
+    assert text == "The team has found... (again)"
+    assert llm.calls == 2
+    assert presenter.passed_through == 0
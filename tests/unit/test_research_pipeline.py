@@ -0,0 +1,370 @@
+import asyncio
+from collections.abc import AsyncGenerator
+
+import pytest
+from google.adk.agents import BaseAgent, LlmAgent, ParallelAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+from pydantic import Field
+
+from app.cascade import Cascade
+from app.consensus import ConsensusScorer
+from app.llm_utils import response_text
+from app.research_pipeline import (
+    CASCADE_KEY,
+    CONSENSUS_KEY,
+    PANEL_DIGESTS_KEY,
+    ResearchPipeline,
+)
+
+
+class EchoLlm(BaseLlm):
+    """Model that answers with a fixed prefix and records its requests."""
+
+    prefix: str
+    requests: list[LlmRequest] = Field(default_factory=list)
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        self.requests.append(llm_request)
+        prompt = response_text(llm_request.contents[-1])
+        yield LlmResponse(
+            content=types.Content(
+                role="model", parts=[types.Part(text=f"{self.prefix}:{prompt}")]
+            )
+        )
+
+
+@pytest.mark.asyncio
+async def test_incremental_mode_merges_digests() -> None:
+    verifier_model = EchoLlm(model="verifier", prefix="digest")
+    workers: list[BaseAgent] = [
+        LlmAgent(
+            name=name,
+            model=EchoLlm(model=name, prefix=name),
+            output_key=f"{name}_response",
+        )
+        for name in ("worker_a", "worker_b")
+    ]
+    verifier = LlmAgent(
+        name="verifier",
+        model=verifier_model,
+        instruction="Merge:\n{panel_digests}",
+        output_key="final",
+    )
+    pipeline = ResearchPipeline(
+        name="pipeline",
+        sub_agents=[ParallelAgent(name="panel", sub_agents=workers), verifier],
+        incremental=True,
+    )
+
+    session_service = InMemorySessionService()
+    runner = Runner(app_name="test", agent=pipeline, session_service=session_service)
+    session = await session_service.create_session(app_name="test", user_id="u")
+    message = types.Content(role="user", parts=[types.Part(text="why?")])
+    async for _ in runner.run_async(
+        user_id="u", session_id=session.id, new_message=message
+    ):
+        pass
+    updated = await session_service.get_session(
+        app_name="test", user_id="u", session_id=session.id
+    )
+    assert updated is not None
+
+    assert "### worker_a" in updated.state[PANEL_DIGESTS_KEY]
+    assert updated.state["worker_b_digest"].startswith("digest:Question: why?")
+    # Two digest calls plus the final merge, which only sees the question.
+    merge_request = verifier_model.requests[-1]
+    assert len(verifier_model.requests) == 3
+    assert "### worker_b" in str(merge_request.config.system_instruction)
+    assert all(
+        "worker_a:" not in response_text(content) for content in merge_request.contents
+    )
+
+
+def search(queries: list[str]) -> str:
+    """Searches the web."""
+    return "no results"
+
+
+async def run_follow_up(
+    texts: list[str], incremental: bool = False
+) -> tuple[EchoLlm, EchoLlm, dict]:
+    worker_model = EchoLlm(model="worker_a", prefix="worker_a")
+    verifier_model = EchoLlm(model="verifier", prefix="verified")
+    worker = LlmAgent(
+        name="worker_a", model=worker_model, output_key="worker_a_response"
+    )
+    verifier = LlmAgent(
+        name="verifier",
+        model=verifier_model,
+        instruction="Merge {worker_a_response}\n{research_follow_up?}",
+        tools=[search],
+        output_key="final",
+    )
+    pipeline = ResearchPipeline(
+        name="pipeline",
+        sub_agents=[ParallelAgent(name="panel", sub_agents=[worker]), verifier],
+        incremental=incremental,
+        reuse_follow_ups=True,
+    )
+
+    session_service = InMemorySessionService()
+    runner = Runner(app_name="test", agent=pipeline, session_service=session_service)
+    session = await session_service.create_session(app_name="test", user_id="u")
+    for text in texts:
+        message = types.Content(role="user", parts=[types.Part(text=text)])
+        async for _ in runner.run_async(
+            user_id="u", session_id=session.id, new_message=message
+        ):
+            pass
+    updated = await session_service.get_session(
+        app_name="test", user_id="u", session_id=session.id
+    )
+    assert updated is not None
+    return worker_model, verifier_model, updated.state
+
+
+@pytest.mark.asyncio
+async def test_follow_up_reruns_only_the_verifier() -> None:
+    worker_model, verifier_model, state = await run_follow_up(
+        ["Why is the sky blue?", "Make it shorter"], incremental=True
+    )
+
+    assert len(worker_model.requests) == 1
+    # One digest and the merge for the research turn, then the follow-up.
+    assert len(verifier_model.requests) == 3
+    assert verifier_model.requests[1].config.tools
+    assert not verifier_model.requests[-1].config.tools
+    assert state[PANEL_DIGESTS_KEY] == ""
+    instruction = str(verifier_model.requests[-1].config.system_instruction)
+    assert "Merge worker_a:Why is the sky blue?" in instruction
+    assert "earlier research question: Why is the sky blue?" in instruction
+    assert "Your previous answer was:\nverified:" in instruction
+    assert "### worker_a\nworker_a:Why is the sky blue?" in instruction
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("text", ["Simplify (x+1)^2", "Translate hello into French"])
+async def test_new_questions_after_an_answer_run_the_panel(text: str) -> None:
+    worker_model, _, _ = await run_follow_up(["Why is the sky blue?", text])
+
+    assert len(worker_model.requests) == 2
+
+
+@pytest.mark.asyncio
+async def test_follow_up_without_an_answer_runs_the_panel() -> None:
+    worker_model, _, _ = await run_follow_up(["Make it shorter"])
+
+    assert len(worker_model.requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_large_panels_are_tree_reduced() -> None:
+    verifier_model = EchoLlm(model="verifier", prefix="merged")
+    workers: list[BaseAgent] = [
+        LlmAgent(
+            name=name,
+            model=EchoLlm(model=name, prefix=name),
+            output_key=f"{name}_response",
+        )
+        for name in ("worker_a", "worker_b", "worker_c", "worker_d", "worker_e")
+    ]
+    verifier = LlmAgent(
+        name="verifier",
+        model=verifier_model,
+        instruction="Merge:\n{panel_digests}",
+        output_key="final",
+    )
+    pipeline = ResearchPipeline(
+        name="pipeline",
+        sub_agents=[ParallelAgent(name="panel", sub_agents=workers), verifier],
+        reduce_fan_in=2,
+        reduce_threshold_tokens=10_000,
+    )
+
+    session_service = InMemorySessionService()
+    runner = Runner(app_name="test", agent=pipeline, session_service=session_service)
+    session = await session_service.create_session(app_name="test", user_id="u")
+    message = types.Content(role="user", parts=[types.Part(text="why?")])
+    async for _ in runner.run_async(
+        user_id="u", session_id=session.id, new_message=message
+    ):
+        pass
+    # Small panels stay below the threshold and are merged at the root only.
+    assert len(verifier_model.requests) == 1
+
+    pipeline.reduce_threshold_tokens = 1
+    async for _ in runner.run_async(
+        user_id="u", session_id=session.id, new_message=message
+    ):
+        pass
+    updated = await session_service.get_session(
+        app_name="test", user_id="u", session_id=session.id
+    )
+    assert updated is not None
+
+    # 5 answers -> 3 (two merges) -> 2 (one merge) -> 1 (one merge) -> root.
+    assert len(verifier_model.requests) == 1 + 4 + 1
+    digests = updated.state[PANEL_DIGESTS_KEY]
+    assert digests.startswith(
+        "### worker_a + worker_b + worker_c + worker_d + worker_e\nmerged:"
+    )
+    assert digests in str(verifier_model.requests[-1].config.system_instruction)
+
+
+@pytest.mark.asyncio
+async def test_agreeing_panel_skips_the_full_verification() -> None:
+    verifier_model = EchoLlm(model="verifier", prefix="best")
+    workers: list[BaseAgent] = [
+        LlmAgent(
+            name=name,
+            model=EchoLlm(model=name, prefix="the answer is 42"),
+            output_key=f"{name}_response",
+        )
+        for name in ("worker_a", "worker_b")
+    ]
+    verifier = LlmAgent(
+        name="verifier",
+        model=verifier_model,
+        instruction="Verify and search",
+        output_key="final",
+    )
+    pipeline = ResearchPipeline(
+        name="pipeline",
+        sub_agents=[ParallelAgent(name="panel", sub_agents=workers), verifier],
+        consensus=ConsensusScorer(threshold=0.9),
+    )
+
+    session_service = InMemorySessionService()
+    runner = Runner(app_name="test", agent=pipeline, session_service=session_service)
+    session = await session_service.create_session(app_name="test", user_id="u")
+    message = types.Content(role="user", parts=[types.Part(text="why?")])
+    events = [
+        event
+        async for event in runner.run_async(
+            user_id="u", session_id=session.id, new_message=message
+        )
+    ]
+    updated = await session_service.get_session(
+        app_name="test", user_id="u", session_id=session.id
+    )
+    assert updated is not None
+
+    assert updated.state[CONSENSUS_KEY]["score"] == pytest.approx(1.0)
+    (request,) = verifier_model.requests
+    assert "agreed with each other" in str(request.config.system_instruction)
+    assert events[-1].author == "verifier"
+    assert updated.state["final"] == response_text(events[-1].content)
+
+
+class RatingLlm(BaseLlm):
+    """Fast model that answers and rates its answer with `rating`."""
+
+    rating: str
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        is_check = "Rate how confident" in str(llm_request.config.system_instruction)
+        text = self.rating if is_check else "fast answer"
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text=text)])
+        )
+
+
+@pytest.mark.parametrize(("rating", "escalated"), [("9", False), ("2", True)])
+@pytest.mark.asyncio
+async def test_cascade_escalates_only_low_confidence(
+    rating: str, escalated: bool
+) -> None:
+    worker_model = EchoLlm(model="worker_a", prefix="worker_a")
+    verifier_model = EchoLlm(model="verifier", prefix="verified")
+    cascade = Cascade(RatingLlm(model="fast", rating=rating), threshold=0.8)
+    pipeline = ResearchPipeline(
+        name="pipeline",
+        sub_agents=[
+            ParallelAgent(
+                name="panel",
+                sub_agents=[
+                    LlmAgent(
+                        name="worker_a",
+                        model=worker_model,
+                        output_key="worker_a_response",
+                    )
+                ],
+            ),
+            LlmAgent(name="verifier", model=verifier_model, output_key="final"),
+        ],
+        cascade=cascade,
+    )
+
+    session_service = InMemorySessionService()
+    runner = Runner(app_name="test", agent=pipeline, session_service=session_service)
+    session = await session_service.create_session(app_name="test", user_id="u")
+    message = types.Content(role="user", parts=[types.Part(text="why?")])
+    async for _ in runner.run_async(
+        user_id="u", session_id=session.id, new_message=message
+    ):
+        pass
+    updated = await session_service.get_session(
+        app_name="test", user_id="u", session_id=session.id
+    )
+    assert updated is not None
+
+    assert updated.state[CASCADE_KEY]["escalated"] is escalated
+    assert len(worker_model.requests) == int(escalated)
+    assert (updated.state["final"] == "fast answer") is not escalated
+    assert cascade.stats()["escalated"] == int(escalated)
+
+
+class SlowLlm(EchoLlm):
+    """EchoLlm that takes a while to answer."""
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        await asyncio.sleep(0.05)
+        async for response in super().generate_content_async(llm_request, stream):
+            yield response
+
+
+@pytest.mark.asyncio
+async def test_roster_is_refreshed_only_between_runs() -> None:
+    refreshes: list[int] = []
+    worker = LlmAgent(
+        name="worker_a",
+        model=SlowLlm(model="worker_a", prefix="worker_a"),
+        output_key="worker_a_response",
+    )
+    verifier = LlmAgent(
+        name="verifier",
+        model=EchoLlm(model="verifier", prefix="verified"),
+        output_key="final",
+    )
+    pipeline = ResearchPipeline(
+        name="pipeline",
+        sub_agents=[ParallelAgent(name="panel", sub_agents=[worker]), verifier],
+    )
+    pipeline.refresh_roster = lambda: refreshes.append(pipeline._active_runs)
+
+    session_service = InMemorySessionService()
+    runner = Runner(app_name="test", agent=pipeline, session_service=session_service)
+
+    async def ask(user: str) -> None:
+        session = await session_service.create_session(app_name="test", user_id=user)
+        message = types.Content(role="user", parts=[types.Part(text="why?")])
+        async for _ in runner.run_async(
+            user_id=user, session_id=session.id, new_message=message
+        ):
+            pass
+
+    await asyncio.gather(ask("u1"), ask("u2"))
+    assert refreshes == [0]
+    await ask("u3")
+    assert refreshes == [0, 0]
@@ -0,0 +1,141 @@
+from typing import Any
+
+import pytest
+from google.adk.agents import Agent, BaseAgent
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from app.ollama_model import OllamaLlm
+from app.ollama_scheduler import get_scheduler
+from app.panel_agent import RESIDENCY_REPORT_KEY, PanelAgent
+from app.residency import ResidencyManager, plan_waves
+
+GB = 1024**3
+
+
+class FakeOllamaClient:
+    """Stands in for the ps/show/generate/chat calls of ollama.AsyncClient."""
+
+    def __init__(self, loaded: dict[str, int]) -> None:
+        self.loaded = dict(loaded)
+        self.events: list[str] = []
+
+    async def ps(self) -> dict:
+        return {"models": [{"model": m, "size": s} for m, s in self.loaded.items()]}
+
+    async def show(self, model: str) -> dict:
+        return {
+            "modelinfo": {"general.parameter_count": 3_000_000_000},
+            "details": {"quantization_level": "Q8_0"},
+        }
+
+    async def generate(self, model: str, prompt: str, keep_alive: int) -> dict:
+        if keep_alive == 0:
+            self.loaded.pop(model, None)
+            self.events.append(f"unload {model}")
+        return {}
+
+    async def chat(self, model: str, **kwargs: object) -> dict:
+        self.events.append(f"chat {model}")
+        self.loaded.setdefault(model, 4 * GB)
+        return {"message": {"content": model}, "done": True}
+
+
+class FakeResidencyManager(ResidencyManager):
+    def __init__(self, client: FakeOllamaClient, memory_budget_bytes: int) -> None:
+        super().__init__(memory_budget_bytes)
+        self.fake_client = client
+
+    @property
+    def client(self) -> Any:
+        return self.fake_client
+
+
+def test_plan_waves_runs_resident_and_pinned_models_first() -> None:
+    footprints = {"a": 4 * GB, "b": 5 * GB, "c": 3 * GB, "d": 2 * GB, "v": 2 * GB}
+
+    waves = plan_waves(
+        ["a", "b", "c", "d", "v"],
+        footprints,
+        budget=9 * GB,
+        resident={"c"},
+        pinned={"v"},
+    )
+
+    # 7 GB left after the pinned model: c and v first, then largest first.
+    assert waves == [["c", "v", "a"], ["b", "d"]]
+
+
+def test_plan_waves_gives_oversized_models_their_own_wave() -> None:
+    waves = plan_waves(["big", "small"], {"big": 10 * GB, "small": GB}, budget=8 * GB)
+
+    assert waves == [["big"], ["small"]]
+
+
+@pytest.mark.asyncio
+async def test_panel_runs_workers_in_waves_and_reports_loads() -> None:
+    client = FakeOllamaClient(loaded={"resident:1b": 2 * GB})
+    residency = FakeResidencyManager(client, memory_budget_bytes=6 * GB)
+    workers: list[BaseAgent] = []
+    for name, model in [("w1", "cold:3b"), ("w2", "resident:1b"), ("w3", "other:3b")]:
+        llm = OllamaLlm(model=model)
+        llm._client = client  # type: ignore[assignment]
+        workers.append(Agent(name=name, model=llm, output_key=f"{name}_response"))
+    panel = PanelAgent(name="panel", sub_agents=workers, residency=residency)
+
+    session_service = InMemorySessionService()
+    runner = Runner(app_name="test", agent=panel, session_service=session_service)
+    session = await session_service.create_session(app_name="test", user_id="u")
+    message = types.Content(role="user", parts=[types.Part(text="question")])
+    async for _ in runner.run_async(
+        user_id="u", session_id=session.id, new_message=message
+    ):
+        pass
+    updated = await session_service.get_session(
+        app_name="test", user_id="u", session_id=session.id
+    )
+    assert updated is not None
+
+    # 3B Q8_0 models are estimated at ~4.2 GB, so only one fits next to the
+    # resident 2 GB model.
+    report = updated.state[RESIDENCY_REPORT_KEY]
+    assert report["waves"] == [["resident:1b", "cold:3b"], ["other:3b"]]
+    assert report["loads"] == 2
+    assert client.events.index("unload cold:3b") < client.events.index("chat other:3b")
+    assert updated.state["w3_response"] == "other:3b"
+
+
+@pytest.mark.asyncio
+async def test_release_updates_the_scheduler_view() -> None:
+    client = FakeOllamaClient(loaded={})
+    residency = FakeResidencyManager(client, memory_budget_bytes=6 * GB)
+    residency.host = "http://residency.test"
+    scheduler = get_scheduler(residency.host, max_loaded_models=1)
+    async with scheduler.slot("first:1b"):
+        pass
+
+    await residency.release(["first:1b"])
+
+    assert not scheduler.stats()["models"]["first:1b"]["resident"]
+
+
+@pytest.mark.asyncio
+async def test_release_keeps_models_other_requests_use() -> None:
+    client = FakeOllamaClient(loaded={})
+    residency = FakeResidencyManager(client, memory_budget_bytes=6 * GB)
+    residency.host = "http://shared.test"
+    scheduler = get_scheduler(residency.host)
+
+    await residency.plan(["shared:3b", "mine:3b"])
+    await residency.plan(["shared:3b"])
+    async with scheduler.slot("mine:3b"):
+        await residency.release(["shared:3b", "mine:3b"])
+    assert client.events == []
+
+    await residency.release(["mine:3b"])
+    residency.finish(["shared:3b"])
+    assert client.events == ["unload mine:3b"]
+    await residency.plan(["shared:3b"])
+    await residency.release(["shared:3b"])
+    assert client.events == ["unload mine:3b", "unload shared:3b"]
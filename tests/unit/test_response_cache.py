@@ -0,0 +1,152 @@
+from collections.abc import AsyncGenerator
+from typing import Any
+
+import pytest
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from app.llm_utils import response_text
+from app.response_cache import ResponseCache
+
+
+def make_request(
+    text: str, instruction: str | None = None, max_output_tokens: int | None = None
+) -> LlmRequest:
+    return LlmRequest(
+        contents=[types.Content(role="user", parts=[types.Part(text=text)])],
+        config=types.GenerateContentConfig(
+            system_instruction=instruction, max_output_tokens=max_output_tokens
+        ),
+    )
+
+
+class CountingModel:
+    """Stands in for a model call and counts how often it runs."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def generate(self) -> AsyncGenerator[LlmResponse, None]:
+        self.calls += 1
+        yield LlmResponse(
+            content=types.Content(
+                role="model", parts=[types.Part(text=f"answer {self.calls}")]
+            )
+        )
+
+
+async def serve(
+    cache: ResponseCache, model: CountingModel, text: str, **kwargs: Any
+) -> str:
+    request = make_request(text, **kwargs)
+    responses = [
+        response async for response in cache.serve("llama", request, model.generate)
+    ]
+    return response_text(responses[-1].content)
+
+
+@pytest.mark.asyncio
+async def test_exact_hit_ignores_case_and_whitespace() -> None:
+    cache = ResponseCache()
+    model = CountingModel()
+
+    assert await serve(cache, model, "What is  attention?") == "answer 1"
+    assert await serve(cache, model, "what is attention?") == "answer 1"
+    assert model.calls == 1
+    assert cache.stats()["llama"]["hit_ratio"] == 0.5
+
+
+@pytest.mark.asyncio
+async def test_semantic_hit_above_threshold() -> None:
+    async def embed(text: str) -> list[float]:
+        return [1.0, 0.1] if "attention" in text else [0.0, 1.0]
+
+    cache = ResponseCache(embedder=embed, similarity_threshold=0.9)
+    model = CountingModel()
+
+    await serve(cache, model, "explain attention")
+    assert await serve(cache, model, "why does attention matter") == "answer 1"
+    assert await serve(cache, model, "explain convolutions") == "answer 2"
+    assert cache.stats()["llama"]["semantic_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_semantic_lookup_embeds_only_the_question() -> None:
+    embedded: list[str] = []
+
+    async def embed(text: str) -> list[float]:
+        embedded.append(text)
+        return [1.0, 0.1] if "attention" in text else [0.0, 1.0]
+
+    cache = ResponseCache(embedder=embed, similarity_threshold=0.9)
+    model = CountingModel()
+    instruction = "You are an expert on attention. " * 50
+
+    await serve(cache, model, "explain attention", instruction=instruction)
+    assert await serve(cache, model, "list prime numbers", instruction=instruction) == (
+        "answer 2"
+    )
+    # Similar questions under another instruction are not interchangeable.
+    assert await serve(cache, model, "why does attention matter") == "answer 3"
+    assert embedded == [
+        "explain attention",
+        "list prime numbers",
+        "why does attention matter",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_generation_settings_are_part_of_the_key() -> None:
+    cache = ResponseCache()
+    model = CountingModel()
+
+    await serve(cache, model, "q", max_output_tokens=512)
+    assert await serve(cache, model, "q") == "answer 2"
+    assert await serve(cache, model, "q", max_output_tokens=512) == "answer 1"
+
+
+@pytest.mark.asyncio
+async def test_ttl_and_size_bound() -> None:
+    model = CountingModel()
+
+    expired = ResponseCache(ttl_s=0)
+    await serve(expired, model, "q")
+    await serve(expired, model, "q")
+    assert model.calls == 2
+
+    bounded = ResponseCache(max_entries=1)
+    await serve(bounded, model, "first")
+    await serve(bounded, model, "second")
+    await serve(bounded, model, "first")
+    assert model.calls == 5
+
+
+@pytest.mark.asyncio
+async def test_requests_with_tools_bypass_the_cache() -> None:
+    cache = ResponseCache()
+    model = CountingModel()
+    request = make_request("q")
+    request.config.tools = [types.Tool(function_declarations=[])]
+
+    for _ in range(2):
+        async for _ in cache.serve("llama", request, model.generate):
+            pass
+
+    assert model.calls == 2
+    assert cache.stats() == {}
+
+
+@pytest.mark.asyncio
+async def test_labels_are_part_of_the_key() -> None:
+    cache = ResponseCache()
+    model = CountingModel()
+    degraded = make_request("q")
+    degraded.config.labels = {"degradation": "2"}
+
+    assert await serve(cache, model, "q") == "answer 1"
+    responses = [
+        response async for response in cache.serve("llama", degraded, model.generate)
+    ]
+    assert response_text(responses[-1].content) == "answer 2"
+    assert await serve(cache, model, "q") == "answer 1"
@@ -0,0 +1,75 @@
+import pytest
+from google.adk.agents import Agent, ParallelAgent
+from google.adk.tools.agent_tool import AgentTool
+
+from app import warmup as warmup_module
+from app.ollama_cloud_model import OllamaCloudLlm
+from app.ollama_fix import OllamaLiteLlm
+from app.ollama_model import OllamaLlm
+from app.ollama_scheduler import OllamaHostScheduler
+from app.warmup import Warmup, model_roster
+
+
+class FakeGenerateClient:
+    """Stands in for ollama.AsyncClient.generate."""
+
+    def __init__(self) -> None:
+        self.loaded: list[tuple[str, str]] = []
+
+    async def generate(self, model: str, prompt: str, keep_alive: str) -> dict:
+        if model == "broken":
+            raise ConnectionError("model not found")
+        self.loaded.append((model, keep_alive))
+        return {"load_duration": 1_500_000_000}
+
+
+def test_roster_follows_sub_agents_and_agent_tools() -> None:
+    panel = ParallelAgent(
+        name="panel",
+        sub_agents=[
+            Agent(name="a", model=OllamaLlm(model="mistral:latest")),
+            Agent(name="b", model=OllamaCloudLlm("gpt-oss:20b-cloud")),
+            Agent(
+                name="c",
+                model=OllamaLiteLlm(
+                    model="ollama_chat/llama3.2:latest", api_base="http://gpu:11434/"
+                ),
+            ),
+        ],
+    )
+    root = Agent(
+        name="root",
+        model=OllamaLiteLlm(model="ollama_chat/llama3.2:latest"),
+        tools=[AgentTool(panel)],
+    )
+
+    assert model_roster(root) == [
+        ("http://localhost:11434", "llama3.2:latest"),
+        ("http://localhost:11434", "mistral:latest"),
+        ("http://gpu:11434", "llama3.2:latest"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_warmup_loads_within_budget_then_reports_ready(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    client = FakeGenerateClient()
+    host = "http://warmup-test:11434"
+    monkeypatch.setattr(warmup_module, "get_async_client", lambda _: client)
+    monkeypatch.setattr(
+        warmup_module,
+        "get_scheduler",
+        lambda _: OllamaHostScheduler(host, max_loaded_models=2),
+    )
+    warmup = Warmup([(host, "a"), (host, "broken"), (host, "c")], keep_alive="1h")
+
+    assert warmup.status()["ready"] is False
+    await warmup.run()
+
+    status = warmup.status()
+    assert status["ready"] is True
+    assert client.loaded == [("a", "1h")]
+    assert status["models"][f"{host}/a"]["load_s"] == 1.5
+    assert status["models"][f"{host}/broken"]["status"] == "failed"
+    assert status["models"][f"{host}/c"]["status"] == "skipped"
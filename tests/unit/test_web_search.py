@@ -0,0 +1,142 @@
+import asyncio
+import time
+from typing import Any
+
+import pytest
+
+from app import web_search as web_search_module
+from app.web_search import WebSearch, compact_results, duckduckgo_search_tool
+
+
+class FakeWebSearch(WebSearch):
+    """WebSearch with a slow, counting stand-in for DDGS."""
+
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.fetched: list[str] = []
+
+    def _search_sync(self, query: str) -> list[dict]:
+        self.fetched.append(query)
+        time.sleep(0.05)
+        return [{"title": query, "href": f"https://{query}.com", "body": "..."}]
+
+
+@pytest.mark.asyncio
+async def test_identical_in_flight_queries_share_one_search() -> None:
+    search = FakeWebSearch()
+
+    results = await asyncio.gather(
+        search.search("python gil"), search.search("Python  GIL")
+    )
+
+    assert results[0] == results[1]
+    assert len(search.fetched) == 1
+
+
+@pytest.mark.asyncio
+async def test_results_are_cached_until_ttl() -> None:
+    search = FakeWebSearch()
+    await search.search("q")
+    await search.search("q")
+    assert len(search.fetched) == 1
+
+    expiring = FakeWebSearch(ttl_s=0)
+    await expiring.search("q")
+    await expiring.search("q")
+    assert len(expiring.fetched) == 2
+
+
+@pytest.mark.asyncio
+async def test_tool_runs_queries_concurrently(monkeypatch: pytest.MonkeyPatch) -> None:
+    search = FakeWebSearch(max_workers=3)
+    monkeypatch.setattr(web_search_module, "web_search", search)
+
+    started = time.monotonic()
+    output = await duckduckgo_search_tool(["a", "b", "c"])
+
+    assert time.monotonic() - started < 0.12
+    assert sorted(search.fetched) == ["a", "b", "c"]
+    assert isinstance(output, dict)
+    assert [record["query"] for record in output["results"]] == ["a", "b", "c"]
+
+
+@pytest.mark.asyncio
+async def test_tool_accepts_a_single_query_string(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    search = FakeWebSearch()
+    monkeypatch.setattr(web_search_module, "web_search", search)
+
+    output = await duckduckgo_search_tool("python gil")
+
+    assert search.fetched == ["python gil"]
+    assert isinstance(output, dict)
+    assert [record["query"] for record in output["results"]] == ["python gil"]
+
+
+def test_compact_results_dedupes_domains_and_respects_budgets() -> None:
+    results = {
+        "q1": [
+            {"title": "A", "href": "https://www.a.org/1", "body": "word " * 100},
+            {"title": "A again", "href": "https://a.org/2", "body": "short"},
+        ],
+        "q2": [
+            {"title": "B", "href": "https://b.org", "body": "short"},
+            {"title": "C", "href": "https://c.org", "body": "x" * 50},
+        ],
+    }
+
+    compact = compact_results(results, result_chars=40, total_chars=90)
+
+    assert [record["title"] for record in compact["results"]] == ["A", "B"]
+    assert len(compact["results"][0]["snippet"]) <= 40
+    assert compact["truncated"] is True
+    assert "1 snippets shortened, 1 results omitted" in compact["note"]
+
+
+def test_compact_results_keeps_results_without_a_url() -> None:
+    results = {
+        "q": [
+            {"title": "A", "href": "", "body": "first"},
+            {"title": "B", "href": "", "body": "second"},
+        ]
+    }
+
+    compact = compact_results(results)
+
+    assert [record["title"] for record in compact["results"]] == ["A", "B"]
+
+
+class OversizedWebSearch(FakeWebSearch):
+    """Returns a result too large for the whole context budget."""
+
+    def _search_sync(self, query: str) -> list[dict]:
+        self.fetched.append(query)
+        return [{"title": query, "href": "https://a.org/" + "x" * 5000, "body": ""}]
+
+
+@pytest.mark.asyncio
+async def test_budget_cut_is_not_reported_as_no_results(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(web_search_module, "web_search", OversizedWebSearch())
+
+    output = await duckduckgo_search_tool(["q"])
+
+    assert isinstance(output, dict)
+    assert output["results"] == []
+    assert "1 results omitted" in output["note"]
+
+
+@pytest.mark.asyncio
+async def test_extra_queries_are_dropped_with_a_warning(
+    monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+) -> None:
+    search = FakeWebSearch(max_workers=8)
+    monkeypatch.setattr(web_search_module, "web_search", search)
+    queries = [f"q{i}" for i in range(web_search_module.SEARCH_MAX_QUERIES + 2)]
+
+    await duckduckgo_search_tool(queries)
+
+    assert sorted(search.fetched) == queries[: web_search_module.SEARCH_MAX_QUERIES]
+    assert "dropped: ['q5', 'q6']" in caplog.text
@@ -0,0 +1,60 @@
+from google.adk.agents import BaseAgent
+
+from app.worker_selection import WorkerSelector, domains
+
+
+class Worker(BaseAgent):
+    """Stands in for a panel worker; only the name and focus matter."""
+
+
+PANEL: list[BaseAgent] = [
+    Worker(
+        name="worker_llama",
+        description="General purpose reasoning and open-source alignment",
+    ),
+    Worker(name="worker_deepseek", description="Deep technical reasoning and coding"),
+    Worker(name="worker_mistral", description="Large-scale knowledge synthesis"),
+]
+
+
+def test_domains() -> None:
+    assert domains("Fix this Python function") == {"coding"}
+    assert domains("Large-scale knowledge synthesis") == {"knowledge"}
+    assert domains("hello there") == set()
+
+
+def test_coding_question_only_reaches_the_coding_worker() -> None:
+    selection = WorkerSelector(min_panel_size=1).select(
+        "Write a Python function that reverses a linked list", PANEL
+    )
+
+    assert selection.selected == ["worker_deepseek"]
+    assert selection.scores["worker_mistral"] == 0
+
+
+def test_minimum_panel_is_filled_with_generalists_first() -> None:
+    selection = WorkerSelector(min_panel_size=2).select(
+        "Summarize the history of the Roman empire", PANEL
+    )
+
+    assert selection.selected == ["worker_mistral", "worker_llama"]
+
+
+def test_full_panel_overrides() -> None:
+    everyone = ["worker_llama", "worker_deepseek", "worker_mistral"]
+    question = "Write a Python function that reverses a linked list"
+
+    always = WorkerSelector(always_full_panel=True).select(question, PANEL)
+    requested = WorkerSelector().select(question, PANEL, full_panel=True)
+    assert always.selected == requested.selected == everyone
+    unmatched = WorkerSelector().select("Tell me something nice", PANEL)
+    assert unmatched.selected == everyone
+    assert unmatched.reason == "no domain recognized"
+
+
+def test_default_minimum_panel_keeps_a_second_opinion() -> None:
+    selection = WorkerSelector().select(
+        "Write a Python function that reverses a linked list", PANEL
+    )
+
+    assert selection.selected == ["worker_deepseek", "worker_llama"]